@@ -3,11 +3,17 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
 from pydantic import ValidationError
 
+from src.http_sessions import download_stats
+from src.download_governor import get_download_governor
+from src.disk_budget import get_disk_budget
+from src.metadata_store import read_metadata
+from src.repair import get_repair_queue
 from src.models import GenerationTask, Segment
+from src.storage import get_object_storage
 
 from ..core.security import require_auth
 from ..schemas.task import Storyboard
@@ -37,6 +43,8 @@ from ..schemas.api import (
 )
 from ..services.store import STORE
 from ..services.runner import RUNNER
+from ..services.repair import REPAIR_SWEEPER, is_redownloadable
+from ..services.video_proxy import UpstreamError, local_video_response, proxy_task_video
 from ..services.client_events import record_client_events
 
 router = APIRouter(dependencies=[Depends(require_auth)])
@@ -47,6 +55,7 @@ ALLOWED_DURATIONS = {4, 8, 10, 12, 15, 25}
 ALLOWED_RESOLUTIONS = {"horizontal", "vertical"}
 MAX_PRIORITY = 100
 MAX_WEIGHT = 100
+MAX_PROVIDER_CONCURRENCY = 500
 
 
 def _error(status_code: int, code: str, message: str, details: Optional[Dict[str, Any]] = None):
@@ -101,6 +110,31 @@ def _validate_provider_updates(updates: Dict[str, Any]) -> None:
         if invalid:
             _error(400, "validation_error", f"unsupported resolutions: {invalid}")
 
+    max_concurrency = updates.get("max_concurrency")
+    if max_concurrency is not None:
+        if max_concurrency < 1 or max_concurrency > MAX_PROVIDER_CONCURRENCY:
+            _error(400, "validation_error", f"max_concurrency must be between 1 and {MAX_PROVIDER_CONCURRENCY}")
+
+    model_limits = updates.get("model_max_concurrency")
+    if model_limits is not None:
+        invalid = [
+            model_id
+            for model_id, limit in model_limits.items()
+            if limit < 1 or limit > MAX_PROVIDER_CONCURRENCY
+        ]
+        if invalid:
+            _error(400, "validation_error", f"model_max_concurrency out of range for: {invalid}")
+
+    rate_limits = updates.get("rate_limits")
+    if rate_limits is not None:
+        for endpoint, limits in rate_limits.items():
+            rate = (limits or {}).get("rate")
+            burst = (limits or {}).get("burst")
+            if rate is not None and rate < 0:
+                _error(400, "validation_error", f"rate_limits.{endpoint}.rate must be >= 0")
+            if burst is not None and burst < 1:
+                _error(400, "validation_error", f"rate_limits.{endpoint}.burst must be >= 1")
+
 
 def _validate_model_updates(updates: Dict[str, Any]) -> None:
     display_name = updates.get("display_name")
@@ -255,7 +289,15 @@ def upload_start_image(segment_id: str, file: UploadFile = File(...)):
     with dest.open("wb") as f:
         f.write(file.file.read())
 
-    image_url = f"/uploads/{filename}"
+    # Hosted by the configured object storage (content-addressed, deduplicated); local-store URLs
+    # are mapped back to files by the multipart providers. /uploads only serves as the fallback
+    # when no storage backend is usable.
+    try:
+        storage = get_object_storage()
+        image_url = storage.upload_files([dest])[dest] if storage.enabled else None
+    except ValueError:
+        image_url = None
+    image_url = image_url or f"/uploads/{filename}"
     STORE.update_segment(segment_id, {"image_url": image_url})
     return {"image_url": image_url}
 
@@ -303,6 +345,21 @@ def create_run(payload: RunCreate):
         for version_index in range(1, payload.gen_count + 1):
             segment_jobs.append({**seg, "version_index": version_index, "output_dir": str(segment_dir)})
 
+    # Refuse runs whose projected videos cannot fit on the output volume
+    budget = get_disk_budget()
+    if budget and not payload.dry_run:
+        plan = budget.plan(
+            (
+                Path(job["output_dir"]),
+                budget.estimate(
+                    job.get("duration_seconds", 10), job.get("resolution", "horizontal"), bool(job.get("is_pro"))
+                ),
+            )
+            for job in segment_jobs
+        )
+        if not all(volume["fits"] for volume in plan):
+            _error(507, "insufficient_storage", "Not enough disk space for the projected videos", {"volumes": plan})
+
     config = payload.model_dump()
     config["model_id"] = payload.model_id
     run = STORE.create_run(
@@ -429,16 +486,43 @@ def retry_task(task_id: str):
     return _task_out(STORE.get_task(task_id) or task)
 
 
+@router.post("/tasks/{task_id}/redownload", response_model=TaskOut, status_code=202)
+def redownload_task(task_id: str):
+    """只重跑下载阶段 (使用保存的 video_url 或 provider task_id)，不会重新生成"""
+    task = STORE.get_task(task_id)
+    if not task:
+        _error(404, "not_found", "Task not found")
+    if not is_redownloadable(task):
+        _error(409, "conflict", "Task has no failed or missing download")
+    if not REPAIR_SWEEPER.redownload([task]):
+        _error(409, "conflict", "Task has no video_url or provider task_id to download from, or is already queued")
+    return _task_out(STORE.get_task(task_id) or task)
+
+
+@router.post("/runs/{run_id}/redownload", response_model=RunOut, status_code=202)
+def redownload_run(run_id: str):
+    """批量重新下载 run 中所有下载失败 / 视频丢失的任务 (并发数由 REPAIR_WORKERS 控制)"""
+    run = STORE.get_run(run_id)
+    if not run:
+        _error(404, "not_found", "Run not found")
+    REPAIR_SWEEPER.redownload(STORE.list_tasks(run_id))
+    return RunOut(**(STORE.get_run(run_id) or run))
+
+
 @router.get("/tasks/{task_id}/download")
-def download_task(task_id: str):
+def download_task(task_id: str, range_header: Optional[str] = Header(None, alias="Range")):
     task = STORE.get_task(task_id)
     if not task:
         _error(404, "not_found", "Task not found")
     video_path = task.get("video_path")
     if video_path and Path(video_path).exists():
-        return FileResponse(video_path, media_type="video/mp4")
+        return local_video_response(Path(video_path), range_header)
     if task.get("video_url"):
-        return RedirectResponse(url=task["video_url"])
+        # Provider content URLs need the server-side API key: stream through and cache locally
+        try:
+            return proxy_task_video(task, range_header)
+        except UpstreamError as e:
+            _error(502, "upstream_error", str(e), {"upstream_status": e.status_code})
     _error(404, "not_found", "Video not available")
 
 
@@ -447,10 +531,9 @@ def download_metadata(task_id: str):
     task = STORE.get_task(task_id)
     if not task:
         _error(404, "not_found", "Task not found")
-    metadata_path = task.get("metadata_path")
-    if metadata_path and Path(metadata_path).exists():
-        with Path(metadata_path).open("r", encoding="utf-8") as f:
-            return JSONResponse(content=json.load(f))
+    metadata = read_metadata(Path(task["metadata_path"])) if task.get("metadata_path") else {}
+    if metadata:
+        return JSONResponse(content=metadata)
     return JSONResponse(content=task)
 
 
@@ -544,6 +627,17 @@ def update_provider(provider_id: str, payload: ProviderUpdate):
     return ProviderOut(**provider)
 
 
+@router.get("/admin/downloads/stats")
+def admin_download_stats() -> Dict[str, Dict[str, Any]]:
+    stats = download_stats()
+    stats["governor"] = get_download_governor().stats()
+    stats["repair"] = get_repair_queue().stats()
+    budget = get_disk_budget()
+    if budget:
+        stats["disk_budget"] = budget.stats()
+    return stats
+
+
 @router.get("/admin/models", response_model=PaginatedAdminModels)
 def admin_list_models(
     page: int = 1,
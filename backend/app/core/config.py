@@ -29,6 +29,12 @@ class Settings(BaseSettings):
     CONCURRENCY_ERROR_THRESHOLD: int = Field(2, env="CONCURRENCY_ERROR_THRESHOLD")
     CONCURRENCY_COOLDOWN_SECONDS: int = Field(600, env="CONCURRENCY_COOLDOWN_SECONDS")
     CONCURRENCY_RECOVERY_RATE_SECONDS: int = Field(60, env="CONCURRENCY_RECOVERY_RATE_SECONDS")
+    # Run executor: "thread" (pipeline of worker threads) or "async" (single asyncio event loop)
+    RUN_EXECUTOR: str = Field("thread", env="RUN_EXECUTOR")
+    # Reattach outstanding remote tasks from the submission journal on startup
+    RESUME_ON_STARTUP: bool = Field(True, env="RESUME_ON_STARTUP")
+    # Re-queue download_failed tasks for a download-only repair every N seconds (0 disables)
+    REPAIR_SWEEP_INTERVAL_SECONDS: int = Field(300, env="REPAIR_SWEEP_INTERVAL_SECONDS")
 
     # Failover error classification overrides
     FAILOVER_RETRYABLE_TOKENS: Optional[str] = Field(None, env="FAILOVER_RETRYABLE_TOKENS")
@@ -8,6 +8,9 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .api.routes import router
 from .core.config import settings
+from .services.runner import RUNNER
+from .services.repair import REPAIR_SWEEPER
+from src.storage import local_storage_dir
 
 app = FastAPI(title="CineFlow API", version="0.1.0")
 
@@ -29,6 +32,22 @@ uploads_dir = Path("backend/uploads")
 uploads_dir.mkdir(parents=True, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
 
+# Objects of the local storage backend (STORAGE_BACKEND=local) are served from here
+storage_dir = local_storage_dir()
+storage_dir.mkdir(parents=True, exist_ok=True)
+app.mount("/storage", StaticFiles(directory=storage_dir), name="storage")
+
+
+@app.on_event("startup")
+def resume_outstanding_tasks() -> None:
+    if settings.RESUME_ON_STARTUP:
+        RUNNER.launch_resume()
+
+
+@app.on_event("startup")
+def start_repair_sweeper() -> None:
+    REPAIR_SWEEPER.start(settings.REPAIR_SWEEP_INTERVAL_SECONDS)
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
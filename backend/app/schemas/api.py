@@ -126,6 +126,14 @@ class ProviderCapabilities(BaseModel):
     supports_pro: bool
 
 
+class RateLimitConfig(BaseModel):
+    rate: Optional[float] = None
+    burst: Optional[int] = None
+
+
+EndpointClass = Literal["create", "status", "download"]
+
+
 class ProviderOut(BaseModel):
     id: str
     display_name: str
@@ -136,6 +144,9 @@ class ProviderOut(BaseModel):
     supported_durations: List[int]
     supported_resolutions: List[Literal["horizontal", "vertical"]]
     supports_pro: bool
+    max_concurrency: Optional[int] = None
+    model_max_concurrency: Dict[str, int] = Field(default_factory=dict)
+    rate_limits: Optional[Dict[EndpointClass, RateLimitConfig]] = None
 
 
 class ProviderUpdate(BaseModel):
@@ -147,6 +158,9 @@ class ProviderUpdate(BaseModel):
     supported_durations: Optional[List[int]] = None
     supported_resolutions: Optional[List[Literal["horizontal", "vertical"]]] = None
     supports_pro: Optional[bool] = None
+    max_concurrency: Optional[int] = None
+    model_max_concurrency: Optional[Dict[str, int]] = None
+    rate_limits: Optional[Dict[EndpointClass, RateLimitConfig]] = None
 
 
 class PaginatedStoryboards(BaseModel):
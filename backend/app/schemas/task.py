@@ -1,9 +1,8 @@
 from typing import List, Optional, Literal, Union, Any
 from pydantic import BaseModel, Field, model_validator
 from pathlib import Path
-from datetime import datetime
-import random
-import string
+import hashlib
+import json
 import re
 
 class CharacterItem(BaseModel):
@@ -117,12 +116,18 @@ class GenerationTask(BaseModel):
     segment: Segment
     version_index: int
     output_dir: Path
-    
-    # Unique identifiers for filename to prevent overwrite
-    timestamp: str = Field(default_factory=lambda: datetime.now().strftime("%Y%m%d%H%M%S"))
-    random_suffix: str = Field(default_factory=lambda: ''.join(random.choices(string.ascii_lowercase + string.digits, k=4)))
-    
+
+    @property
+    def prompt_hash(self) -> str:
+        """
+        Hash of every input that affects the generated video (prompt, assets, params).
+        Editing the segment produces a new hash, and therefore a new output.
+        """
+        payload = self.segment.model_dump(mode="json", exclude={"segment_index"})
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
     @property
     def output_filename_base(self) -> str:
-        # Format: 1_v1_20231225120000_abcd
-        return f"{self.segment.segment_index}_v{self.version_index}_{self.timestamp}_{self.random_suffix}"
+        # Format: 1_v1_3f2a9c1d (deterministic, so re-runs land on the same file)
+        return f"{self.segment.segment_index}_v{self.version_index}_{self.prompt_hash[:8]}"
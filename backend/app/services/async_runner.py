@@ -0,0 +1,158 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.concurrency import get_provider_controller
+from src.models import GenerationTask
+from src.worker import process_task_async
+
+from .store import STORE
+from .providers.registry import get_async_provider_client, prefer_free_capacity
+from .runner import _collect_result, _finalize_run, _record_run_provider, _select_candidates
+
+
+class AsyncRunManager:
+    """
+    Runs generation batches on one asyncio event loop (owned by a daemon thread).
+    Thousands of in-flight tasks cost one coroutine each instead of one thread each;
+    HTTP goes through the shared per-provider httpx pools.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, name="async-runner", daemon=True
+                )
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def launch_run(
+        self,
+        run_id: str,
+        task_jobs: List[Tuple[str, GenerationTask]],
+        concurrency: int,
+        dry_run: bool,
+        force: bool,
+        model_id: str,
+        routing_strategy: str,
+    ) -> "asyncio.Future":
+        return asyncio.run_coroutine_threadsafe(
+            self._execute_run(run_id, task_jobs, concurrency, dry_run, force, model_id, routing_strategy),
+            self._ensure_loop(),
+        )
+
+    async def _execute_run(
+        self,
+        run_id: str,
+        task_jobs: List[Tuple[str, GenerationTask]],
+        concurrency: int,
+        dry_run: bool,
+        force: bool,
+        model_id: str,
+        routing_strategy: str,
+    ) -> None:
+        selections, failures = await asyncio.to_thread(
+            _select_candidates, task_jobs, model_id, routing_strategy
+        )
+        _record_run_provider(run_id, selections, failures)
+
+        # Fixed per-run cap on in-flight remote tasks
+        limiter = asyncio.Semaphore(max(concurrency, 1))
+
+        async def run_one(task_id: str, gen_task: GenerationTask) -> None:
+            try:
+                result = await self._run_task(
+                    task_id,
+                    gen_task,
+                    model_id,
+                    routing_strategy,
+                    candidates=selections.get(task_id) or [],
+                    failure_message=failures.get(task_id),
+                    dry_run=dry_run,
+                    force=force,
+                    limiter=limiter,
+                )
+            except Exception as exc:
+                STORE.update_task(task_id, {"status": "failed", "error_msg": str(exc)})
+                result = {"status": "failed"}
+            STORE.increment_run_counts(run_id, result["status"])
+
+        await asyncio.gather(*(run_one(task_id, gen_task) for task_id, gen_task in task_jobs))
+        _finalize_run(run_id)
+
+    async def _run_task(
+        self,
+        task_id: str,
+        gen_task: GenerationTask,
+        model_id: str,
+        routing_strategy: str,
+        candidates: List[Tuple[str, str]],
+        failure_message: Optional[str],
+        dry_run: bool,
+        force: bool,
+        limiter: asyncio.Semaphore,
+    ) -> Dict[str, str]:
+        if not candidates:
+            STORE.update_task(
+                task_id,
+                {
+                    "status": "failed",
+                    "error_msg": failure_message or "no enabled provider for task",
+                    "error_code": "no_provider",
+                    "retryable": False,
+                },
+            )
+            return {"status": "failed"}
+
+        candidates = list(candidates)
+        for index in range(len(candidates)):
+            if index > 0:
+                # Fail over to whichever remaining provider has free capacity now
+                candidates[index:] = prefer_free_capacity(candidates[index:])
+            provider_id, provider_model_id = candidates[index]
+            STORE.update_task(
+                task_id,
+                {
+                    "status": "running",
+                    "provider_id": provider_id,
+                    "provider_model_id": provider_model_id,
+                },
+            )
+            client = get_async_provider_client(
+                provider_id,
+                model_id=model_id,
+                provider_model_id=provider_model_id,
+            )
+            result = await process_task_async(
+                gen_task,
+                client,
+                dry_run=dry_run,
+                force=force,
+                limiter=limiter,
+                controller=get_provider_controller(provider_id, provider_model_id),
+            )
+            status, local_status, retryable, updates = await asyncio.to_thread(
+                _collect_result, gen_task, result
+            )
+            if (
+                routing_strategy == "failover"
+                and status == "failed"
+                and local_status != "download_failed"
+                and retryable
+                and index < len(candidates) - 1
+            ):
+                continue
+            STORE.update_task(task_id, updates)
+            return {"status": status}
+        return {"status": "failed"}
+
+
+ASYNC_RUNNER = AsyncRunManager()
@@ -1,11 +1,18 @@
+import asyncio
 import mimetypes
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+import httpx
 import requests
 
 from src.api_client import APIError, RateLimitError
+from src.async_http import get_async_client
 from src.config import settings
+from src.downloader import DownloadStatusError, download_file, download_file_async
+from src.image_prep import prepare_image
+from src.rate_limiter import rate_limiters
+from src.storage import local_object_path
 
 
 _SIZE_MAP = {
@@ -13,9 +20,13 @@ _SIZE_MAP = {
     "vertical": "720x1280",
 }
 _SUPPORTED_SECONDS = {4, 8, 12}
+# Download statuses that are not retried: they drive failover / rate limiting like API errors
+_FATAL_DOWNLOAD_STATUSES = (401, 429)
 
 
 class AIHubMixProvider:
+    provider_id = "aihubmix"
+
     def __init__(self, model_id: Optional[str] = None, provider_model_id: Optional[str] = None) -> None:
         self.model_id = model_id
         self.provider_model_id = provider_model_id
@@ -55,6 +66,8 @@ class AIHubMixProvider:
             file_path = _resolve_image_path(image_url)
             if not file_path or not file_path.exists():
                 raise APIError("input_reference not available for AIHubMix")
+            # Providers expect the reference frame at exactly the requested size
+            file_path = prepare_image(file_path, resolution)
             mime_type, _ = mimetypes.guess_type(file_path.name)
             files = {
                 "prompt": (None, prompt),
@@ -68,6 +81,7 @@ class AIHubMixProvider:
                 ),
             }
             try:
+                rate_limiters.acquire("aihubmix", "create")
                 data = self._request("POST", "/videos", files=files)
             finally:
                 files["input_reference"][1].close()
@@ -78,6 +92,7 @@ class AIHubMixProvider:
                 "size": size,
                 "seconds": str(duration),
             }
+            rate_limiters.acquire("aihubmix", "create")
             data = self._request("POST", "/videos", json=payload)
 
         video_id = _extract_video_id(data)
@@ -88,6 +103,7 @@ class AIHubMixProvider:
     def get_task(self, task_id: str):
         if not settings.AIHUBMIX_API_KEY:
             raise APIError("AIHubMix API key not configured")
+        rate_limiters.acquire("aihubmix", "status")
         data = self._request("GET", f"/videos/{task_id}")
         status = _normalize_status(data.get("status") or data.get("state"))
         video_url = (
@@ -99,37 +115,22 @@ class AIHubMixProvider:
         progress = data.get("progress") or data.get("percentage") or 0
         return {"status": status, "progress": progress, "video_url": video_url, "raw": data}
 
+    def content_headers(self) -> Dict[str, str]:
+        """请求 /videos/{id}/content 所需的请求头 (需要服务端 API key，浏览器无法直接访问)"""
+        return {"Authorization": f"Bearer {settings.AIHUBMIX_API_KEY}"}
+
     def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
         if not settings.AIHUBMIX_API_KEY:
             raise APIError("AIHubMix API key not configured")
         url = video_url or f"{self.base_url}/videos/{task_id}/content"
-        tmp_path = dest_path.with_suffix(dest_path.suffix + ".tmp")
+        rate_limiters.acquire("aihubmix", "download")
+        # Ranged multi-connection download with resume over the shared per-host download pool
         try:
-            dest_path.parent.mkdir(parents=True, exist_ok=True)
-            with self._session.get(
-                url,
-                stream=True,
-                timeout=settings.DOWNLOAD_TIMEOUT_SECONDS,
-            ) as resp:
-                if resp.status_code == 401:
-                    raise APIError("AIHubMix unauthorized")
-                if resp.status_code == 429:
-                    raise RateLimitError("AIHubMix rate limited")
-                resp.raise_for_status()
-                with tmp_path.open("wb") as f:
-                    for chunk in resp.iter_content(chunk_size=1024 * 1024):
-                        if chunk:
-                            f.write(chunk)
-            tmp_path.replace(dest_path)
-            return True
-        except requests.RequestException as exc:
-            if tmp_path.exists():
-                tmp_path.unlink()
-            raise APIError(str(exc)) from exc
-        except OSError as exc:
-            if tmp_path.exists():
-                tmp_path.unlink()
-            raise APIError(str(exc)) from exc
+            return download_file(
+                url, dest_path, headers=self.content_headers(), fatal_statuses=_FATAL_DOWNLOAD_STATUSES
+            )
+        except DownloadStatusError as exc:
+            raise _download_status_error(exc) from exc
 
     def _request(
         self,
@@ -160,6 +161,143 @@ class AIHubMixProvider:
             raise APIError(str(exc)) from exc
 
 
+class AsyncAIHubMixProvider:
+    """
+    Non-blocking AIHubMix client; requests go through the shared httpx pool
+    of the running event loop.
+    """
+
+    provider_id = "aihubmix"
+
+    def __init__(self, model_id: Optional[str] = None, provider_model_id: Optional[str] = None) -> None:
+        self.model_id = model_id
+        self.provider_model_id = provider_model_id
+        self.base_url = settings.AIHUBMIX_BASE_URL.rstrip("/")
+        self._headers: Dict[str, str] = {}
+        if settings.AIHUBMIX_API_KEY:
+            self._headers["Authorization"] = f"Bearer {settings.AIHUBMIX_API_KEY}"
+
+    async def create_task(
+        self,
+        prompt: str,
+        duration: int,
+        resolution: str,
+        is_pro: bool,
+        image_url: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        if not settings.AIHUBMIX_API_KEY:
+            raise APIError("AIHubMix API key not configured")
+
+        model = self.provider_model_id or ("sora-2-pro" if is_pro else "sora-2")
+        size = _SIZE_MAP.get(resolution)
+        if not size:
+            raise APIError(f"Unsupported resolution for AIHubMix: {resolution}")
+        if duration not in _SUPPORTED_SECONDS:
+            raise APIError(f"Unsupported duration for AIHubMix: {duration}")
+
+        if image_url:
+            file_path = _resolve_image_path(image_url)
+            if not file_path or not file_path.exists():
+                raise APIError("input_reference not available for AIHubMix")
+            # Providers expect the reference frame at exactly the requested size
+            file_path = await asyncio.to_thread(prepare_image, file_path, resolution)
+            mime_type, _ = mimetypes.guess_type(file_path.name)
+            files = {
+                "prompt": (None, prompt),
+                "model": (None, model),
+                "size": (None, size),
+                "seconds": (None, str(duration)),
+                "input_reference": (
+                    file_path.name,
+                    await asyncio.to_thread(file_path.read_bytes),
+                    mime_type or "application/octet-stream",
+                ),
+            }
+            await rate_limiters.acquire_async("aihubmix", "create")
+            data = await self._request("POST", "/videos", files=files)
+        else:
+            payload = {
+                "model": model,
+                "prompt": prompt,
+                "size": size,
+                "seconds": str(duration),
+            }
+            await rate_limiters.acquire_async("aihubmix", "create")
+            data = await self._request("POST", "/videos", json=payload)
+
+        video_id = _extract_video_id(data)
+        if not video_id:
+            raise APIError("AIHubMix response missing video id")
+        return video_id
+
+    async def get_task(self, task_id: str):
+        if not settings.AIHUBMIX_API_KEY:
+            raise APIError("AIHubMix API key not configured")
+        await rate_limiters.acquire_async("aihubmix", "status")
+        data = await self._request("GET", f"/videos/{task_id}")
+        status = _normalize_status(data.get("status") or data.get("state"))
+        video_url = (
+            data.get("video_url")
+            or data.get("url")
+            or data.get("output_url")
+            or f"{self.base_url}/videos/{task_id}/content"
+        )
+        progress = data.get("progress") or data.get("percentage") or 0
+        return {"status": status, "progress": progress, "video_url": video_url, "raw": data}
+
+    async def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
+        if not settings.AIHUBMIX_API_KEY:
+            raise APIError("AIHubMix API key not configured")
+        url = video_url or f"{self.base_url}/videos/{task_id}/content"
+        await rate_limiters.acquire_async("aihubmix", "download")
+        try:
+            return await download_file_async(
+                url,
+                dest_path,
+                client=get_async_client("aihubmix"),
+                headers=self._headers,
+                fatal_statuses=_FATAL_DOWNLOAD_STATUSES,
+            )
+        except DownloadStatusError as exc:
+            raise _download_status_error(exc) from exc
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        json: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        url = f"{self.base_url}{endpoint}"
+        try:
+            response = await get_async_client("aihubmix").request(
+                method,
+                url,
+                json=json,
+                files=files,
+                headers=self._headers,
+                timeout=settings.API_REQUEST_TIMEOUT_SECONDS,
+            )
+            if response.status_code == 401:
+                raise APIError("AIHubMix unauthorized")
+            if response.status_code == 429:
+                raise RateLimitError("AIHubMix rate limited")
+            response.raise_for_status()
+            try:
+                return response.json()
+            except ValueError as exc:
+                raise APIError("AIHubMix returned non-JSON response") from exc
+        except httpx.HTTPError as exc:
+            raise APIError(str(exc)) from exc
+
+
+def _download_status_error(exc: DownloadStatusError) -> APIError:
+    if exc.status_code == 429:
+        return RateLimitError("AIHubMix rate limited")
+    return APIError("AIHubMix unauthorized")
+
+
 def _normalize_status(status: Optional[str]) -> str:
     if not status:
         return "running"
@@ -187,6 +325,9 @@ def _resolve_image_path(image_url: str) -> Optional[Path]:
     if image_url.startswith("/uploads/"):
         filename = image_url.split("/uploads/", 1)[1]
         return Path("backend/uploads") / filename
+    local_path = local_object_path(image_url)
+    if local_path:
+        return local_path
     candidate = Path(image_url)
     if candidate.exists():
         return candidate
@@ -19,3 +19,22 @@ class ProviderClient(Protocol):
 
     def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
         ...
+
+
+class AsyncProviderClient(Protocol):
+    async def create_task(
+        self,
+        prompt: str,
+        duration: int,
+        resolution: str,
+        is_pro: bool,
+        image_url: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        ...
+
+    async def get_task(self, task_id: str):
+        ...
+
+    async def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
+        ...
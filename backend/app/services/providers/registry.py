@@ -2,10 +2,12 @@ from typing import Dict, Iterable, List, Optional, Tuple
 
 import random
 
-from .aihubmix import AIHubMixProvider
-from .openai import OpenAIProvider
-from .sora_hk import SoraHKProvider
-from .base import ProviderClient
+from src.concurrency import get_provider_controller
+
+from .aihubmix import AIHubMixProvider, AsyncAIHubMixProvider
+from .openai import AsyncOpenAIProvider, OpenAIProvider
+from .sora_hk import AsyncSoraHKProvider, SoraHKProvider
+from .base import AsyncProviderClient, ProviderClient
 from ..store import STORE
 
 
@@ -87,7 +89,21 @@ def select_provider_candidates(
     if routing_strategy == "weighted":
         provider_id, provider_model_ids, _ = _pick_weighted(candidates)
         return [(provider_id, provider_model_ids[0])]
-    return [(provider_id, provider_model_ids[0]) for provider_id, provider_model_ids, _ in candidates]
+    return prefer_free_capacity(
+        [(provider_id, provider_model_ids[0]) for provider_id, provider_model_ids, _ in candidates]
+    )
+
+
+def free_slots(provider_id: str, provider_model_id: Optional[str] = None) -> int:
+    return get_provider_controller(provider_id, provider_model_id).free_slots
+
+
+def prefer_free_capacity(candidates: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Moves saturated providers behind the ones that can take a task right now.
+    The sort is stable, so priority order is kept within each group.
+    """
+    return sorted(candidates, key=lambda item: free_slots(*item) <= 0)
 
 
 def get_provider_client(
@@ -104,11 +120,27 @@ def get_provider_client(
     raise ValueError("provider_id not supported")
 
 
+def get_async_provider_client(
+    provider_id: str,
+    model_id: Optional[str] = None,
+    provider_model_id: Optional[str] = None,
+) -> AsyncProviderClient:
+    if provider_id == "sora_hk":
+        return AsyncSoraHKProvider(model_id=model_id, provider_model_id=provider_model_id)
+    if provider_id == "openai":
+        return AsyncOpenAIProvider(model_id=model_id, provider_model_id=provider_model_id)
+    if provider_id == "aihubmix":
+        return AsyncAIHubMixProvider(model_id=model_id, provider_model_id=provider_model_id)
+    raise ValueError("provider_id not supported")
+
+
 def _pick_weighted(
     candidates: List[Tuple[str, List[str], Dict]],
 ) -> Tuple[str, List[str], Dict]:
+    # Saturated providers only win when every candidate is saturated
+    available = [item for item in candidates if free_slots(item[0], item[1][0]) > 0] or candidates
     weighted: List[Tuple[str, List[str], Dict]] = []
-    for provider_id, provider_model_ids, provider in candidates:
+    for provider_id, provider_model_ids, provider in available:
         weight = int(provider.get("weight") or 1)
         weighted.extend([(provider_id, provider_model_ids, provider)] * max(weight, 1))
     return random.choice(weighted)
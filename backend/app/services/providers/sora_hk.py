@@ -1,11 +1,12 @@
 from pathlib import Path
 from typing import Optional
 
-from src.api_client import SoraClient
-from src.downloader import download_file
+from src.api_client import AsyncSoraClient, SoraClient
 
 
 class SoraHKProvider:
+    provider_id = "sora_hk"
+
     def __init__(self, model_id: Optional[str] = None, provider_model_id: Optional[str] = None) -> None:
         self._client = SoraClient()
         self.model_id = model_id
@@ -33,4 +34,37 @@ class SoraHKProvider:
         return self._client.get_task(task_id)
 
     def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
-        return download_file(video_url or "", dest_path)
+        return self._client.download_video(task_id, video_url, dest_path)
+
+
+class AsyncSoraHKProvider:
+    provider_id = "sora_hk"
+
+    def __init__(self, model_id: Optional[str] = None, provider_model_id: Optional[str] = None) -> None:
+        self._client = AsyncSoraClient()
+        self.model_id = model_id
+        self.provider_model_id = provider_model_id
+
+    async def create_task(
+        self,
+        prompt: str,
+        duration: int,
+        resolution: str,
+        is_pro: bool,
+        image_url: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        return await self._client.create_task(
+            prompt=prompt,
+            duration=duration,
+            resolution=resolution,
+            is_pro=is_pro,
+            image_url=image_url,
+            **kwargs,
+        )
+
+    async def get_task(self, task_id: str):
+        return await self._client.get_task(task_id)
+
+    async def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
+        return await self._client.download_video(task_id, video_url, dest_path)
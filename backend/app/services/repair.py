@@ -0,0 +1,128 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.metadata_store import read_metadata
+from src.repair import RepairJob, get_repair_queue
+
+from .store import STORE
+from .providers.registry import get_provider_client
+
+logger = logging.getLogger(__name__)
+
+
+def is_redownloadable(task: Dict[str, Any]) -> bool:
+    """视频已在远端生成，只需重跑下载阶段: 下载失败，或已完成但本地视频文件丢失"""
+    if task.get("status") == "download_failed":
+        return True
+    video_path = task.get("video_path")
+    return task.get("status") == "completed" and bool(video_path) and not Path(video_path).exists()
+
+
+class RepairSweeper:
+    """
+    把 STORE 中 download_failed 的任务放入下载修复队列: 只重跑下载阶段，不重新生成。
+    后台线程每 interval 秒扫描一次；修复成功后任务状态改为 completed 并重新统计 run。
+    """
+
+    def __init__(self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, interval: float) -> None:
+        if self._thread is not None or interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="repair-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                added = self.sweep()
+                if added:
+                    logger.info(f"Queued {added} download_failed tasks for repair")
+            except Exception as e:
+                logger.exception(f"Repair sweep failed: {e}")
+            self._stop.wait(interval)
+
+    def sweep(self, task_ids: Optional[Iterable[str]] = None, force: bool = False) -> int:
+        """
+        把 download_failed 的任务加入修复队列，返回新加入的数量。
+        task_ids 为 None 时扫描全部任务；force 会重新加入已放弃的任务。
+        """
+        if task_ids is None:
+            tasks = STORE.list_tasks()
+        else:
+            tasks = [task for task in (STORE.get_task(task_id) for task_id in task_ids) if task]
+        queue = get_repair_queue()
+        added = 0
+        for task in tasks:
+            if task.get("status") != "download_failed":
+                continue
+            job = self._job_for(task)
+            if job and queue.enqueue(job, force=force):
+                added += 1
+        return added
+
+    def redownload(self, tasks: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        手动重新下载 (POST /tasks/{id}/redownload、/runs/{id}/redownload):
+        download_failed 的任务以及视频文件已丢失的 completed 任务，强制加入修复队列 (包括已放弃的)。
+        入队的任务状态改为 running，返回入队的任务 ID。
+        """
+        tasks = list(tasks)
+        queue = get_repair_queue()
+        queued = []
+        for task in tasks:
+            if not is_redownloadable(task):
+                continue
+            job = self._job_for(task)
+            if job and queue.enqueue(job, force=True):
+                STORE.update_task(task["id"], {"status": "running", "error_msg": None})
+                queued.append(task["id"])
+        for run_id in {task.get("run_id") for task in tasks if task["id"] in queued}:
+            if run_id:
+                STORE.recount_run(run_id)
+        return queued
+
+    def _job_for(self, task: Dict[str, Any]) -> Optional[RepairJob]:
+        if not task.get("video_path") or not task.get("metadata_path"):
+            return None
+        metadata = read_metadata(Path(task["metadata_path"]))
+        video_url = task.get("video_url") or metadata.get("video_url")
+        remote_task_id = metadata.get("task_id")
+        if not video_url and not remote_task_id:
+            return None
+        client = None
+        if task.get("provider_id"):
+            try:
+                client = get_provider_client(task["provider_id"], provider_model_id=task.get("provider_model_id"))
+            except ValueError:
+                client = None
+        return RepairJob(
+            task["video_path"],
+            task["metadata_path"],
+            video_url=video_url,
+            remote_task_id=remote_task_id,
+            client=client,
+            on_done=lambda job, ok: self._on_done(task["id"], task.get("run_id"), job, ok),
+        )
+
+    def _on_done(self, task_id: str, run_id: Optional[str], job: RepairJob, ok: bool) -> None:
+        if ok:
+            STORE.update_task(
+                task_id,
+                {"status": "completed", "error_msg": None, "error_code": None, "retryable": None},
+            )
+            logger.info(f"Task {task_id} repaired: video downloaded without regenerating")
+        else:
+            STORE.update_task(task_id, {"status": "download_failed", "error_msg": job.error})
+        if run_id:
+            STORE.recount_run(run_id)
+
+
+REPAIR_SWEEPER = RepairSweeper()
@@ -1,16 +1,24 @@
-import json
+import logging
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, as_completed
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+from src.concurrency import AdaptiveConcurrencyController, get_provider_controller
+from src.config import settings
+from src.journal import get_journal
+from src.manifest import lookup_output
+from src.metadata_store import read_metadata, update_metadata
 from src.models import GenerationTask
-from src.worker import process_task
+from src.pipeline import GenerationPipeline
+from src.worker import resume_outstanding, submit_task
 
+from ..core.config import settings as app_settings
 from .store import STORE
-from .providers.registry import get_provider_client, select_provider_candidates
+from .providers.registry import get_provider_client, prefer_free_capacity, select_provider_candidates
 from .error_policy import classify_error
 
+logger = logging.getLogger(__name__)
 
 class RunManager:
     def __init__(self) -> None:
@@ -26,6 +34,13 @@ class RunManager:
         model_id: str,
         routing_strategy: str,
     ) -> None:
+        if app_settings.RUN_EXECUTOR == "async":
+            from .async_runner import ASYNC_RUNNER
+
+            ASYNC_RUNNER.launch_run(
+                run_id, task_jobs, concurrency, dry_run, force, model_id, routing_strategy
+            )
+            return
         thread = threading.Thread(
             target=self._execute_run,
             args=(run_id, task_jobs, concurrency, dry_run, force, model_id, routing_strategy),
@@ -44,45 +59,27 @@ class RunManager:
         model_id: str,
         routing_strategy: str,
     ) -> None:
-        selections: Dict[str, List[Tuple[str, str]]] = {}
-        failures: Dict[str, str] = {}
-        for task_id, gen_task in task_jobs:
-            try:
-                selections[task_id] = select_provider_candidates(
-                    model_id,
-                    routing_strategy=routing_strategy,
-                    required_durations=[gen_task.segment.duration_seconds],
-                    required_resolutions=[gen_task.segment.resolution],
-                    requires_pro=gen_task.segment.is_pro,
-                    requires_image=bool(gen_task.segment.image_url),
-                )
-            except ValueError as exc:
-                selections[task_id] = []
-                failures[task_id] = str(exc)
-
-        chosen = {candidates[0] for candidates in selections.values() if candidates}
-        if len(chosen) == 1 and not failures:
-            provider_id, provider_model_id = next(iter(chosen))
-            STORE.update_run(run_id, {"provider_id": provider_id, "provider_model_id": provider_model_id})
-        else:
-            STORE.update_run(run_id, {"provider_id": None, "provider_model_id": None})
+        selections, failures = _select_candidates(task_jobs, model_id, routing_strategy)
+        _record_run_provider(run_id, selections, failures)
 
-        def run_one(task_id: str, gen_task: GenerationTask) -> Dict[str, Any]:
-            candidates = selections.get(task_id) or []
-            return self._run_task(
-                task_id,
-                gen_task,
-                model_id,
-                routing_strategy,
-                candidates=candidates,
-                failure_message=failures.get(task_id),
-                dry_run=dry_run,
-                force=force,
-            )
-
-        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Fixed per-run cap on in-flight remote tasks (min == max disables safe-mode shrinking).
+        controller = AdaptiveConcurrencyController(max_concurrency=concurrency, min_concurrency=concurrency)
+        with GenerationPipeline(
+            submit_workers=min(concurrency, settings.SUBMIT_WORKERS),
+            controller=controller,
+        ) as pipeline:
             futures = {
-                executor.submit(run_one, task_id, gen_task): task_id
+                self._start_task(
+                    task_id,
+                    gen_task,
+                    model_id,
+                    routing_strategy,
+                    candidates=selections.get(task_id) or [],
+                    failure_message=failures.get(task_id),
+                    dry_run=dry_run,
+                    force=force,
+                    pipeline=pipeline,
+                ): task_id
                 for task_id, gen_task in task_jobs
             }
 
@@ -96,13 +93,46 @@ class RunManager:
 
                 STORE.increment_run_counts(run_id, result["status"])
 
-        run = STORE.get_run(run_id)
-        if not run:
+        _finalize_run(run_id)
+
+    def launch_resume(self) -> None:
+        """Reattaches remote tasks left outstanding in the submission journal by a restart."""
+        thread = threading.Thread(target=self._execute_resume, daemon=True)
+        self._threads["resume"] = thread
+        thread.start()
+
+    def _execute_resume(self) -> None:
+        journal = get_journal()
+        if not journal:
+            return
+        journal.compact()
+        outstanding = journal.outstanding()
+        if not outstanding:
             return
-        final_status = "completed"
-        if run.get("failed", 0) > 0 or run.get("download_failed", 0) > 0:
-            final_status = "failed"
-        STORE.update_run(run_id, {"status": final_status})
+        logger.info(f"Resuming {len(outstanding)} outstanding remote tasks from the submission journal")
+
+        def client_for(entry: Dict[str, Any]):
+            provider_id = entry.get("provider_id")
+            if not provider_id:
+                return None
+            try:
+                return get_provider_client(provider_id, provider_model_id=entry.get("provider_model_id"))
+            except ValueError:
+                return None
+
+        with GenerationPipeline() as pipeline:
+            futures = resume_outstanding(
+                client_for,
+                pipeline=pipeline,
+                controller_factory=lambda entry: get_provider_controller(
+                    entry["provider_id"], entry.get("provider_model_id")
+                ),
+            )
+            for task_id, future in futures.items():
+                try:
+                    logger.info(f"Resumed task {task_id}: {future.result()}")
+                except Exception as exc:
+                    logger.error(f"Resumed task {task_id} failed: {exc}")
 
     def launch_retry_task(
         self,
@@ -144,19 +174,22 @@ class RunManager:
         except ValueError:
             candidates = []
 
-        self._run_task(
-            task_id,
-            gen_task,
-            model_id,
-            routing_strategy,
-            candidates=candidates,
-            failure_message="no enabled provider for task",
-            dry_run=dry_run,
-            force=force,
-        )
+        try:
+            self._start_task(
+                task_id,
+                gen_task,
+                model_id,
+                routing_strategy,
+                candidates=candidates,
+                failure_message="no enabled provider for task",
+                dry_run=dry_run,
+                force=force,
+            ).result()
+        except Exception as exc:
+            STORE.update_task(task_id, {"status": "failed", "error_msg": str(exc)})
         STORE.recount_run(run_id)
 
-    def _run_task(
+    def _start_task(
         self,
         task_id: str,
         gen_task: GenerationTask,
@@ -166,7 +199,15 @@ class RunManager:
         failure_message: Optional[str],
         dry_run: bool,
         force: bool,
-    ) -> Dict[str, Any]:
+        pipeline: Optional[GenerationPipeline] = None,
+    ) -> Future:
+        """
+        Starts the task on the first candidate provider and chains failover
+        through future callbacks, so no thread waits while the remote task runs.
+        Each attempt is capped by its provider's own concurrency controller.
+        """
+        outcome: Future = Future()
+        candidates = list(candidates)
         if not candidates:
             error_msg = failure_message or "no enabled provider for task"
             STORE.update_task(
@@ -178,50 +219,48 @@ class RunManager:
                     "retryable": False,
                 },
             )
-            return {"status": "failed"}
-        last_updates: Dict[str, Any] = {}
-        for index, (provider_id, provider_model_id) in enumerate(candidates):
-            STORE.update_task(
-                task_id,
-                {
-                    "status": "running",
-                    "provider_id": provider_id,
-                    "provider_model_id": provider_model_id,
-                },
-            )
-            client = get_provider_client(
-                provider_id,
-                model_id=model_id,
-                provider_model_id=provider_model_id,
-            )
-            result = process_task(gen_task, client, dry_run=dry_run, force=force)
-
-            meta_path = gen_task.output_dir / f"{gen_task.output_filename_base}_{gen_task.id}.json"
-            video_path = gen_task.output_dir / f"{gen_task.output_filename_base}_{gen_task.id}.mp4"
-            metadata = _load_metadata(meta_path)
-            local_status = metadata.get("local_status") if metadata else None
-
-            status = _map_status(result, local_status)
-            error_msg = metadata.get("error_msg") if metadata else None
-            error_code = None
-            retryable = None
-            if status != "completed":
-                if local_status == "download_failed":
-                    error_code = "download_failed"
-                    retryable = False
-                else:
-                    error_code, retryable = classify_error(error_msg)
-            last_updates = {
-                "status": status,
-                "metadata_path": str(meta_path),
-                "video_path": str(video_path),
-                "full_prompt": metadata.get("full_prompt") if metadata else None,
-                "error_msg": error_msg,
-                "video_url": metadata.get("video_url") if metadata else None,
-                "error_code": error_code,
-                "retryable": retryable,
-            }
-            _persist_metadata(meta_path, {"error_code": error_code, "retryable": retryable})
+            outcome.set_result({"status": "failed"})
+            return outcome
+
+        def attempt(index: int) -> None:
+            if index > 0:
+                # Fail over to whichever remaining provider has free capacity now
+                candidates[index:] = prefer_free_capacity(candidates[index:])
+            provider_id, provider_model_id = candidates[index]
+            try:
+                STORE.update_task(
+                    task_id,
+                    {
+                        "status": "running",
+                        "provider_id": provider_id,
+                        "provider_model_id": provider_model_id,
+                    },
+                )
+                client = get_provider_client(
+                    provider_id,
+                    model_id=model_id,
+                    provider_model_id=provider_model_id,
+                )
+                future = submit_task(
+                    gen_task,
+                    client,
+                    dry_run=dry_run,
+                    force=force,
+                    pipeline=pipeline,
+                    controller=get_provider_controller(provider_id, provider_model_id),
+                )
+            except Exception as exc:
+                outcome.set_exception(exc)
+                return
+            future.add_done_callback(lambda done: on_done(index, done))
+
+        def on_done(index: int, future: Future) -> None:
+            try:
+                result = future.result()
+                status, local_status, retryable, updates = _collect_result(gen_task, result)
+            except Exception as exc:
+                outcome.set_exception(exc)
+                return
             if (
                 routing_strategy == "failover"
                 and status == "failed"
@@ -229,12 +268,98 @@ class RunManager:
                 and retryable
             ):
                 if index < len(candidates) - 1:
-                    continue
-            STORE.update_task(task_id, last_updates)
-            return {"status": status}
+                    attempt(index + 1)
+                    return
+            STORE.update_task(task_id, updates)
+            outcome.set_result({"status": status})
 
-        STORE.update_task(task_id, last_updates or {"status": "failed"})
-        return {"status": (last_updates.get("status") if last_updates else "failed")}
+        attempt(0)
+        return outcome
+
+
+def _select_candidates(
+    task_jobs: List[Tuple[str, GenerationTask]],
+    model_id: str,
+    routing_strategy: str,
+) -> Tuple[Dict[str, List[Tuple[str, str]]], Dict[str, str]]:
+    selections: Dict[str, List[Tuple[str, str]]] = {}
+    failures: Dict[str, str] = {}
+    for task_id, gen_task in task_jobs:
+        try:
+            selections[task_id] = select_provider_candidates(
+                model_id,
+                routing_strategy=routing_strategy,
+                required_durations=[gen_task.segment.duration_seconds],
+                required_resolutions=[gen_task.segment.resolution],
+                requires_pro=gen_task.segment.is_pro,
+                requires_image=bool(gen_task.segment.image_url),
+            )
+        except ValueError as exc:
+            selections[task_id] = []
+            failures[task_id] = str(exc)
+    return selections, failures
+
+
+def _record_run_provider(
+    run_id: str,
+    selections: Dict[str, List[Tuple[str, str]]],
+    failures: Dict[str, str],
+) -> None:
+    chosen = {candidates[0] for candidates in selections.values() if candidates}
+    if len(chosen) == 1 and not failures:
+        provider_id, provider_model_id = next(iter(chosen))
+        STORE.update_run(run_id, {"provider_id": provider_id, "provider_model_id": provider_model_id})
+    else:
+        STORE.update_run(run_id, {"provider_id": None, "provider_model_id": None})
+
+
+def _finalize_run(run_id: str) -> None:
+    run = STORE.get_run(run_id)
+    if not run:
+        return
+    final_status = "completed"
+    if run.get("failed", 0) > 0 or run.get("download_failed", 0) > 0:
+        final_status = "failed"
+    STORE.update_run(run_id, {"status": final_status})
+
+
+def _collect_result(gen_task: GenerationTask, result: str) -> Tuple[str, Optional[str], Optional[bool], Dict[str, Any]]:
+    meta_path = gen_task.output_dir / f"{gen_task.output_filename_base}_{gen_task.id}.json"
+    video_path = gen_task.output_dir / f"{gen_task.output_filename_base}_{gen_task.id}.mp4"
+    if result == "skipped":
+        # Produced by an earlier run: point the task at the existing output
+        existing = lookup_output(gen_task)
+        if existing:
+            video_path = Path(existing["video_path"])
+            meta_path = video_path.with_suffix(".json")
+    metadata = read_metadata(meta_path)
+    local_status = metadata.get("local_status") if metadata else None
+
+    status = _map_status(result, local_status)
+    error_msg = metadata.get("error_msg") if metadata else None
+    error_code = None
+    retryable = None
+    if status != "completed":
+        if local_status == "download_failed":
+            error_code = "download_failed"
+            retryable = False
+        else:
+            error_code, retryable = classify_error(error_msg)
+    updates = {
+        "status": status,
+        "metadata_path": str(meta_path),
+        "video_path": str(video_path),
+        "full_prompt": metadata.get("full_prompt") if metadata else None,
+        "error_msg": error_msg,
+        "video_url": metadata.get("video_url") if metadata else None,
+        "error_code": error_code,
+        "retryable": retryable,
+    }
+    persisted = {k: v for k, v in {"error_code": error_code, "retryable": retryable}.items() if v is not None}
+    if metadata and persisted:
+        # Merged into the in-memory document the worker just wrote: one background write covers both
+        update_metadata(meta_path, persisted)
+    return status, local_status, retryable, updates
 
 
 def _map_status(result: str, local_status: Optional[str]) -> str:
@@ -245,26 +370,4 @@ def _map_status(result: str, local_status: Optional[str]) -> str:
     return "failed"
 
 
-def _load_metadata(path: Path) -> Dict[str, Any]:
-    if not path.exists():
-        return {}
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except (OSError, json.JSONDecodeError):
-        return {}
-
-
-def _persist_metadata(path: Path, updates: Dict[str, Any]) -> None:
-    if not path.exists():
-        return
-    metadata = _load_metadata(path)
-    metadata.update({k: v for k, v in updates.items() if v is not None})
-    try:
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
-    except OSError:
-        return
-
-
 RUNNER = RunManager()
@@ -5,9 +5,17 @@ from typing import Dict, List, Optional, Any
 
 from pydantic import BaseModel
 
+from src.concurrency import configure_provider_concurrency
+from src.rate_limiter import DEFAULT_RATE_LIMITS, rate_limiters
+
 from ..schemas.task import Segment
 
 
+def _default_rate_limits() -> Dict[str, Dict[str, float]]:
+    # Each provider gets its own copy so edits through the API don't leak into the defaults
+    return {endpoint: dict(limits) for endpoint, limits in DEFAULT_RATE_LIMITS.items()}
+
+
 class InMemoryStore:
     def __init__(self) -> None:
         self._lock = threading.Lock()
@@ -28,10 +36,15 @@ class InMemoryStore:
                 "enabled": True,
                 "priority": 10,
                 "weight": 1,
+                "max_concurrency": 20,
+                # Optional per provider-model caps, e.g. {"sora2-pro": 5}
+                "model_max_concurrency": {},
                 "supports_image_to_video": True,
                 "supported_durations": [10, 15, 25],
                 "supported_resolutions": ["horizontal", "vertical"],
                 "supports_pro": True,
+                # Token buckets per endpoint class (rate: requests/s, burst: bucket size)
+                "rate_limits": _default_rate_limits(),
             },
             "openai": {
                 "id": "openai",
@@ -39,10 +52,13 @@ class InMemoryStore:
                 "enabled": False,
                 "priority": 20,
                 "weight": 1,
+                "max_concurrency": 10,
+                "model_max_concurrency": {},
                 "supports_image_to_video": True,
                 "supported_durations": [4, 8, 12],
                 "supported_resolutions": ["horizontal", "vertical"],
                 "supports_pro": True,
+                "rate_limits": _default_rate_limits(),
             },
             "aihubmix": {
                 "id": "aihubmix",
@@ -50,12 +66,22 @@ class InMemoryStore:
                 "enabled": False,
                 "priority": 30,
                 "weight": 1,
+                "max_concurrency": 10,
+                "model_max_concurrency": {},
                 "supports_image_to_video": True,
                 "supported_durations": [4, 8, 12],
                 "supported_resolutions": ["horizontal", "vertical"],
                 "supports_pro": True,
+                "rate_limits": _default_rate_limits(),
             },
         }
+        for provider_id, provider in self.providers.items():
+            rate_limiters.configure(provider_id, provider.get("rate_limits"))
+            configure_provider_concurrency(
+                provider_id,
+                provider.get("max_concurrency"),
+                provider.get("model_max_concurrency"),
+            )
 
     def _seed_models(self) -> None:
         self.models = {
@@ -290,7 +316,21 @@ class InMemoryStore:
             provider = self.providers.get(provider_id)
             if not provider:
                 return None
+            rate_limits = updates.pop("rate_limits", None)
             provider.update(updates)
+            if rate_limits:
+                merged = {key: dict(value) for key, value in (provider.get("rate_limits") or {}).items()}
+                for endpoint, limits in rate_limits.items():
+                    if limits is not None:
+                        merged.setdefault(endpoint, {}).update({k: v for k, v in limits.items() if v is not None})
+                provider["rate_limits"] = merged
+                rate_limiters.configure(provider_id, merged)
+            if "max_concurrency" in updates or "model_max_concurrency" in updates:
+                configure_provider_concurrency(
+                    provider_id,
+                    provider.get("max_concurrency"),
+                    provider.get("model_max_concurrency"),
+                )
             return provider
 
     def list_models(self) -> List[Dict[str, Any]]:
@@ -0,0 +1,300 @@
+import logging
+import os
+import re
+import threading
+import uuid
+import weakref
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+import requests
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from src.config import settings
+from src.download_governor import get_download_governor
+from src.downloader import _proxies
+from src.http_sessions import get_download_session, record_download_bytes
+from src.mp4 import Mp4StreamValidator, Mp4ValidationError
+from src.worker import record_downloaded_video
+
+from .store import STORE
+from .providers.registry import get_provider_client
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 256 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Upstream response headers relayed to the browser
+_RELAYED_HEADERS = ("Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified")
+
+
+class UpstreamError(Exception):
+    """provider 拒绝或无法提供视频内容"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range 请求头，返回闭区间 (start, end)。
+    没有 Range 或格式不支持 (多段等) 时返回 None (返回整个文件)；区间不可满足时抛出 ValueError。
+    """
+    match = _RANGE_RE.match((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"range {header} not satisfiable for {size} bytes")
+    return start, end
+
+
+def _is_whole_file_range(header: Optional[str]) -> bool:
+    """没有 Range，或 Range 为 "bytes=0-" (从头到尾)"""
+    if not header:
+        return True
+    match = _RANGE_RE.match(header.strip())
+    return bool(match) and match.groups() == ("0", "")
+
+
+def _iter_file(path: Path, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+
+
+def local_video_response(path: Path, range_header: Optional[str] = None) -> Response:
+    """从本地文件返回视频，支持单段 Range (206) 以便浏览器拖动进度条"""
+    size = path.stat().st_size
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type="video/mp4", headers={"Accept-Ranges": "bytes"})
+    start, end = byte_range
+    return StreamingResponse(
+        _iter_file(path, start, end - start + 1),
+        status_code=206,
+        media_type="video/mp4",
+        headers={
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+            "Accept-Ranges": "bytes",
+        },
+    )
+
+
+class VideoProxy:
+    """
+    provider 视频内容的流式缓存代理 (OpenAI / AIHubMix 的 /videos/{id}/content 需要服务端 token，不能直接重定向)
+    - 通过共享的 per-host 下载连接池请求上游，边转发给浏览器边写入临时文件 (tee)
+    - 完整且通过 MP4 校验后原子替换到目标路径，之后的请求直接从本地返回 (支持 Range)
+    - 同一目标同时只有一个请求负责写缓存；Range 请求和并发请求只转发不缓存
+    - 上游请求占用全局下载调度器的槽位 (并发数与在途字节上限)，直到转发结束
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._filling: Set[str] = set()
+
+    def _claim(self, dest: Path) -> bool:
+        with self._lock:
+            if str(dest) in self._filling:
+                return False
+            self._filling.add(str(dest))
+            return True
+
+    def _release(self, dest: Path) -> None:
+        with self._lock:
+            self._filling.discard(str(dest))
+
+    def stream(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        dest: Optional[Path],
+        range_header: Optional[str] = None,
+        on_cached: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Response:
+        # Browsers open <video> with "Range: bytes=0-": fetch the whole file so it can be cached,
+        # and answer with the 206 the browser asked for
+        whole_file = _is_whole_file_range(range_header)
+        request_headers = dict(headers)
+        if range_header and not whole_file:
+            request_headers["Range"] = range_header
+        # Held until the body is done (or dropped unsent); close() is idempotent
+        slot = ExitStack()
+        ticket = slot.enter_context(get_download_governor().slot())
+        try:
+            upstream = get_download_session(url).get(
+                url,
+                headers=request_headers,
+                stream=True,
+                proxies=_proxies(),
+                timeout=settings.DOWNLOAD_TIMEOUT_SECONDS,
+            )
+        except requests.RequestException as e:
+            slot.close()
+            raise UpstreamError(f"Upstream request failed: {e}")
+        if upstream.status_code >= 400:
+            upstream.close()
+            slot.close()
+            raise UpstreamError(f"Upstream returned HTTP {upstream.status_code}", upstream.status_code)
+
+        # Only a complete (200) response can become the cached copy
+        cache_to = dest if dest is not None and upstream.status_code == 200 else None
+        status_code = upstream.status_code
+        response_headers = {name: upstream.headers[name] for name in _RELAYED_HEADERS if name in upstream.headers}
+        size = upstream.headers.get("Content-Length")
+        if size and size.isdigit():
+            ticket.reserve(int(size))
+        if range_header and whole_file and status_code == 200 and size and size.isdigit() and int(size) > 0:
+            status_code = 206
+            response_headers["Content-Range"] = f"bytes 0-{int(size) - 1}/{size}"
+            response_headers["Accept-Ranges"] = "bytes"
+        body = self._body(url, upstream, cache_to, on_cached, slot)
+        # A response that is never sent never runs the body's finally
+        weakref.finalize(body, slot.close)
+        return StreamingResponse(
+            body,
+            status_code=status_code,
+            media_type=upstream.headers.get("Content-Type") or "video/mp4",
+            headers=response_headers,
+        )
+
+    def _body(
+        self,
+        url: str,
+        upstream: requests.Response,
+        dest: Optional[Path],
+        on_cached: Optional[Callable[[Dict[str, Any]], None]],
+        slot: ExitStack,
+    ) -> Iterator[bytes]:
+        try:
+            # Claimed on first iteration so a response that is never sent cannot hold the claim
+            if dest is not None and self._claim(dest):
+                yield from self._tee(url, upstream, dest, on_cached)
+            else:
+                yield from self._relay(url, upstream)
+        finally:
+            slot.close()
+
+    def _relay(self, url: str, upstream: requests.Response) -> Iterator[bytes]:
+        governor = get_download_governor()
+        try:
+            for chunk in upstream.iter_content(STREAM_CHUNK_SIZE):
+                if chunk:
+                    record_download_bytes(url, len(chunk))
+                    governor.throttle(len(chunk))
+                    yield chunk
+        finally:
+            upstream.close()
+
+    def _tee(
+        self,
+        url: str,
+        upstream: requests.Response,
+        dest: Path,
+        on_cached: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> Iterator[bytes]:
+        governor = get_download_governor()
+        expected = int(upstream.headers.get("Content-Length") or 0)
+        tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.proxy")
+        validator = Mp4StreamValidator()
+        written = 0
+        complete = False
+        f = None
+        try:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            f = open(tmp, "wb")
+            for chunk in upstream.iter_content(STREAM_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                if f is not None:
+                    try:
+                        f.write(chunk)
+                        validator.feed(chunk)
+                        written += len(chunk)
+                    except (OSError, Mp4ValidationError) as e:
+                        # Keep serving the client; only the cache copy is given up
+                        logger.warning(f"Not caching {dest.name}: {e}")
+                        f.close()
+                        f = None
+                record_download_bytes(url, len(chunk))
+                governor.throttle(len(chunk))
+                yield chunk
+            complete = f is not None and (not expected or written == expected)
+        finally:
+            upstream.close()
+            if f is not None:
+                f.close()
+            try:
+                if complete:
+                    media = validator.finish()
+                    os.replace(tmp, dest)
+                    logger.info(f"Cached proxied video {dest} ({written} bytes)")
+                    if on_cached:
+                        on_cached(media)
+            except (OSError, Mp4ValidationError) as e:
+                logger.warning(f"Discarding proxied copy of {dest.name}: {e}")
+            finally:
+                tmp.unlink(missing_ok=True)
+                self._release(dest)
+
+
+def _mark_downloaded(task: Dict[str, Any], media: Dict[str, Any]) -> None:
+    """
+    代理缓存补齐了下载失败的视频: 与 redownload_video 相同的收尾 (元数据、内容存储、manifest、提交日志)，
+    任务改为已完成
+    """
+    metadata_path = task.get("metadata_path")
+    if metadata_path and Path(metadata_path).exists():
+        record_downloaded_video(
+            Path(task["video_path"]), Path(metadata_path), media, video_url=task.get("video_url")
+        )
+    if task.get("status") == "download_failed":
+        STORE.update_task(task["id"], {"status": "completed", "error_msg": None, "error_code": None, "retryable": None})
+        if task.get("run_id"):
+            STORE.recount_run(task["run_id"])
+
+
+def proxy_task_video(task: Dict[str, Any], range_header: Optional[str] = None) -> Response:
+    """
+    返回任务视频: 本地已有则直接返回 (支持 Range)，否则经 provider 鉴权从上游流式转发并缓存到 video_path。
+    """
+    headers: Dict[str, str] = {}
+    if task.get("provider_id"):
+        try:
+            client = get_provider_client(task["provider_id"], provider_model_id=task.get("provider_model_id"))
+        except ValueError:
+            client = None
+        content_headers = getattr(client, "content_headers", None)
+        if content_headers:
+            headers = content_headers()
+    dest = Path(task["video_path"]) if task.get("video_path") else None
+    return VIDEO_PROXY.stream(
+        task["video_url"],
+        headers,
+        dest,
+        range_header=range_header,
+        on_cached=lambda media: _mark_downloaded(task, media),
+    )
+
+
+VIDEO_PROXY = VideoProxy()
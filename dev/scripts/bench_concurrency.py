@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for AdaptiveConcurrencyController.acquire().
+
+Starts N waiter threads against a small limit and measures:
+- hand-off latency: time between a release() and the next waiter getting its slot
+- CPU time burned by the process while waiters sit blocked (idle window)
+
+Run from the repo root:
+    SORA_API_KEY=x python dev/scripts/bench_concurrency.py --waiters 200 --limit 10
+Pass --legacy to compare against the old sleep(1) polling acquire.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("SORA_API_KEY", "bench")
+
+from src.concurrency import AdaptiveConcurrencyController  # noqa: E402
+
+
+class LegacyPollingController(AdaptiveConcurrencyController):
+    """The pre-Condition acquire: re-check the limit once per second."""
+
+    def acquire(self):
+        while True:
+            limit = self.get_dynamic_limit()
+            with self._lock:
+                if self.current_active < limit:
+                    self.current_active += 1
+                    return
+            time.sleep(1)
+
+    def release(self):
+        with self._lock:
+            self.current_active -= 1
+
+
+def _run(controller: AdaptiveConcurrencyController, waiters: int, hold: float, idle: float) -> None:
+    latencies: List[float] = []
+    released_at: List[float] = []
+    lock = threading.Lock()
+    gate = threading.Event()
+
+    def worker() -> None:
+        gate.wait()
+        controller.acquire()
+        acquired = time.perf_counter()
+        with lock:
+            if released_at:
+                latencies.append(acquired - released_at.pop(0))
+        time.sleep(hold)
+        with lock:
+            released_at.append(time.perf_counter())
+        controller.release()
+
+    # Fill every slot so all waiters block, then measure idle CPU
+    for _ in range(controller.max_concurrency):
+        controller.acquire()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(waiters)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    time.sleep(0.2)
+
+    cpu_start = time.process_time()
+    time.sleep(idle)
+    idle_cpu = time.process_time() - cpu_start
+
+    wall_start = time.perf_counter()
+    for _ in range(controller.max_concurrency):
+        with lock:
+            released_at.append(time.perf_counter())
+        controller.release()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    p50 = statistics.median(latencies) if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+    print(f"  waiters={waiters} limit={controller.max_concurrency} hold={hold * 1000:.0f}ms")
+    print(f"  idle CPU over {idle:.1f}s: {idle_cpu * 1000:.1f} ms")
+    print(f"  hand-off latency p50={p50 * 1000:.2f} ms p99={p99 * 1000:.2f} ms max={max(latencies, default=0) * 1000:.2f} ms")
+    print(f"  drain wall time: {wall:.2f}s (ideal {waiters / controller.max_concurrency * hold:.2f}s)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark concurrency controller acquire latency.")
+    parser.add_argument("--waiters", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--hold-ms", type=float, default=20.0, help="How long each waiter holds its slot.")
+    parser.add_argument("--idle", type=float, default=3.0, help="Seconds to measure CPU with all waiters blocked.")
+    parser.add_argument("--legacy", action="store_true", help="Also run the old polling acquire for comparison.")
+    args = parser.parse_args()
+
+    print("condition-based acquire:")
+    _run(
+        AdaptiveConcurrencyController(max_concurrency=args.limit, min_concurrency=args.limit),
+        args.waiters,
+        args.hold_ms / 1000,
+        args.idle,
+    )
+    if args.legacy:
+        print("legacy polling acquire:")
+        _run(
+            LegacyPollingController(max_concurrency=args.limit, min_concurrency=args.limit),
+            args.waiters,
+            args.hold_ms / 1000,
+            args.idle,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,11 +5,12 @@ import logging
 import json
 import time
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 
 # Third-party libraries
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeRemainingColumn
+from rich.progress import Progress, ProgressColumn, SpinnerColumn, BarColumn, TextColumn, TimeRemainingColumn
+from rich.text import Text
 from rich.logging import RichHandler
 from rich.panel import Panel
 from rich.prompt import Prompt, Confirm
@@ -18,7 +19,14 @@ from rich.prompt import Prompt, Confirm
 from src.config import settings, setup_logging
 from src.scanner import discover_tasks
 from src.api_client import SoraClient
-from src.worker import process_task
+from src.worker import resume_outstanding, submit_task
+from src.journal import get_journal
+from src.repair import DownloadRepairQueue, get_repair_queue, sweep_output_tree
+from src.http_sessions import download_stats
+from src.download_governor import get_download_governor
+from src.disk_budget import get_disk_budget
+from src.pipeline import GenerationPipeline
+from src.poll_scheduler import shutdown_poll_scheduler
 from src.models import GenerationTask
 from src.concurrency import init_controller
 from src.interactor import (
@@ -33,7 +41,20 @@ from src.interactor import (
 
 # Setup Rich Console
 console = Console()
-executor = None
+pipeline = None
+
+
+class DownloadRateColumn(ProgressColumn):
+    """进度条中实时显示全局下载吞吐与进行中的下载数"""
+
+    def render(self, task) -> Text:
+        stats = get_download_governor().stats()
+        if not stats["active"] and not stats["throughput_bps"]:
+            return Text("")
+        return Text(
+            f"⬇ {stats['throughput_bps'] / 1024 / 1024:.1f} MB/s ({stats['active']} 下载中)",
+            style="cyan",
+        )
 
 def signal_handler(sig, frame):
     console.print("\n[bold red]正在停止... (接收到中断信号)[/bold red]")
@@ -105,7 +126,7 @@ def run_wizard_mode(args):
     # 2.2 Resolution
     interactive_resolution_override(tasks)
     
-    # 2.3 Start Frame Injection (COS Upload)
+    # 2.3 Start Frame Injection (Object Storage Upload)
     interactive_image_injection(tasks)
     
     # 2.4 Validate Image URLs
@@ -165,14 +186,132 @@ def run_wizard_mode(args):
     
     if args.dry_run:
         console.print("[bold yellow]注意: 当前为空跑模式 (Dry Run)，不会真实扣费。[/bold yellow]")
+
+    # Disk capacity pre-flight: projected video sizes vs free space on each output volume
+    disk_ok = True
+    budget = get_disk_budget()
+    if budget and not args.dry_run:
+        for volume in budget.plan_tasks(tasks):
+            console.print(
+                f"预计占用磁盘: [bold]{volume['required_bytes'] / 1024 ** 3:.1f} GB[/bold] "
+                f"(可用 {volume['available_bytes'] / 1024 ** 3:.1f} GB, {volume['volume']})"
+            )
+            if not volume["fits"]:
+                disk_ok = False
+                console.print(
+                    "[bold red]警告: 输出目录所在磁盘空间不足，空间用尽后新任务会暂停提交，"
+                    f"等待超过 {settings.DISK_BUDGET_WAIT_SECONDS:.0f} 秒则放弃 (不会扣费)。[/bold red]"
+                )
         
-    if not Confirm.ask("🚀 确认开始执行生成队列?", default=True):
+    if not Confirm.ask("🚀 确认开始执行生成队列?", default=disk_ok):
         console.print("[yellow]已取消操作。[/yellow]")
         sys.exit(0)
 
     # Return configured tasks and concurrency
     return tasks, concurrency
 
+def run_resume_mode(client: SoraClient):
+    """
+    恢复模式: 重新挂载提交日志中未完成的远端任务 (继续轮询或下载)，不会重新提交。
+    """
+    global pipeline
+    journal = get_journal()
+    outstanding = journal.outstanding() if journal else []
+    if not outstanding:
+        console.print("[green]提交日志中没有未完成的远端任务。[/green]")
+        return
+
+    console.print(f"[bold cyan]发现 {len(outstanding)} 个未完成的远端任务，正在恢复...[/bold cyan]")
+    init_controller(settings.MAX_CONCURRENT_TASKS)
+    pipeline = GenerationPipeline()
+    completed_count = 0
+    failed_count = 0
+    interrupted = False
+    try:
+        # Only Sora.hk entries can be resumed from the CLI; other providers belong to the backend
+        futures = resume_outstanding(
+            lambda entry: client if entry.get("provider_id") in (None, "sora_hk") else None,
+            pipeline=pipeline,
+        )
+        for task_id, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as exc:
+                result = "failed"
+                console.print(f"[red]Task {task_id} 异常: {exc}[/red]")
+            if result == "completed":
+                completed_count += 1
+                console.print(f"[blue]✔ 任务完成: {task_id}[/blue]")
+            else:
+                failed_count += 1
+                console.print(f"[red]✘ 任务失败: {task_id}[/red]")
+    except KeyboardInterrupt:
+        interrupted = True
+        console.print("\n[bold red]正在终止所有任务...[/bold red]")
+    finally:
+        if interrupted:
+            shutdown_poll_scheduler()
+        pipeline.shutdown(wait=not interrupted, cancel=interrupted)
+        pipeline = None
+    console.print(f"恢复完成: 成功 [green]{completed_count}[/green]，失败 [red]{failed_count}[/red]")
+
+def run_redownload_mode(client: SoraClient, root: Path):
+    """
+    重新下载模式: 扫描输出目录树中的元数据 JSON，对下载失败或视频文件丢失的条目
+    使用保存的 video_url / 远端 task_id 只重跑下载阶段，不会重新生成 (不扣费)。
+    """
+    if not root.exists():
+        console.print(f"[red]目录不存在: {root}[/red]")
+        return
+    # Dedicated queue so a bulk redownload runs at the full download concurrency
+    queue = DownloadRepairQueue(workers=settings.DOWNLOAD_MAX_CONCURRENT or settings.REPAIR_WORKERS)
+    results = {"ok": 0, "failed": 0}
+
+    def on_done(job, ok: bool) -> None:
+        results["ok" if ok else "failed"] += 1
+        if ok:
+            console.print(f"[blue]✔ 已重新下载: {job.video_path.name}[/blue]")
+        else:
+            console.print(f"[red]✘ 重新下载失败: {job.video_path.name} ({job.error})[/red]")
+
+    added = sweep_output_tree(root, queue, client=client, on_done=on_done, force=True, include_missing=True)
+    if not added:
+        console.print(f"[green]{root} 中没有需要重新下载的视频。[/green]")
+        queue.shutdown()
+        return
+    console.print(f"[bold cyan]发现 {added} 个需要重新下载的视频 (只重新下载，不重新生成)...[/bold cyan]")
+    try:
+        queue.join()
+    except KeyboardInterrupt:
+        console.print("\n[bold red]正在终止重新下载...[/bold red]")
+        shutdown_poll_scheduler()
+    finally:
+        queue.shutdown()
+    console.print(f"重新下载完成: 成功 [green]{results['ok']}[/green]，失败 [red]{results['failed']}[/red]")
+
+def repair_failed_downloads(client: SoraClient, tasks: list) -> set:
+    """
+    下载修复: 本次任务中 download_failed 的视频按 URL 过期时间顺序重新下载 (带退避)，不重新生成。
+    返回修复成功的本地任务 ID。
+    """
+    queue = get_repair_queue()
+    repaired = set()
+
+    def on_done(job, ok: bool) -> None:
+        if ok and job.task is not None:
+            repaired.add(job.task.id)
+
+    by_id = {task.id: task for task in tasks}
+    added = sum(
+        sweep_output_tree(output_dir, queue, client=client, tasks=by_id, on_done=on_done)
+        for output_dir in {task.output_dir for task in tasks}
+        if output_dir.exists()
+    )
+    if added:
+        console.print(f"[cyan]🔧 正在修复 {added} 个下载失败的视频 (只重新下载，不重新生成)...[/cyan]")
+        queue.join()
+    return repaired
+
 def main():
     parser = argparse.ArgumentParser(description="Sora 视频批量生成工具")
     parser.add_argument("--input-dir", type=Path, help="自定义输入目录")
@@ -180,6 +319,15 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="空跑模式")
     parser.add_argument("--force", action="store_true", help="强制覆盖")
     parser.add_argument("--verbose", action="store_true", help="详细日志")
+    parser.add_argument("--resume", action="store_true", help="恢复上次中断时未完成的远端任务 (不重新提交)")
+    parser.add_argument(
+        "--redownload",
+        type=Path,
+        nargs="?",
+        const=settings.DEFAULT_OUTPUT_DIR,
+        metavar="OUTPUT_DIR",
+        help="只重新下载输出目录中下载失败或丢失的视频 (读取元数据 JSON，不重新生成)",
+    )
     args = parser.parse_args()
 
     setup_logging(args.verbose)
@@ -192,6 +340,23 @@ def main():
         console.print(f"[bold red]✘ API 客户端初始化失败: {e}[/bold red]")
         sys.exit(1)
 
+    if args.resume:
+        run_resume_mode(client)
+        return
+
+    if args.redownload:
+        run_redownload_mode(client, args.redownload)
+        return
+
+    journal = get_journal()
+    if journal:
+        journal.compact()
+    if journal and journal.outstanding():
+        console.print(
+            f"[yellow]提示: 提交日志中有 {len(journal.outstanding())} 个未完成的远端任务，"
+            "重新运行相同任务会自动续接；也可以使用 --resume 单独恢复。[/yellow]"
+        )
+
     # Run Wizard
     tasks, concurrency = run_wizard_mode(args)
 
@@ -205,7 +370,7 @@ def main():
     skipped_count = 0
     completed_count = 0
     
-    global executor
+    global pipeline
     interrupted = False
     try:
         with Progress(
@@ -214,16 +379,18 @@ def main():
             BarColumn(),
             TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
             TimeRemainingColumn(),
+            DownloadRateColumn(),
             console=console
         ) as progress:
             
             overall_task = progress.add_task("[green]总进度", total=len(tasks))
             
-            # Use the user-configured concurrency
-            executor = ThreadPoolExecutor(max_workers=concurrency)
+            # Submit / poll / download run as separate stages; the controller
+            # (initialized above) caps in-flight generations, not threads.
+            pipeline = GenerationPipeline(submit_workers=min(concurrency, settings.SUBMIT_WORKERS))
             try:
                 future_to_task = {
-                    executor.submit(process_task, task, client, args.dry_run, args.force): task 
+                    submit_task(task, client, args.dry_run, args.force, pipeline=pipeline): task 
                     for task in tasks
                 }
                 
@@ -248,9 +415,16 @@ def main():
                 interrupted = True
                 raise
             finally:
-                if executor:
-                    executor.shutdown(wait=not interrupted, cancel_futures=interrupted)
-                    executor = None
+                if interrupted:
+                    shutdown_poll_scheduler()
+                if pipeline:
+                    pipeline.shutdown(wait=not interrupted, cancel=interrupted)
+                    pipeline = None
+    
+        if failed_tasks and settings.REPAIR_ENABLED and not args.dry_run:
+            repaired = repair_failed_downloads(client, [task for task in tasks if task.id in failed_tasks])
+            completed_count += len(repaired)
+            failed_tasks = [task_id for task_id in failed_tasks if task_id not in repaired]
     
     except KeyboardInterrupt:
         console.print("\n[bold red]正在终止所有任务...[/bold red]")
@@ -260,6 +434,13 @@ def main():
     console.print(f"[bold]执行报告[/bold]")
     console.print(f"✔ 成功: [green]{completed_count}[/green]")
     console.print(f"⏭ 跳过: [dim]{skipped_count}[/dim]")
+    downloads = download_stats()["total"]
+    if downloads:
+        console.print(
+            f"⬇ 下载: {downloads['bytes_downloaded'] / 1024 / 1024:.1f} MB, "
+            f"连接 新建 {downloads['connections_opened']} / 复用 {downloads['connections_reused']}, "
+            f"TLS {downloads['tls_seconds']:.2f}s"
+        )
     
     if failed_tasks:
         console.print(f"✘ 失败: [red]{len(failed_tasks)}[/red]")
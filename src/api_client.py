@@ -1,11 +1,16 @@
 import requests
+import httpx
 import logging
 import time
+from pathlib import Path
 from typing import Dict, Any, Optional
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from .config import settings
+from .async_http import get_async_client
+from .downloader import download_file, download_file_async
+from .rate_limiter import rate_limiters
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +23,64 @@ class AuthenticationError(APIError):
 class RateLimitError(APIError):
     pass
 
+def _decode_json(response: Any, req_id: str) -> Dict:
+    """
+    Validates and decodes a JSON API body.
+    Works for both requests.Response and httpx.Response.
+    """
+    if response.status_code == 204:
+        msg = f"Empty response (204) from API [ReqID: {req_id}]"
+        logger.error(msg)
+        raise APIError(msg)
+
+    content_type = response.headers.get("Content-Type", "")
+    if "application/json" not in content_type and "+json" not in content_type:
+        body_preview = (response.text or "").strip()
+        if len(body_preview) > 500:
+            body_preview = body_preview[:500] + "...(truncated)"
+        msg = (
+            "Non-JSON response from API "
+            f"(status={response.status_code}, content-type={content_type or 'unknown'}): {body_preview}"
+        )
+        logger.error(msg)
+        raise APIError(msg)
+
+    body_text = (response.text or "").strip()
+    if not body_text:
+        msg = f"Empty response body from API [ReqID: {req_id}]"
+        logger.error(msg)
+        raise APIError(msg)
+
+    try:
+        return response.json()
+    except ValueError:
+        msg = f"Invalid JSON response from API [ReqID: {req_id}]"
+        logger.error(msg)
+        raise APIError(msg)
+
+def _build_create_payload(
+    prompt: str,
+    duration: int,
+    resolution: str,
+    is_pro: bool,
+    image_url: Optional[str],
+    **kwargs,
+) -> Dict[str, Any]:
+    payload = {
+        "prompt": prompt,
+        "duration": duration,
+        "resolution": resolution,
+        "is_pro": is_pro,
+        "image_url": image_url,
+        "remove_watermark": True,
+        **kwargs
+    }
+    return {k: v for k, v in payload.items() if v is not None}
+
 class SoraClient:
+    provider_id = "sora_hk"
+    provider_model_id = None
+
     def __init__(self):
         self.base_url = settings.SORA_BASE_URL.rstrip('/')
         
@@ -74,35 +136,7 @@ class SoraClient:
             
             response.raise_for_status()
 
-            if response.status_code == 204:
-                msg = f"Empty response (204) from API [ReqID: {req_id}]"
-                logger.error(msg)
-                raise APIError(msg)
-
-            content_type = response.headers.get("Content-Type", "")
-            if "application/json" not in content_type and "+json" not in content_type:
-                body_preview = (response.text or "").strip()
-                if len(body_preview) > 500:
-                    body_preview = body_preview[:500] + "...(truncated)"
-                msg = (
-                    "Non-JSON response from API "
-                    f"(status={response.status_code}, content-type={content_type or 'unknown'}): {body_preview}"
-                )
-                logger.error(msg)
-                raise APIError(msg)
-
-            body_text = (response.text or "").strip()
-            if not body_text:
-                msg = f"Empty response body from API [ReqID: {req_id}]"
-                logger.error(msg)
-                raise APIError(msg)
-
-            try:
-                return response.json()
-            except ValueError:
-                msg = f"Invalid JSON response from API [ReqID: {req_id}]"
-                logger.error(msg)
-                raise APIError(msg)
+            return _decode_json(response, req_id)
             
         except requests.exceptions.RequestException as e:
             # Masking sensitive URL parameters if any (though we use body mostly)
@@ -120,21 +154,12 @@ class SoraClient:
         Creates a video generation task.
         Returns task_id.
         """
-        payload = {
-            "prompt": prompt,
-            "duration": duration,
-            "resolution": resolution,
-            "is_pro": is_pro,
-            "image_url": image_url,
-            "remove_watermark": True,
-            **kwargs
-        }
-        
-        payload = {k: v for k, v in payload.items() if v is not None}
+        payload = _build_create_payload(prompt, duration, resolution, is_pro, image_url, **kwargs)
         
         # Log masked payload
         logger.debug(f"Creating task") 
         
+        rate_limiters.acquire("sora_hk", "create")
         result = self._request("POST", "/create", payload)
         
         if result.get("code") != 200:
@@ -151,9 +176,98 @@ class SoraClient:
         """
         Gets task status.
         """
+        rate_limiters.acquire("sora_hk", "status")
         result = self._request("GET", f"/tasks/{task_id}")
         
         if result.get("code") != 200:
             raise APIError(f"API Error: {result.get('message')}")
             
         return result["data"]
+
+    def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
+        """Downloads the finished video (throttled by the provider's download bucket)."""
+        if not video_url:
+            return False
+        rate_limiters.acquire("sora_hk", "download")
+        return download_file(video_url, dest_path)
+
+
+class AsyncSoraClient:
+    """
+    Non-blocking counterpart of SoraClient built on the shared httpx pool.
+    Coroutines must be awaited on the event loop that owns the pool.
+    """
+    provider_id = "sora_hk"
+    provider_model_id = None
+
+    def __init__(self):
+        self.base_url = settings.SORA_BASE_URL.rstrip('/')
+        self._headers = {
+            "Authorization": f"Bearer {settings.SORA_API_KEY}",
+            "Content-Type": "application/json"
+        }
+
+    async def _request(self, method: str, endpoint: str, data: Dict = None) -> Dict:
+        url = f"{self.base_url}{endpoint}"
+        try:
+            response = await get_async_client("sora_hk").request(
+                method,
+                url,
+                json=data,
+                headers=self._headers,
+                timeout=settings.API_REQUEST_TIMEOUT_SECONDS,
+            )
+
+            req_id = response.headers.get("x-request-id", "unknown")
+            if response.status_code >= 400:
+                logger.warning(f"API Request Failed [ReqID: {req_id}] - Status: {response.status_code}")
+
+            if response.status_code == 401:
+                raise AuthenticationError(f"Invalid API Key [ReqID: {req_id}]")
+            if response.status_code == 429:
+                raise RateLimitError(f"Rate limit exceeded [ReqID: {req_id}]")
+
+            response.raise_for_status()
+            return _decode_json(response, req_id)
+
+        except httpx.HTTPError as e:
+            safe_error = str(e).replace(settings.SORA_API_KEY, "******")
+            logger.error(f"API Request Failed: {safe_error}")
+            raise APIError(safe_error)
+
+    @retry(
+        retry=retry_if_exception_type((APIError, RateLimitError)), 
+        stop=stop_after_attempt(3), 
+        wait=wait_exponential(multiplier=1, min=2, max=10)
+    )
+    async def create_task(self, prompt: str, duration: int, resolution: str, is_pro: bool, image_url: Optional[str] = None, **kwargs) -> str:
+        payload = _build_create_payload(prompt, duration, resolution, is_pro, image_url, **kwargs)
+        logger.debug("Creating task")
+
+        await rate_limiters.acquire_async("sora_hk", "create")
+        result = await self._request("POST", "/create", payload)
+
+        if result.get("code") != 200:
+            raise APIError(f"API Error: {result.get('message')}")
+
+        return result["data"]["task_id"]
+
+    @retry(
+        retry=retry_if_exception_type((APIError, RateLimitError)), 
+        stop=stop_after_attempt(3), 
+        wait=wait_exponential(multiplier=1, min=2, max=10)
+    )
+    async def get_task(self, task_id: str) -> Dict[str, Any]:
+        await rate_limiters.acquire_async("sora_hk", "status")
+        result = await self._request("GET", f"/tasks/{task_id}")
+
+        if result.get("code") != 200:
+            raise APIError(f"API Error: {result.get('message')}")
+
+        return result["data"]
+
+    async def download_video(self, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
+        if not video_url:
+            return False
+        await rate_limiters.acquire_async("sora_hk", "download")
+        return await download_file_async(video_url, dest_path)
@@ -1,12 +1,63 @@
 import logging
+import os
+import threading
 from pathlib import Path
-from typing import Optional, List, Literal
+from typing import Dict, Optional, List, Literal
 
 logger = logging.getLogger(__name__)
 
 # Supported image extensions for lookup
 IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.webp', '.bmp']
 
+
+class DirectoryIndex:
+    """
+    一个资产子目录的图片索引: 一次 os.scandir 建立 小写文件名主干 -> 图片文件 的映射。
+    每次查找只 stat 目录本身一次，目录 mtime 变化 (增删改名) 时重新扫描。
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mtime_ns: Optional[int] = None
+        self._stems: Dict[str, List[Path]] = {}
+
+    def _refresh_locked(self) -> None:
+        try:
+            mtime_ns = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            # Missing directory: nothing to find (checked again on the next lookup)
+            self._mtime_ns = None
+            self._stems = {}
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+        stems: Dict[str, List[Path]] = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    path = Path(entry.path)
+                    if path.suffix.lower() in IMAGE_EXTENSIONS and entry.is_file():
+                        stems.setdefault(path.stem.lower(), []).append(path)
+        except OSError as e:
+            logger.warning(f"Cannot list asset directory {self.directory}: {e}")
+            return
+        self._mtime_ns = mtime_ns
+        self._stems = stems
+
+    def lookup(self, stem_name: str) -> Optional[Path]:
+        """
+        按文件名主干查找图片 (不区分大小写)。
+        多个匹配时大小写完全一致者优先，其次按 IMAGE_EXTENSIONS 的顺序。
+        """
+        with self._lock:
+            self._refresh_locked()
+            matches = self._stems.get(stem_name.lower())
+        if not matches:
+            return None
+        return min(matches, key=lambda p: (p.stem != stem_name, IMAGE_EXTENSIONS.index(p.suffix.lower())))
+
+
 class AssetManager:
     """
     Manages the 'asset' directory structure for a given Storyboard JSON file.
@@ -29,6 +80,8 @@ class AssetManager:
             "props": self.base_dir / "props",
             "segment": self.base_dir / "segment"
         }
+        # Reused by every lookup through this manager (one per storyboard)
+        self._indexes: Dict[Path, DirectoryIndex] = {}
 
     def scaffold(self):
         """
@@ -50,16 +103,13 @@ class AssetManager:
     def _find_image(self, directory: Path, stem_name: str) -> Optional[Path]:
         """
         Helper to find an image file with various extensions.
+        Served from a per-directory listing index instead of one exists() call per extension.
         """
         # Sanitize filename (remove illegal chars if necessary, but assume mapped)
         # For now, we assume the user names the file exactly as the asset name.
-        
-        # 1. Exact match with extensions
-        for ext in IMAGE_EXTENSIONS:
-            candidate = directory / f"{stem_name}{ext}"
-            if candidate.exists():
-                return candidate
-        return None
+        if directory not in self._indexes:
+            self._indexes[directory] = DirectoryIndex(directory)
+        return self._indexes[directory].lookup(stem_name)
 
     def get_character_image(self, character_name: str) -> Optional[Path]:
         """
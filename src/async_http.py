@@ -0,0 +1,48 @@
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from .config import settings
+
+# Shared AsyncClient (connection pool) per (event loop, pool name)
+_clients: Dict[Tuple[int, str], httpx.AsyncClient] = {}
+_lock = threading.Lock()
+
+
+def _proxy() -> Optional[str]:
+    return settings.HTTPS_PROXY or settings.HTTP_PROXY
+
+
+def get_async_client(name: str) -> httpx.AsyncClient:
+    """
+    Returns the shared httpx.AsyncClient for `name` on the running event loop.
+    One pool per provider keeps keep-alive connections warm across thousands of tasks.
+    """
+    loop = asyncio.get_running_loop()
+    key = (id(loop), name)
+    with _lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                proxy=_proxy(),
+                limits=httpx.Limits(
+                    max_connections=settings.ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ASYNC_MAX_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(settings.API_REQUEST_TIMEOUT_SECONDS),
+                follow_redirects=True,
+            )
+            _clients[key] = client
+        return client
+
+
+async def aclose_async_clients() -> None:
+    """Closes every shared client bound to the running event loop."""
+    loop_id = id(asyncio.get_running_loop())
+    with _lock:
+        keys = [key for key in _clients if key[0] == loop_id]
+        clients = [_clients.pop(key) for key in keys]
+    for client in clients:
+        await client.aclose()
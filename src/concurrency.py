@@ -1,7 +1,9 @@
+import asyncio
 import time
 import threading
 import logging
-from typing import Optional
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
 from .config import settings
 
 logger = logging.getLogger(__name__)
@@ -12,7 +14,17 @@ class AdaptiveConcurrencyController:
     - 正常模式: 允许最大并发数 (MAX)
     - 安全模式: 遇到连续错误后，降级到最小并发数 (MIN)
     - 恢复机制: 冷却一定时间后，线性释放并发额度 (每分钟+1)
+
+    mode="aimd" 时改为加性增 / 乘性减 (AIMD):
+    - 提交健康 (无错误且延迟未突增) 时，每满一个窗口的成功提交额度 +increase
+    - 遇到 RateLimitError、连续错误或提交延迟突增时，额度乘以 backoff
+    - 额度在 [MIN, MAX] 之间浮动，收敛到 provider 的真实承载能力，无需长时间冷却
     """
+    # AIMD: 两次乘性减之间的最小间隔，避免同一批 429 把额度连续砍到底
+    aimd_decrease_gap_seconds = 2.0
+    # AIMD: 延迟基线的 EWMA 平滑系数
+    latency_alpha = 0.2
+
     def __init__(
         self,
         max_concurrency: int = 20,
@@ -20,6 +32,10 @@ class AdaptiveConcurrencyController:
         error_threshold: Optional[int] = None,
         cooldown_seconds: Optional[int] = None,
         recovery_rate_seconds: Optional[int] = None,
+        mode: Optional[str] = None,
+        aimd_increase: Optional[float] = None,
+        aimd_backoff: Optional[float] = None,
+        latency_tolerance: Optional[float] = None,
     ):
         self.max_concurrency = max_concurrency
         self.min_concurrency = (
@@ -29,6 +45,11 @@ class AdaptiveConcurrencyController:
         # State
         self.current_active = 0
         self._lock = threading.Lock()
+        # 许可释放 / 额度恢复时唤醒等待者
+        self._cond = threading.Condition(self._lock)
+        self._recovery_timer: Optional[threading.Timer] = None
+        # 协程等待者 (loop, future)，由 release() 跨线程唤醒
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
         
         # Error tracking
         self.is_safe_mode = False
@@ -46,8 +67,29 @@ class AdaptiveConcurrencyController:
             recovery_rate_seconds if recovery_rate_seconds is not None else settings.CONCURRENCY_RECOVERY_RATE_SECONDS
         )
 
+        # AIMD settings
+        self.mode = (mode or settings.CONCURRENCY_MODE).lower()
+        if self.mode not in {"safe_mode", "aimd"}:
+            raise ValueError(f"unknown concurrency mode: {self.mode}")
+        self.aimd_increase = aimd_increase if aimd_increase is not None else settings.CONCURRENCY_AIMD_INCREASE
+        self.aimd_backoff = aimd_backoff if aimd_backoff is not None else settings.CONCURRENCY_AIMD_BACKOFF
+        self.latency_tolerance = (
+            latency_tolerance if latency_tolerance is not None else settings.CONCURRENCY_LATENCY_TOLERANCE
+        )
+        self._aimd_limit = float(max(self.max_concurrency, 1))
+        self._aimd_floor = float(max(min(self.min_concurrency, self.max_concurrency), 1))
+        self._latency_baseline: Optional[float] = None
+        self._last_decrease_time: float = 0
+
     def get_dynamic_limit(self) -> int:
         """根据当前状态计算允许的最大并发数"""
+        with self._lock:
+            return self._limit_locked()
+
+    def _limit_locked(self) -> int:
+        # Caller must hold self._lock
+        if self.mode == "aimd":
+            return int(self._aimd_limit)
         if not self.is_safe_mode:
             return self.max_concurrency
         
@@ -65,10 +107,9 @@ class AdaptiveConcurrencyController:
         
         # 如果恢复到了最大值，退出安全模式
         if current_limit >= self.max_concurrency:
-            with self._lock:
-                self.is_safe_mode = False
-                self.consecutive_errors = 0
-                logger.info("系统已从安全模式完全恢复，并发限制解除。")
+            self.is_safe_mode = False
+            self.consecutive_errors = 0
+            logger.info("系统已从安全模式完全恢复，并发限制解除。")
             return self.max_concurrency
             
         return current_limit
@@ -76,35 +117,149 @@ class AdaptiveConcurrencyController:
     def acquire(self):
         """
         阻塞直到获得执行许可。
+        等待者由 release() 或恢复计时器直接唤醒，不做轮询。
         """
+        with self._cond:
+            while self.current_active >= self._limit_locked():
+                self._cond.wait()
+            self.current_active += 1
+
+    async def acquire_async(self):
+        """acquire() 的协程版本，等待期间不占用线程"""
+        loop = asyncio.get_running_loop()
         while True:
-            limit = self.get_dynamic_limit()
             with self._lock:
-                if self.current_active < limit:
+                if self.current_active < self._limit_locked():
                     self.current_active += 1
                     return
-            # 如果已满，稍微等待
-            time.sleep(1)
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
 
     def release(self):
-        with self._lock:
+        with self._cond:
             self.current_active -= 1
+            self._notify_locked()
+
+    @property
+    def free_slots(self) -> int:
+        """当前还能立即获得的许可数"""
+        with self._lock:
+            return max(self._limit_locked() - self.current_active, 0)
+
+    def set_max_concurrency(self, max_concurrency: int) -> None:
+        """运行时调整上限 (例如管理端修改 provider 配置)"""
+        with self._cond:
+            self.max_concurrency = max(max_concurrency, 1)
+            self._aimd_floor = float(max(min(self.min_concurrency, self.max_concurrency), 1))
+            self._aimd_limit = min(max(self._aimd_limit, self._aimd_floor), float(self.max_concurrency))
+            self._notify_locked(all_waiters=True)
 
-    def report_error(self):
-        """报告一次 API 错误，可能触发降级"""
+    def _notify_locked(self, all_waiters: bool = False) -> None:
+        # Caller must hold self._lock. Wakes thread waiters and coroutine waiters alike;
+        # woken waiters re-check the limit, so spurious wake-ups are harmless.
+        if all_waiters:
+            self._cond.notify_all()
+        else:
+            self._cond.notify()
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if waiter.done():
+                continue
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                # Event loop already closed
+                continue
+            if not all_waiters:
+                break
+
+    def report_error(self, rate_limited: bool = False):
+        """报告一次 API 错误，可能触发降级 (rate_limited: 错误为 RateLimitError)"""
         with self._lock:
             self.consecutive_errors += 1
+            if self.mode == "aimd":
+                if rate_limited or self.consecutive_errors >= self.error_threshold:
+                    self._aimd_decrease_locked("限流" if rate_limited else "连续错误")
+                return
             if not self.is_safe_mode and self.consecutive_errors >= self.error_threshold:
                 self.is_safe_mode = True
                 self.last_error_time = time.time()
+                self._schedule_recovery_locked()
                 logger.warning(f"检测到连续 API 错误，系统进入[安全模式]。并发数降级为 {self.min_concurrency}，将冷却 {self.cooldown_seconds}秒。")
 
-    def report_success(self):
-        """报告一次成功，重置连续错误计数"""
+    def report_success(self, latency: Optional[float] = None):
+        """报告一次成功，重置连续错误计数 (latency: 本次提交耗时，秒)"""
+        if self.mode == "aimd":
+            with self._cond:
+                self.consecutive_errors = 0
+                if latency is not None and self._is_latency_spike(latency):
+                    self._aimd_decrease_locked(f"提交延迟突增 ({latency:.1f}s)")
+                    return
+                before = int(self._aimd_limit)
+                self._aimd_limit = min(
+                    self._aimd_limit + self.aimd_increase / max(self._aimd_limit, 1.0),
+                    float(self.max_concurrency),
+                )
+                if int(self._aimd_limit) > before:
+                    self._notify_locked(all_waiters=True)
+            return
         if self.consecutive_errors > 0:
             with self._lock:
                 self.consecutive_errors = 0
 
+    def _is_latency_spike(self, latency: float) -> bool:
+        # Caller must hold self._lock. The baseline only learns from healthy samples.
+        baseline = self._latency_baseline
+        if baseline is not None and latency > baseline * self.latency_tolerance:
+            return True
+        if baseline is None:
+            self._latency_baseline = latency
+        else:
+            self._latency_baseline = baseline + self.latency_alpha * (latency - baseline)
+        return False
+
+    def _aimd_decrease_locked(self, reason: str) -> None:
+        now = time.time()
+        if now - self._last_decrease_time < self.aimd_decrease_gap_seconds:
+            return
+        self._last_decrease_time = now
+        self.last_error_time = now
+        self._aimd_limit = max(self._aimd_limit * self.aimd_backoff, self._aimd_floor)
+        logger.warning(f"[AIMD] {reason}，并发额度降至 {int(self._aimd_limit)}。")
+
+    def _schedule_recovery_locked(self) -> None:
+        """安排在下一次额度提升的时刻 (冷却结束后每 recovery_rate_seconds 一次) 唤醒等待者"""
+        if self._recovery_timer is not None:
+            self._recovery_timer.cancel()
+            self._recovery_timer = None
+        if not self.is_safe_mode:
+            return
+        elapsed = time.time() - self.last_error_time
+        if elapsed < self.cooldown_seconds:
+            delay = self.cooldown_seconds - elapsed
+        else:
+            step = self.recovery_rate_seconds
+            delay = step - ((elapsed - self.cooldown_seconds) % step)
+        timer = threading.Timer(delay, self._on_recovery_step)
+        timer.daemon = True
+        self._recovery_timer = timer
+        timer.start()
+
+    def _on_recovery_step(self) -> None:
+        with self._cond:
+            if threading.current_thread() is not self._recovery_timer:
+                return
+            self._recovery_timer = None
+            self._limit_locked()
+            self._notify_locked(all_waiters=True)
+            self._schedule_recovery_locked()
+
+def _wake_waiter(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
 # Global instance
 concurrency_controller = None
 
@@ -116,4 +271,55 @@ def init_controller(max_c: int):
         error_threshold=settings.CONCURRENCY_ERROR_THRESHOLD,
         cooldown_seconds=settings.CONCURRENCY_COOLDOWN_SECONDS,
         recovery_rate_seconds=settings.CONCURRENCY_RECOVERY_RATE_SECONDS,
+        mode=settings.CONCURRENCY_MODE,
     )
+
+
+# Per-provider controllers (backend runs): key = (provider_id, provider_model_id or None)
+_provider_controllers: Dict[Tuple[str, Optional[str]], AdaptiveConcurrencyController] = {}
+_provider_limits: Dict[str, Tuple[int, Dict[str, int]]] = {}
+_provider_lock = threading.Lock()
+
+
+def configure_provider_concurrency(
+    provider_id: str,
+    max_concurrency: Optional[int],
+    model_max_concurrency: Optional[Dict[str, int]] = None,
+) -> None:
+    """
+    设置 provider 的并发上限；model_max_concurrency 为个别 provider 模型单独设置上限
+    (该模型的任务使用独立的控制器，不占用 provider 级额度)。
+    """
+    limit = max_concurrency or settings.MAX_CONCURRENT_TASKS
+    model_limits = dict(model_max_concurrency or {})
+    with _provider_lock:
+        _provider_limits[provider_id] = (limit, model_limits)
+        for (pid, model_id), controller in list(_provider_controllers.items()):
+            if pid != provider_id:
+                continue
+            if model_id is None:
+                controller.set_max_concurrency(limit)
+            elif model_id in model_limits:
+                controller.set_max_concurrency(model_limits[model_id])
+            else:
+                del _provider_controllers[(pid, model_id)]
+
+
+def get_provider_controller(
+    provider_id: str,
+    provider_model_id: Optional[str] = None,
+) -> AdaptiveConcurrencyController:
+    """返回 provider (或 provider 模型) 专属的并发控制器，错误只影响该 provider 自身的额度"""
+    with _provider_lock:
+        limit, model_limits = _provider_limits.get(provider_id, (settings.MAX_CONCURRENT_TASKS, {}))
+        model_key = provider_model_id if provider_model_id in model_limits else None
+        key = (provider_id, model_key)
+        controller = _provider_controllers.get(key)
+        if controller is None:
+            max_c = model_limits[model_key] if model_key else limit
+            controller = AdaptiveConcurrencyController(
+                max_concurrency=max_c,
+                min_concurrency=min(settings.CONCURRENCY_MIN_TASKS, max_c),
+            )
+            _provider_controllers[key] = controller
+        return controller
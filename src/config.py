@@ -4,7 +4,7 @@ import re
 from pathlib import Path
 from typing import Optional
 from dotenv import load_dotenv
-from pydantic import Field
+from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings
 
 # Load .env file
@@ -25,12 +25,37 @@ class Settings(BaseSettings):
     MAX_POLL_TIME: int = Field(2100, env="MAX_POLL_TIME")
     POLL_INITIAL_WAIT_SECONDS: int = Field(20, env="POLL_INITIAL_WAIT_SECONDS")
     POLL_INTERVAL_SECONDS: int = Field(10, env="POLL_INTERVAL_SECONDS")
+    POLL_WORKERS: int = Field(8, env="POLL_WORKERS")
+    SUBMIT_WORKERS: int = Field(8, env="SUBMIT_WORKERS")
+    DOWNLOAD_WORKERS: int = Field(4, env="DOWNLOAD_WORKERS")
+    DOWNLOAD_QUEUE_SIZE: int = Field(20, env="DOWNLOAD_QUEUE_SIZE")
     API_REQUEST_TIMEOUT_SECONDS: int = Field(30, env="API_REQUEST_TIMEOUT_SECONDS")
     DOWNLOAD_TIMEOUT_SECONDS: int = Field(300, env="DOWNLOAD_TIMEOUT_SECONDS")
+    # Ranged downloads: parallel connections per file and chunk size (also the resume granularity)
+    DOWNLOAD_CONNECTIONS: int = Field(4, env="DOWNLOAD_CONNECTIONS")
+    DOWNLOAD_CHUNK_SIZE_MB: int = Field(8, env="DOWNLOAD_CHUNK_SIZE_MB")
+    # Global download governor: concurrent files, reserved in-flight MB, bandwidth MB/s (<= 0 = unlimited)
+    DOWNLOAD_MAX_CONCURRENT: int = Field(8, env="DOWNLOAD_MAX_CONCURRENT")
+    DOWNLOAD_MAX_INFLIGHT_MB: float = Field(0, env="DOWNLOAD_MAX_INFLIGHT_MB")
+    DOWNLOAD_MAX_MBPS: float = Field(0, env="DOWNLOAD_MAX_MBPS")
+    # Rewrite downloaded MP4s so moov precedes mdat (instant browser playback)
+    DOWNLOAD_FASTSTART: bool = Field(False, env="DOWNLOAD_FASTSTART")
+    # Download repair queue for download_failed videos (ordered by signed-URL expiry, exponential backoff)
+    REPAIR_ENABLED: bool = Field(True, env="REPAIR_ENABLED")
+    REPAIR_WORKERS: int = Field(2, env="REPAIR_WORKERS")
+    REPAIR_MAX_ATTEMPTS: int = Field(5, env="REPAIR_MAX_ATTEMPTS")
+    REPAIR_BACKOFF_SECONDS: float = Field(30, env="REPAIR_BACKOFF_SECONDS")
+    REPAIR_BACKOFF_MAX_SECONDS: float = Field(600, env="REPAIR_BACKOFF_MAX_SECONDS")
+    ASYNC_MAX_CONNECTIONS: int = Field(100, env="ASYNC_MAX_CONNECTIONS")
     CONCURRENCY_MIN_TASKS: int = Field(5, env="CONCURRENCY_MIN_TASKS")
     CONCURRENCY_ERROR_THRESHOLD: int = Field(2, env="CONCURRENCY_ERROR_THRESHOLD")
     CONCURRENCY_COOLDOWN_SECONDS: int = Field(600, env="CONCURRENCY_COOLDOWN_SECONDS")
     CONCURRENCY_RECOVERY_RATE_SECONDS: int = Field(60, env="CONCURRENCY_RECOVERY_RATE_SECONDS")
+    # Concurrency mode: "safe_mode" (threshold + cooldown) or "aimd" (additive increase / multiplicative decrease)
+    CONCURRENCY_MODE: str = Field("safe_mode", env="CONCURRENCY_MODE")
+    CONCURRENCY_AIMD_INCREASE: float = Field(1.0, env="CONCURRENCY_AIMD_INCREASE")
+    CONCURRENCY_AIMD_BACKOFF: float = Field(0.5, env="CONCURRENCY_AIMD_BACKOFF")
+    CONCURRENCY_LATENCY_TOLERANCE: float = Field(2.0, env="CONCURRENCY_LATENCY_TOLERANCE")
     
     # Proxy
     HTTP_PROXY: Optional[str] = Field(None, env="HTTP_PROXY")
@@ -40,6 +65,45 @@ class Settings(BaseSettings):
     PROJECT_ROOT: Path = Path(__file__).parent.parent
     DEFAULT_INPUT_DIR: Path = PROJECT_ROOT / "input"
     DEFAULT_OUTPUT_DIR: Path = PROJECT_ROOT / "output"
+    # Append-only journal of remote submissions (default: <output>/.submission_journal.jsonl)
+    SUBMISSION_JOURNAL_ENABLED: bool = Field(True, env="SUBMISSION_JOURNAL_ENABLED")
+    SUBMISSION_JOURNAL_PATH: Optional[Path] = Field(None, env="SUBMISSION_JOURNAL_PATH")
+    # Content-addressed video store; outputs are hardlinks into it (default: <output>/.content_store)
+    CONTENT_STORE_ENABLED: bool = Field(True, env="CONTENT_STORE_ENABLED")
+    CONTENT_STORE_DIR: Optional[Path] = Field(None, env="CONTENT_STORE_DIR")
+    # Disk budget: reserve each video's projected size before submitting; pause submissions (up to
+    # DISK_BUDGET_WAIT_SECONDS, 0 = refuse at once) when the output volume cannot hold it
+    DISK_BUDGET_ENABLED: bool = Field(True, env="DISK_BUDGET_ENABLED")
+    DISK_BUDGET_MIN_FREE_MB: float = Field(1024, env="DISK_BUDGET_MIN_FREE_MB")
+    DISK_BUDGET_SAFETY_FACTOR: float = Field(1.25, env="DISK_BUDGET_SAFETY_FACTOR")
+    DISK_BUDGET_WAIT_SECONDS: float = Field(1800, env="DISK_BUDGET_WAIT_SECONDS")
+    # Learned bytes-per-second of video (default: <output>/.video_sizes.json)
+    DISK_BUDGET_STATS_PATH: Optional[Path] = Field(None, env="DISK_BUDGET_STATS_PATH")
+    # Per-task metadata JSONs are coalesced in memory and written atomically this often (0 = write-through)
+    METADATA_FLUSH_SECONDS: float = Field(0.5, env="METADATA_FLUSH_SECONDS")
+
+    # Object storage for start-frame images: "cos" (Tencent COS), "s3" (S3-compatible) or "local" (a directory
+    # served by the FastAPI backend under /storage; default dir: <output>/.object_store)
+    STORAGE_BACKEND: str = Field("cos", env="STORAGE_BACKEND")
+    STORAGE_LOCAL_DIR: Optional[Path] = Field(None, env="STORAGE_LOCAL_DIR")
+    STORAGE_LOCAL_BASE_URL: str = Field("http://127.0.0.1:8000/storage", env="STORAGE_LOCAL_BASE_URL")
+
+    # S3-compatible storage (requires boto3); S3_ENDPOINT_URL for MinIO / R2 / etc., S3_PUBLIC_BASE_URL for a CDN
+    S3_BUCKET: Optional[str] = Field(None, env="S3_BUCKET")
+    S3_REGION: Optional[str] = Field(None, env="S3_REGION")
+    S3_ENDPOINT_URL: Optional[str] = Field(None, env="S3_ENDPOINT_URL")
+    S3_ACCESS_KEY_ID: Optional[str] = Field(None, env="S3_ACCESS_KEY_ID")
+    S3_SECRET_ACCESS_KEY: Optional[str] = Field(None, env="S3_SECRET_ACCESS_KEY")
+    S3_PUBLIC_BASE_URL: Optional[str] = Field(None, env="S3_PUBLIC_BASE_URL")
+
+    # Start frames are cropped/resized to the provider frame size (1280x720 / 720x1280) and re-encoded
+    # (jpeg | webp | png) in a process pool before upload; requires Pillow. Derivatives are cached by
+    # source hash (default: <output>/.image_cache); IMAGE_PREP_WORKERS <= 0 uses one process per CPU
+    IMAGE_PREP_ENABLED: bool = Field(True, env="IMAGE_PREP_ENABLED")
+    IMAGE_PREP_FORMAT: str = Field("jpeg", env="IMAGE_PREP_FORMAT")
+    IMAGE_PREP_QUALITY: int = Field(90, env="IMAGE_PREP_QUALITY")
+    IMAGE_PREP_WORKERS: int = Field(0, env="IMAGE_PREP_WORKERS")
+    IMAGE_PREP_CACHE_DIR: Optional[Path] = Field(None, env="IMAGE_PREP_CACHE_DIR")
 
     # Tencent COS (Optional)
     COS_SECRET_ID: Optional[str] = Field(None, env="COS_SECRET_ID")
@@ -47,6 +111,19 @@ class Settings(BaseSettings):
     COS_REGION: Optional[str] = Field(None, env="COS_REGION")
     COS_BUCKET: Optional[str] = Field(None, env="COS_BUCKET")
     COS_CUSTOM_DOMAIN: Optional[str] = Field(None, env="COS_CUSTOM_DOMAIN")
+    # Local index (path, size, mtime) -> md5 -> uploaded key, so unchanged images are neither hashed
+    # nor uploaded again (default: <output>/.cos_upload_index.json)
+    COS_UPLOAD_INDEX_PATH: Optional[Path] = Field(None, env="COS_UPLOAD_INDEX_PATH")
+
+    # Uploads for every STORAGE_BACKEND: HEAD-check unknown keys before uploading; batch uploads run
+    # STORAGE_UPLOAD_WORKERS files at once, large files go up in parts (MB) with threads each.
+    # The former COS_* names are still accepted
+    STORAGE_HEAD_CHECK: bool = Field(True, validation_alias=AliasChoices("STORAGE_HEAD_CHECK", "COS_HEAD_CHECK"))
+    STORAGE_UPLOAD_WORKERS: int = Field(
+        8, validation_alias=AliasChoices("STORAGE_UPLOAD_WORKERS", "COS_UPLOAD_WORKERS")
+    )
+    STORAGE_PART_SIZE_MB: int = Field(8, validation_alias=AliasChoices("STORAGE_PART_SIZE_MB", "COS_PART_SIZE_MB"))
+    STORAGE_PART_THREADS: int = Field(4, validation_alias=AliasChoices("STORAGE_PART_THREADS", "COS_PART_THREADS"))
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,129 @@
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import settings
+from .manifest import OutputManifest, get_manifest
+from .models import GenerationTask
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: Path) -> str:
+    """对磁盘文件流式计算 SHA-256 (下载时未能边写边算的情况)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _replace_with_link(src: Path, dest: Path) -> bool:
+    """原子地把 dest 替换为 src 的硬链接；跨文件系统 (EXDEV) 或不支持硬链接时返回 False，dest 不变"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.link")
+    try:
+        os.link(src, tmp)
+    except OSError as e:
+        if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+            return False
+        raise
+    try:
+        os.replace(tmp, dest)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    if not _replace_with_link(src, dest):
+        tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.copy")
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+
+class ContentStore:
+    """
+    内容寻址的视频存储: blobs/<sha256[:2]>/<sha256><suffix>
+    - 每份内容只落盘一次，各 Segment 目录中的视频是指向 blob 的硬链接
+    - index (与 OutputManifest 同格式) 记录 任务 key -> blob，同一分镜导出到
+      另一个输出目录 (in_place / custom) 时直接链接已有视频，无需重新生成
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> OutputManifest:
+        return get_manifest(self.root)
+
+    def blob_path(self, digest: str, suffix: str = "") -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}{suffix.lower()}"
+
+    def ingest(self, path: Path, digest: Optional[str] = None) -> str:
+        """
+        把 path 纳入存储: 已有相同内容时把 path 替换为指向该 blob 的硬链接，
+        否则把 path 硬链接为新 blob。返回 SHA-256。
+        """
+        path = Path(path)
+        digest = digest or sha256_file(path)
+        blob = self.blob_path(digest, path.suffix)
+        with self._lock:
+            if blob.exists():
+                if not os.path.samefile(blob, path) and not _replace_with_link(blob, path):
+                    logger.debug(f"{path} is on another filesystem than the content store; kept as a copy")
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(path, blob)
+                except FileExistsError:
+                    pass
+                except OSError as e:
+                    # Different filesystem: nothing to share with, the file stays as it is
+                    logger.debug(f"Cannot add {path} to the content store: {e}")
+        return digest
+
+    def remember(self, task: GenerationTask, digest: str, suffix: str, **fields: Any) -> None:
+        """登记任务 -> blob，供其他输出目录的同一任务复用"""
+        self.index.record(task, self.blob_path(digest, suffix), sha256=digest, **fields)
+
+    def find(self, task: GenerationTask) -> Optional[Dict[str, Any]]:
+        """返回该任务已存储的视频记录 (video_path 为 blob 路径)；blob 已被删除时返回 None"""
+        entry = self.index.lookup(task)
+        if not entry or not Path(entry["video_path"]).exists():
+            return None
+        return entry
+
+    def export(self, entry: Dict[str, Any], dest: Path) -> None:
+        """把 find() 找到的 blob 放到 dest (硬链接，跨文件系统时复制)"""
+        _link_or_copy(Path(entry["video_path"]), dest)
+
+
+# Global instance
+content_store: Optional[ContentStore] = None
+_content_store_lock = threading.Lock()
+
+
+def get_content_store() -> Optional[ContentStore]:
+    """返回全局内容存储；CONTENT_STORE_ENABLED=false 时返回 None"""
+    global content_store
+    if not settings.CONTENT_STORE_ENABLED:
+        return None
+    with _content_store_lock:
+        if content_store is None:
+            content_store = ContentStore(settings.CONTENT_STORE_DIR or (settings.DEFAULT_OUTPUT_DIR / ".content_store"))
+        return content_store
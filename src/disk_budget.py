@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from .config import settings
+from .models import GenerationTask
+
+logger = logging.getLogger(__name__)
+
+# How often a paused submission re-checks free space (other processes may free or use disk)
+DISK_RECHECK_SECONDS = 30.0
+# Bytes per second of video before anything has been learned
+PRIOR_BYTES_PER_SECOND = {False: 512 * 1024, True: 1536 * 1024}
+
+
+def _volume_of(path: Path) -> Path:
+    """path 所在卷上最近的已存在目录 (输出目录往往尚未创建)"""
+    path = Path(path).absolute()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+class VideoSizeModel:
+    """
+    按 (分辨率, 是否 pro) 学习每秒视频的字节数，样本来自已下载视频的实际大小 (content-length)。
+    持久化为一个小 JSON 文件，跨运行累积；无样本时使用保守的先验值。
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._rates: Dict[str, Dict[str, float]] = {}
+        if self.path and self.path.exists():
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    self._rates = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable video size stats {self.path}: {e}")
+
+    @staticmethod
+    def _key(resolution: str, is_pro: bool) -> str:
+        return f"{resolution}:{'pro' if is_pro else 'std'}"
+
+    def bytes_per_second(self, resolution: str, is_pro: bool) -> float:
+        with self._lock:
+            entry = self._rates.get(self._key(resolution, is_pro))
+        return entry["bps"] if entry else PRIOR_BYTES_PER_SECOND[bool(is_pro)]
+
+    def estimate(self, duration_seconds: int, resolution: str, is_pro: bool) -> int:
+        return int(duration_seconds * self.bytes_per_second(resolution, is_pro))
+
+    def observe(self, duration_seconds: int, resolution: str, is_pro: bool, size_bytes: int) -> None:
+        if duration_seconds <= 0 or size_bytes <= 0:
+            return
+        rate = size_bytes / duration_seconds
+        key = self._key(resolution, is_pro)
+        with self._lock:
+            entry = self._rates.setdefault(key, {"bps": rate, "samples": 0})
+            # Running mean for the first samples, then an EMA that follows encoder changes
+            entry["samples"] += 1
+            alpha = max(1.0 / entry["samples"], 0.1)
+            entry["bps"] += alpha * (rate - entry["bps"])
+            snapshot = json.dumps(self._rates, indent=2)
+        self._save(snapshot)
+
+    def _save(self, snapshot: str) -> None:
+        if not self.path:
+            return
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(snapshot, encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug(f"Cannot save video size stats: {e}")
+
+
+class DiskBudget:
+    """
+    输出卷的磁盘预算
+    - 提交前按预估大小 (学习值 x 安全系数) 预留空间；预留按卷 (st_dev) 汇总
+    - 可用空间 = 卷剩余空间 - 已预留 - DISK_BUDGET_MIN_FREE_MB；不足时暂停提交直到有空间或超时
+    - 视频下载完成 (或任务结束) 后释放预留；下载期间预留与实际写入会短暂重复计算，偏保守
+    - key 必须唯一 (例如输出视频路径)；同一 key 重复预留是调用方的错误
+    """
+
+    def __init__(self, model: VideoSizeModel, min_free_bytes: int = 0, safety_factor: float = 1.0) -> None:
+        self.model = model
+        self.min_free_bytes = min_free_bytes
+        self.safety_factor = safety_factor
+        self._cond = threading.Condition()
+        self._reservations: Dict[str, Tuple[int, int]] = {}
+        # Coroutines waiting for space (loop, future); woken by release() across threads
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        # Parked callers (reserve_or_wait) waiting for the next release()
+        self._release_waiters: List[Future] = []
+
+    def estimate(self, duration_seconds: int, resolution: str, is_pro: bool) -> int:
+        return int(self.model.estimate(duration_seconds, resolution, is_pro) * self.safety_factor)
+
+    def estimate_task(self, task: GenerationTask) -> int:
+        segment = task.segment
+        return self.estimate(segment.duration_seconds, segment.resolution, segment.is_pro)
+
+    def _reserved_on(self, device: int) -> int:
+        return sum(size for dev, size in self._reservations.values() if dev == device)
+
+    def _available_locked(self, volume: Path, device: int) -> int:
+        return shutil.disk_usage(volume).free - self.min_free_bytes - self._reserved_on(device)
+
+    def reserve(self, key: str, path: Path, size: int, timeout: Optional[float] = None) -> bool:
+        """
+        为 key 在 path 所在卷上预留 size 字节。空间不足时最多等待 timeout 秒 (None 为一直等待，0 为立即拒绝)。
+        """
+        volume = _volume_of(path)
+        device = os.stat(volume).st_dev
+        deadline = None if timeout is None else time.monotonic() + timeout
+        paused = False
+        with self._cond:
+            while True:
+                if self._try_reserve_locked(key, volume, device, size, paused):
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if not paused:
+                    paused = True
+                    self._log_pause_locked(key, volume, device, size)
+                self._cond.wait(DISK_RECHECK_SECONDS if remaining is None else min(remaining, DISK_RECHECK_SECONDS))
+
+    async def reserve_async(self, key: str, path: Path, size: int, timeout: Optional[float] = None) -> bool:
+        """reserve() 的协程版本: 在事件循环上等待 release() 唤醒或定时重查，不占用执行器线程"""
+        loop = asyncio.get_running_loop()
+        volume = _volume_of(path)
+        device = os.stat(volume).st_dev
+        deadline = None if timeout is None else time.monotonic() + timeout
+        paused = False
+        while True:
+            with self._cond:
+                if self._try_reserve_locked(key, volume, device, size, paused):
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if not paused:
+                    paused = True
+                    self._log_pause_locked(key, volume, device, size)
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(
+                    waiter, DISK_RECHECK_SECONDS if remaining is None else min(remaining, DISK_RECHECK_SECONDS)
+                )
+            except asyncio.TimeoutError:
+                # Other processes may have freed disk space; check again
+                pass
+
+    def reserve_or_wait(self, key: str, path: Path, size: int, paused: bool = False) -> Optional[Future]:
+        """
+        不等待的 reserve(): 预留成功返回 None；空间不足时返回一个在下一次 release() 时完成的 Future，
+        调用方据此挂起任务稍后重试，而不是占着线程等待。paused 为 True 表示这是挂起后的重试 (只记一次日志)。
+        """
+        volume = _volume_of(path)
+        device = os.stat(volume).st_dev
+        with self._cond:
+            if self._try_reserve_locked(key, volume, device, size, paused):
+                return None
+            if not paused:
+                self._log_pause_locked(key, volume, device, size)
+            waiter: Future = Future()
+            self._release_waiters = [w for w in self._release_waiters if not w.done()]
+            self._release_waiters.append(waiter)
+            return waiter
+
+    def _try_reserve_locked(self, key: str, volume: Path, device: int, size: int, paused: bool) -> bool:
+        if key in self._reservations:
+            raise ValueError(f"{key} already holds a disk reservation")
+        if size <= self._available_locked(volume, device):
+            self._reservations[key] = (device, size)
+            if paused:
+                logger.info(f"Disk space available again for {key}; resuming")
+            return True
+        return False
+
+    def _log_pause_locked(self, key: str, volume: Path, device: int, size: int) -> None:
+        logger.warning(
+            f"Pausing {key}: {volume} cannot hold another {size / 1024 / 1024:.0f} MB "
+            f"({self._reserved_on(device) / 1024 / 1024:.0f} MB already reserved)"
+        )
+
+    def release(self, key: str) -> None:
+        with self._cond:
+            if self._reservations.pop(key, None) is None:
+                return
+            self._cond.notify_all()
+            while self._async_waiters:
+                loop, waiter = self._async_waiters.popleft()
+                if waiter.done():
+                    continue
+                try:
+                    loop.call_soon_threadsafe(_wake_waiter, waiter)
+                except RuntimeError:
+                    # Event loop already closed
+                    continue
+            parked, self._release_waiters = self._release_waiters, []
+        # Outside the lock: done callbacks may reserve again
+        for waiter in parked:
+            try:
+                waiter.set_result(None)
+            except InvalidStateError:
+                # Already woken by the caller's recheck timer
+                pass
+
+    def plan(self, requirements: Iterable[Tuple[Path, int]]) -> List[Dict[str, Any]]:
+        """
+        预检: requirements 为 (输出目录, 预估字节数)，按卷汇总并与当前可用空间比较。
+        返回每个卷的 required_bytes / available_bytes / fits。
+        """
+        volumes: Dict[int, Dict[str, Any]] = {}
+        for path, size in requirements:
+            volume = _volume_of(path)
+            device = os.stat(volume).st_dev
+            entry = volumes.setdefault(device, {"volume": str(volume), "required_bytes": 0, "tasks": 0})
+            entry["required_bytes"] += size
+            entry["tasks"] += 1
+        with self._cond:
+            for device, entry in volumes.items():
+                entry["available_bytes"] = max(self._available_locked(Path(entry["volume"]), device), 0)
+                entry["fits"] = entry["required_bytes"] <= entry["available_bytes"]
+        return list(volumes.values())
+
+    def plan_tasks(self, tasks: Iterable[GenerationTask]) -> List[Dict[str, Any]]:
+        return self.plan((task.output_dir, self.estimate_task(task)) for task in tasks)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "reservations": len(self._reservations),
+                "reserved_bytes": sum(size for _, size in self._reservations.values()),
+                "min_free_bytes": self.min_free_bytes,
+                "safety_factor": self.safety_factor,
+            }
+
+
+def _wake_waiter(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+# Global instance
+disk_budget: Optional[DiskBudget] = None
+_disk_budget_lock = threading.Lock()
+
+
+def get_disk_budget() -> Optional[DiskBudget]:
+    """返回全局磁盘预算；DISK_BUDGET_ENABLED=false 时返回 None"""
+    global disk_budget
+    if not settings.DISK_BUDGET_ENABLED:
+        return None
+    with _disk_budget_lock:
+        if disk_budget is None:
+            model = VideoSizeModel(
+                settings.DISK_BUDGET_STATS_PATH or (settings.DEFAULT_OUTPUT_DIR / ".video_sizes.json")
+            )
+            disk_budget = DiskBudget(
+                model,
+                min_free_bytes=int(settings.DISK_BUDGET_MIN_FREE_MB * 1024 * 1024),
+                safety_factor=settings.DISK_BUDGET_SAFETY_FACTOR,
+            )
+        return disk_budget
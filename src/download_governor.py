@@ -0,0 +1,223 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, Iterator, AsyncIterator, Optional, Tuple
+
+from .config import settings
+from .rate_limiter import TokenBucket
+
+# Window used for the live throughput figure
+THROUGHPUT_WINDOW_SECONDS = 5.0
+
+
+class DownloadTicket:
+    """一个下载占用的并发槽位及其预留的在途字节数，由 DownloadGovernor.slot() 发放"""
+
+    def __init__(self, governor: "DownloadGovernor") -> None:
+        self._governor = governor
+        self.reserved = 0
+
+    def reserve(self, size: int) -> None:
+        """文件大小在拿到槽位后才得知时 (例如响应头里的 content-length) 补充预留"""
+        if size > self.reserved:
+            self._governor._reserve(self, size - self.reserved)
+
+    async def reserve_async(self, size: int) -> None:
+        if size > self.reserved:
+            await self._governor._reserve_async(self, size - self.reserved)
+
+
+class DownloadGovernor:
+    """
+    全局下载调度器 (同步与 asyncio 下载共用)
+    - max_concurrent: 同时进行的下载数 (<= 0 不限)
+    - max_inflight_bytes: 所有进行中下载按 content-length 预留的字节上限 (<= 0 不限)；
+      单个文件超过上限时，只要没有其他下载在途也允许进行，避免永久阻塞
+    - bytes_per_second: 全局带宽上限 (<= 0 不限)，按写入的数据块扣减令牌
+    """
+
+    def __init__(self, max_concurrent: int = 0, max_inflight_bytes: int = 0, bytes_per_second: float = 0) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_inflight_bytes = max_inflight_bytes
+        self.bytes_per_second = bytes_per_second
+        # One second worth of burst, but never smaller than a download chunk
+        self._bucket = (
+            TokenBucket(bytes_per_second, max(bytes_per_second, 1024 * 1024)) if bytes_per_second > 0 else None
+        )
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._inflight_bytes = 0
+        self._bytes_total = 0
+        self._samples: Deque[Tuple[float, int]] = deque()
+        # Coroutines waiting for a slot or for bytes; they wait on their event loop, not on a thread
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def _can_start(self) -> bool:
+        return self.max_concurrent <= 0 or self._active < self.max_concurrent
+
+    def _fits(self, size: int) -> bool:
+        if self.max_inflight_bytes <= 0 or self._inflight_bytes == 0:
+            return True
+        return self._inflight_bytes + size <= self.max_inflight_bytes
+
+    def _can_reserve(self, ticket: DownloadTicket, extra: int) -> bool:
+        # Bytes this download already holds do not count against its own reservation
+        return (
+            self.max_inflight_bytes <= 0
+            or self._inflight_bytes == ticket.reserved
+            or self._inflight_bytes + extra <= self.max_inflight_bytes
+        )
+
+    def _acquire(self, size: int) -> DownloadTicket:
+        ticket = DownloadTicket(self)
+        with self._cond:
+            self._waiting += 1
+            try:
+                self._cond.wait_for(lambda: self._can_start() and self._fits(size))
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            self._inflight_bytes += size
+            ticket.reserved = size
+        return ticket
+
+    async def _acquire_async(self, size: int) -> DownloadTicket:
+        """_acquire() 的协程版本，等待期间不占用线程 (执行器线程要留给进行中下载的文件写入)"""
+        loop = asyncio.get_running_loop()
+        ticket = DownloadTicket(self)
+        with self._cond:
+            self._waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    if self._can_start() and self._fits(size):
+                        self._active += 1
+                        self._inflight_bytes += size
+                        ticket.reserved = size
+                        return ticket
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+                await waiter
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def _reserve(self, ticket: DownloadTicket, extra: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._can_reserve(ticket, extra))
+            self._inflight_bytes += extra
+            ticket.reserved += extra
+
+    async def _reserve_async(self, ticket: DownloadTicket, extra: int) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._can_reserve(ticket, extra):
+                    self._inflight_bytes += extra
+                    ticket.reserved += extra
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def _release(self, ticket: DownloadTicket) -> None:
+        with self._cond:
+            self._active -= 1
+            self._inflight_bytes -= ticket.reserved
+            ticket.reserved = 0
+            self._cond.notify_all()
+            # Freed bytes may admit any waiter, so every coroutine re-checks
+            while self._async_waiters:
+                loop, waiter = self._async_waiters.popleft()
+                if waiter.done():
+                    continue
+                try:
+                    loop.call_soon_threadsafe(_wake_waiter, waiter)
+                except RuntimeError:
+                    # Event loop already closed
+                    continue
+
+    @contextmanager
+    def slot(self, size: int = 0) -> Iterator[DownloadTicket]:
+        """阻塞直到有空闲并发槽位且在途字节预算足够容纳 size"""
+        ticket = self._acquire(size)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    @asynccontextmanager
+    async def slot_async(self, size: int = 0) -> AsyncIterator[DownloadTicket]:
+        ticket = await self._acquire_async(size)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def _record(self, count: int) -> None:
+        now = time.monotonic()
+        with self._cond:
+            self._bytes_total += count
+            self._samples.append((now, count))
+            self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._samples and now - self._samples[0][0] > THROUGHPUT_WINDOW_SECONDS:
+            self._samples.popleft()
+
+    def throttle(self, count: int) -> float:
+        """记录 count 个已下载字节，超出带宽上限时阻塞；返回等待秒数"""
+        self._record(count)
+        return self._bucket.acquire(count) if self._bucket else 0.0
+
+    async def throttle_async(self, count: int) -> float:
+        self._record(count)
+        return await self._bucket.acquire_async(count) if self._bucket else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            self._trim(now)
+            window_bytes = sum(count for _, count in self._samples)
+            return {
+                "active": self._active,
+                "waiting": self._waiting,
+                "inflight_bytes": self._inflight_bytes,
+                "bytes_total": self._bytes_total,
+                "throughput_bps": round(window_bytes / THROUGHPUT_WINDOW_SECONDS, 1),
+                "max_concurrent": self.max_concurrent,
+                "max_inflight_bytes": self.max_inflight_bytes,
+                "bytes_per_second": self.bytes_per_second,
+            }
+
+
+def _wake_waiter(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_governor: Optional[DownloadGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_download_governor() -> DownloadGovernor:
+    """进程内共享的下载调度器，限额取自 settings (首次调用时读取)"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = DownloadGovernor(
+                max_concurrent=settings.DOWNLOAD_MAX_CONCURRENT,
+                max_inflight_bytes=int(settings.DOWNLOAD_MAX_INFLIGHT_MB * 1024 * 1024),
+                bytes_per_second=settings.DOWNLOAD_MAX_MBPS * 1024 * 1024,
+            )
+        return _governor
+
+
+def reset_download_governor() -> None:
+    """丢弃共享实例，下次 get_download_governor() 按当前 settings 重建"""
+    global _governor
+    with _governor_lock:
+        _governor = None
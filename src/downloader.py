@@ -1,84 +1,569 @@
+import asyncio
+import hashlib
+import json
+import threading
 import requests
+import httpx
 import shutil
 import logging
 import errno
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, RetryError
+from typing import Any, Collection, Dict, Optional, Set, Tuple
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception, retry_if_exception_type, RetryError
 from .config import settings
+from .async_http import get_async_client
+from .http_sessions import get_download_session, record_download_bytes
+from .download_governor import DownloadTicket, get_download_governor
+from .mp4 import Mp4StreamValidator, Mp4ValidationError, inspect_mp4
 
 logger = logging.getLogger(__name__)
 
+def _proxies() -> dict:
+    proxies = {}
+    if settings.HTTP_PROXY:
+        proxies["http"] = settings.HTTP_PROXY
+    if settings.HTTPS_PROXY:
+        proxies["https"] = settings.HTTPS_PROXY
+    return proxies
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+class DownloadStatusError(Exception):
+    """
+    响应状态在调用方给出的 fatal_statuses 中 (例如 provider 的 401 / 429)：不重试、不转换为 False，
+    直接抛给调用方，由它映射为 APIError / RateLimitError。
+    """
+
+    def __init__(self, url: str, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code} for {url}")
+        self.url = url
+        self.status_code = status_code
+
+
+def _check_status(url: str, status_code: int, fatal_statuses: Collection[int]) -> None:
+    if status_code in fatal_statuses:
+        raise DownloadStatusError(url, status_code)
+
+
+def _consume(url: str, count: int) -> None:
+    """记账一块已写入的数据，并按全局带宽上限节流"""
+    record_download_bytes(url, count)
+    get_download_governor().throttle(count)
+
+
+async def _consume_async(url: str, count: int) -> None:
+    record_download_bytes(url, count)
+    await get_download_governor().throttle_async(count)
+
+
+def _retry_transient(*error_types: type) -> retry_if_exception:
+    """
+    重试网络 / IO 错误，但不重试 MP4 校验失败 (Mp4ValidationError 是 IOError 的子类)：
+    内容本身无效时重新下载得到的还是同样的内容。
+    """
+    return retry_if_exception(lambda e: isinstance(e, error_types) and not isinstance(e, Mp4ValidationError))
+
+
+VIDEO_SUFFIXES = {".mp4", ".m4v", ".mov"}
+_MEDIA_INFO_LIMIT = 1024
+
+# SHA-256 (+ duration / resolution for validated videos) of recent downloads, keyed by destination path
+_media_info: Dict[str, Dict[str, Any]] = {}
+_media_info_lock = threading.Lock()
+
+
+def _wants_validation(dest_path: Path) -> bool:
+    return dest_path.suffix.lower() in VIDEO_SUFFIXES
+
+
+def _remember_media_info(dest_path: Path, info: Optional[Dict[str, Any]]) -> None:
+    if info is None:
+        return
+    with _media_info_lock:
+        if len(_media_info) >= _MEDIA_INFO_LIMIT:
+            _media_info.pop(next(iter(_media_info)))
+        _media_info[str(dest_path)] = info
+
+
+def pop_media_info(dest_path: Path) -> Optional[Dict[str, Any]]:
+    """取出 download_file 在下载时得到的信息 (sha256，视频另含时长/分辨率/大小)，没有则返回 None"""
+    with _media_info_lock:
+        return _media_info.pop(str(dest_path), None)
+
+
 @retry(
     stop=stop_after_attempt(5), 
     wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type((requests.RequestException, OSError))
+    retry=_retry_transient(requests.RequestException, OSError)
 )
-def _download_with_retry(url: str, tmp_path: Path):
+def _download_with_retry(
+    url: str,
+    tmp_path: Path,
+    headers: Optional[dict] = None,
+    session: Optional[requests.Session] = None,
+    validate: bool = False,
+    fatal_statuses: Collection[int] = (),
+) -> Dict[str, Any]:
     """
     Internal function to perform the download with retries.
     Raises exceptions to trigger tenacity.
+    Returns the SHA-256 computed while the chunks are written; with validate, the MP4
+    structure is checked on the same pass and its info is included.
     """
-    proxies = {}
-    if settings.HTTP_PROXY:
-        proxies["http"] = settings.HTTP_PROXY
-    if settings.HTTPS_PROXY:
-        proxies["https"] = settings.HTTPS_PROXY
+    http = session or get_download_session(url)
 
     # IO Protection: Use configurable timeout to protect long downloads
-    with requests.get(
+    with http.get(
         url,
         stream=True,
-        proxies=proxies,
+        headers=headers,
+        proxies=_proxies(),
         timeout=settings.DOWNLOAD_TIMEOUT_SECONDS,
     ) as r:
+        _check_status(url, r.status_code, fatal_statuses)
         r.raise_for_status()
         
         total_size = int(r.headers.get('content-length', 0))
+        validator = Mp4StreamValidator() if validate else None
+        digest = hashlib.sha256()
         
         with open(tmp_path, 'wb') as f:
             # Memory Protection: Use 1MB chunks to control memory usage
             for chunk in r.iter_content(chunk_size=1024 * 1024):
                 if chunk:
+                    if validator:
+                        validator.feed(chunk)
+                    digest.update(chunk)
                     f.write(chunk)
+                    _consume(url, len(chunk))
     
     # Verify size
     if total_size > 0:
         file_size = tmp_path.stat().st_size
         if file_size != total_size:
             raise IOError(f"Download incomplete: {file_size}/{total_size} bytes")
+    return {**(validator.finish() if validator else {}), "sha256": digest.hexdigest()}
 
-def download_file(url: str, dest_path: Path) -> bool:
+
+def _probe_ranges(
+    http: Any, url: str, headers: Optional[dict], fatal_statuses: Collection[int] = ()
+) -> Tuple[int, bool]:
+    """
+    用 "Range: bytes=0-0" 探测文件大小与是否支持分段下载
+    (比 HEAD 更可靠: 预签名 URL 往往只对 GET 签名)。
+    """
+    probe_headers = dict(headers or {})
+    probe_headers["Range"] = "bytes=0-0"
+    with http.get(
+        url,
+        stream=True,
+        headers=probe_headers,
+        proxies=_proxies(),
+        timeout=settings.API_REQUEST_TIMEOUT_SECONDS,
+    ) as r:
+        _check_status(url, r.status_code, fatal_statuses)
+        r.raise_for_status()
+        content_range = r.headers.get("Content-Range", "")
+        if r.status_code == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1].strip()
+            if total.isdigit():
+                return int(total), True
+        return int(r.headers.get("Content-Length", 0) or 0), False
+
+
+@retry(
+    stop=stop_after_attempt(5),
+    wait=wait_exponential(multiplier=1, min=2, max=10),
+    retry=retry_if_exception_type((requests.RequestException, OSError))
+)
+def _fetch_range(
+    http: Any,
+    url: str,
+    tmp_path: Path,
+    start: int,
+    end: int,
+    headers: Optional[dict],
+    keep: bool = False,
+    fatal_statuses: Collection[int] = (),
+) -> Optional[bytes]:
+    """写入一个分块；keep 时同时返回其内容 (供按序计算 SHA-256，不必再从磁盘读回)"""
+    range_headers = dict(headers or {})
+    range_headers["Range"] = f"bytes={start}-{end}"
+    with http.get(
+        url,
+        stream=True,
+        headers=range_headers,
+        proxies=_proxies(),
+        timeout=settings.DOWNLOAD_TIMEOUT_SECONDS,
+    ) as r:
+        _check_status(url, r.status_code, fatal_statuses)
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise RangeNotSupported(f"server ignored Range (status {r.status_code})")
+        written = 0
+        kept = bytearray() if keep else None
+        with open(tmp_path, "r+b") as f:
+            f.seek(start)
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                if chunk:
+                    f.write(chunk)
+                    if kept is not None:
+                        kept += chunk
+                    _consume(url, len(chunk))
+                    written += len(chunk)
+    if written != end - start + 1:
+        raise IOError(f"Range {start}-{end} incomplete: {written}/{end - start + 1} bytes")
+    return bytes(kept) if kept is not None else None
+
+
+class _OrderedDigest:
+    """
+    分段下载的 SHA-256: 分块乱序完成，按文件顺序喂给 hashlib，与下载同时进行。
+    先完成但还轮不到的分块暂存在内存 (最多 max_buffered 字节)；超出上限或续传前已在磁盘上的分块，
+    轮到时从 .tmp 读回 (刚写入，通常仍在页缓存中)。
+    """
+
+    def __init__(self, tmp_path: Path, total_size: int, chunk_size: int, max_buffered: int) -> None:
+        self.tmp_path = tmp_path
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.max_buffered = max_buffered
+        self._digest = hashlib.sha256()
+        self._next = 0
+        self._ready: Set[int] = set()
+        self._buffered: Dict[int, bytes] = {}
+        self._buffered_bytes = 0
+
+    def add(self, index: int, data: Optional[bytes] = None) -> None:
+        """分块 index 已写入磁盘 (data 为其内容，未知时为 None)；调用方负责串行化"""
+        self._ready.add(index)
+        if data is not None and (index == self._next or self._buffered_bytes + len(data) <= self.max_buffered):
+            self._buffered[index] = data
+            self._buffered_bytes += len(data)
+        while self._next in self._ready:
+            data = self._buffered.pop(self._next, None)
+            if data is None:
+                data = self._read(self._next)
+            else:
+                self._buffered_bytes -= len(data)
+            self._digest.update(data)
+            self._next += 1
+
+    def _read(self, index: int) -> bytes:
+        start = index * self.chunk_size
+        with open(self.tmp_path, "rb") as f:
+            f.seek(start)
+            return f.read(min(self.chunk_size, self.total_size - start))
+
+    def hexdigest(self) -> str:
+        if self._next * self.chunk_size < self.total_size:
+            raise IOError(f"Cannot hash {self.tmp_path.name}: chunk {self._next} missing")
+        return self._digest.hexdigest()
+
+
+def _load_parts_state(state_path: Path, total_size: int, chunk_size: int) -> Set[int]:
+    """读取断点信息；文件大小或分块大小不一致 (例如 URL 已指向新文件) 时从头开始"""
+    try:
+        with state_path.open("r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return set()
+    if state.get("total_size") != total_size or state.get("chunk_size") != chunk_size:
+        return set()
+    return set(state.get("done", []))
+
+
+def _save_parts_state(state_path: Path, total_size: int, chunk_size: int, done: Set[int]) -> None:
+    tmp_state = state_path.with_suffix(state_path.suffix + ".new")
+    with tmp_state.open("w", encoding="utf-8") as f:
+        json.dump({"total_size": total_size, "chunk_size": chunk_size, "done": sorted(done)}, f)
+    tmp_state.replace(state_path)
+
+
+def _download_ranged(
+    http: Any,
+    url: str,
+    tmp_path: Path,
+    total_size: int,
+    headers: Optional[dict],
+    fatal_statuses: Collection[int] = (),
+) -> str:
+    """
+    多连接分段下载到预分配的 .tmp 文件，返回整个文件的 SHA-256 (下载时按序计算)。
+    已完成的分块记录在 .tmp.parts 中，中断后再次调用只补齐缺失的分块。
+    """
+    chunk_size = max(settings.DOWNLOAD_CHUNK_SIZE_MB, 1) * 1024 * 1024
+    state_path = tmp_path.with_suffix(tmp_path.suffix + ".parts")
+    done = _load_parts_state(state_path, total_size, chunk_size) if tmp_path.exists() else set()
+    if not done or tmp_path.stat().st_size != total_size:
+        done = set()
+        # Preallocate (sparse) so every range can be written in place
+        with open(tmp_path, "wb") as f:
+            f.truncate(total_size)
+    elif done:
+        logger.info(f"Resuming {tmp_path.name}: {len(done)} chunks already on disk")
+
+    chunk_count = (total_size + chunk_size - 1) // chunk_size
+    pending = [i for i in range(chunk_count) if i not in done]
+    workers = max(min(settings.DOWNLOAD_CONNECTIONS, len(pending)), 1)
+    digest = _OrderedDigest(tmp_path, total_size, chunk_size, max_buffered=workers * chunk_size)
+    for index in sorted(done):
+        digest.add(index)
+    if not pending:
+        return digest.hexdigest()
+
+    lock = threading.Lock()
+
+    def fetch(index: int) -> None:
+        start = index * chunk_size
+        end = min(start + chunk_size, total_size) - 1
+        data = _fetch_range(http, url, tmp_path, start, end, headers, keep=True, fatal_statuses=fatal_statuses)
+        with lock:
+            done.add(index)
+            _save_parts_state(state_path, total_size, chunk_size, done)
+            digest.add(index, data)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="range") as pool:
+        futures = [pool.submit(fetch, index) for index in pending]
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as exc:
+                errors.append(exc)
+    if errors:
+        raise errors[0]
+    state_path.unlink(missing_ok=True)
+    return digest.hexdigest()
+
+
+def download_file(
+    url: str,
+    dest_path: Path,
+    headers: Optional[dict] = None,
+    session: Optional[requests.Session] = None,
+    fatal_statuses: Collection[int] = (),
+) -> bool:
     """
     流式下载文件，包含 IO 保护、内存优化和重试机制。
+    服务器支持 Range 时使用多连接分段下载，失败后保留 .tmp 以便下次续传；
+    否则回退为单连接流式下载。
     Returns True if successful, False otherwise.
+    fatal_statuses 中的 HTTP 状态不重试，以 DownloadStatusError 抛出。
     """
     if not url:
         return False
 
     tmp_path = dest_path.with_suffix(dest_path.suffix + ".tmp")
+    state_path = tmp_path.with_suffix(tmp_path.suffix + ".parts")
+    http = session or get_download_session(url)
+    validate = _wants_validation(dest_path)
+    resumable = False
     
     try:
         dest_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Call the retrying helper
-        _download_with_retry(url, tmp_path)
+
+        total_size, accepts_ranges = 0, False
+        try:
+            total_size, accepts_ranges = _probe_ranges(http, url, headers, fatal_statuses)
+        except requests.RequestException as e:
+            logger.debug(f"Range probe failed for {url}: {e}")
+
+        # Wait for a global download slot; the probed size counts against the in-flight budget
+        with get_download_governor().slot(total_size):
+            media_info = None
+            if accepts_ranges and total_size > 0:
+                resumable = True
+                try:
+                    sha256 = _download_ranged(http, url, tmp_path, total_size, headers, fatal_statuses)
+                except RangeNotSupported:
+                    resumable = False
+                    state_path.unlink(missing_ok=True)
+                    media_info = _download_with_retry(url, tmp_path, headers, session, validate, fatal_statuses)
+                else:
+                    # Chunks arrive out of order: walk the box headers on disk (mdat is seeked over);
+                    # the SHA-256 was computed in file order while the chunks came in
+                    media_info = inspect_mp4(tmp_path) if validate else {}
+                    media_info["sha256"] = sha256
+            else:
+                # Call the retrying helper
+                media_info = _download_with_retry(url, tmp_path, headers, session, validate, fatal_statuses)
 
         # Atomic move
         tmp_path.replace(dest_path)
+        _remember_media_info(dest_path, media_info)
         return True
 
+    except Mp4ValidationError as e:
+        logger.error(f"Invalid video downloaded from {url}: {e}")
+        state_path.unlink(missing_ok=True)
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return False
+
+    except DownloadStatusError:
+        if not resumable and tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
     except OSError as e:
         if e.errno == errno.ENOSPC:
             logger.critical("磁盘空间不足! (Disk Full)")
         else:
             logger.error(f"IO Error writing file: {e}")
         
-        if tmp_path.exists():
+        if not resumable and tmp_path.exists():
             tmp_path.unlink()
         return False
 
     except (requests.RequestException, RetryError) as e:
+        logger.error(f"Download failed for {url} after retries: {e}")
+        if resumable:
+            logger.info(f"Partial download kept for resume: {tmp_path}")
+        elif tmp_path.exists():
+            tmp_path.unlink()
+        return False
+
+
+async def _probe_size_async(
+    client: httpx.AsyncClient, url: str, headers: Optional[dict], fatal_statuses: Collection[int] = ()
+) -> int:
+    """_probe_ranges 的异步版本，只取文件大小 (用于在建立下载连接之前预留在途字节)"""
+    probe_headers = dict(headers or {})
+    probe_headers["Range"] = "bytes=0-0"
+    async with client.stream(
+        "GET",
+        url,
+        headers=probe_headers,
+        timeout=settings.API_REQUEST_TIMEOUT_SECONDS,
+    ) as r:
+        _check_status(url, r.status_code, fatal_statuses)
+        r.raise_for_status()
+        content_range = r.headers.get("Content-Range", "")
+        if r.status_code == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1].strip()
+            if total.isdigit():
+                return int(total)
+        return int(r.headers.get("Content-Length", 0) or 0)
+
+
+@retry(
+    stop=stop_after_attempt(5), 
+    wait=wait_exponential(multiplier=1, min=2, max=10),
+    retry=_retry_transient(httpx.HTTPError, OSError)
+)
+async def _download_with_retry_async(
+    client: httpx.AsyncClient,
+    url: str,
+    tmp_path: Path,
+    headers: Optional[dict] = None,
+    ticket: Optional[DownloadTicket] = None,
+    validate: bool = False,
+    fatal_statuses: Collection[int] = (),
+) -> Dict[str, Any]:
+    """
+    Async variant of _download_with_retry. File writes are pushed to a worker
+    thread so a slow disk never stalls the event loop.
+    The slot was taken with the probed size; the response's content-length tops the
+    reservation up before streaming when the probe failed or underestimated.
+    """
+    async with client.stream(
+        "GET",
+        url,
+        headers=headers,
+        timeout=settings.DOWNLOAD_TIMEOUT_SECONDS,
+    ) as r:
+        _check_status(url, r.status_code, fatal_statuses)
+        r.raise_for_status()
+
+        total_size = int(r.headers.get('content-length', 0))
+        if ticket is not None:
+            await ticket.reserve_async(total_size)
+        validator = Mp4StreamValidator() if validate else None
+        digest = hashlib.sha256()
+
+        with open(tmp_path, 'wb') as f:
+            async for chunk in r.aiter_bytes(chunk_size=1024 * 1024):
+                if chunk:
+                    if validator:
+                        validator.feed(chunk)
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+                    await _consume_async(url, len(chunk))
+
+    if total_size > 0:
+        file_size = tmp_path.stat().st_size
+        if file_size != total_size:
+            raise IOError(f"Download incomplete: {file_size}/{total_size} bytes")
+    return {**(validator.finish() if validator else {}), "sha256": digest.hexdigest()}
+
+async def download_file_async(
+    url: str,
+    dest_path: Path,
+    client: Optional[httpx.AsyncClient] = None,
+    headers: Optional[dict] = None,
+    fatal_statuses: Collection[int] = (),
+) -> bool:
+    """
+    download_file 的异步版本，默认使用共享的 "download" 连接池。
+    Returns True if successful, False otherwise (fatal_statuses 同 download_file)。
+    """
+    if not url:
+        return False
+
+    tmp_path = dest_path.with_suffix(dest_path.suffix + ".tmp")
+    client = client or get_async_client("download")
+
+    try:
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+
+        total_size = 0
+        try:
+            total_size = await _probe_size_async(client, url, headers, fatal_statuses)
+        except httpx.HTTPError as e:
+            logger.debug(f"Size probe failed for {url}: {e}")
+
+        # Same budget as download_file: the probed size counts before any download connection opens
+        async with get_download_governor().slot_async(total_size) as ticket:
+            media_info = await _download_with_retry_async(
+                client,
+                url,
+                tmp_path,
+                headers,
+                ticket,
+                _wants_validation(dest_path),
+                fatal_statuses,
+            )
+        tmp_path.replace(dest_path)
+        _remember_media_info(dest_path, media_info)
+        return True
+
+    except Mp4ValidationError as e:
+        logger.error(f"Invalid video downloaded from {url}: {e}")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return False
+
+    except DownloadStatusError:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            logger.critical("磁盘空间不足! (Disk Full)")
+        else:
+            logger.error(f"IO Error writing file: {e}")
+
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return False
+
+    except (httpx.HTTPError, RetryError) as e:
         logger.error(f"Download failed for {url} after retries: {e}")
         if tmp_path.exists():
             tmp_path.unlink()
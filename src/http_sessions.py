@@ -0,0 +1,174 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .config import settings
+
+
+class ConnectionStats:
+    """单个 host 的下载连接统计: 新建/复用连接数、下载字节数、握手耗时"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.requests = 0
+        self.bytes_downloaded = 0
+        self.connect_seconds = 0.0
+        self.tls_seconds = 0.0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_connect(self, connect_seconds: float, tls_seconds: float) -> None:
+        with self._lock:
+            self.connections_opened += 1
+            self.connect_seconds += connect_seconds
+            self.tls_seconds += tls_seconds
+
+    def record_bytes(self, count: int) -> None:
+        with self._lock:
+            self.bytes_downloaded += count
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(self.requests - self.connections_opened, 0),
+                "requests": self.requests,
+                "bytes_downloaded": self.bytes_downloaded,
+                "connect_seconds": round(self.connect_seconds, 4),
+                "tls_seconds": round(self.tls_seconds, 4),
+            }
+
+
+def _instrumented_pool(base: type, stats: ConnectionStats) -> type:
+    """
+    Subclasses a urllib3 pool so every real socket connect is timed and counted.
+    Checkouts that do not trigger a connect are keep-alive reuses.
+    """
+    secure = issubclass(base, HTTPSConnectionPool)
+
+    class Connection(base.ConnectionCls):
+        _tcp_seconds = 0.0
+
+        def _new_conn(self):
+            start = time.perf_counter()
+            sock = super()._new_conn()
+            self._tcp_seconds = time.perf_counter() - start
+            return sock
+
+        def connect(self):
+            start = time.perf_counter()
+            self._tcp_seconds = 0.0
+            super().connect()
+            total = time.perf_counter() - start
+            # For HTTPS everything after the TCP connect is the proxy tunnel + TLS handshake
+            stats.record_connect(total, total - self._tcp_seconds if secure else 0.0)
+
+    class Pool(base):
+        ConnectionCls = Connection
+
+        def _get_conn(self, timeout=None):
+            stats.record_request()
+            return super()._get_conn(timeout=timeout)
+
+    return Pool
+
+
+class _InstrumentedAdapter(HTTPAdapter):
+    def __init__(self, stats: ConnectionStats, **kwargs: Any) -> None:
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def _instrument(self, manager: Any) -> Any:
+        manager.pool_classes_by_scheme = {
+            "http": _instrumented_pool(HTTPConnectionPool, self.stats),
+            "https": _instrumented_pool(HTTPSConnectionPool, self.stats),
+        }
+        return manager
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self._instrument(self.poolmanager)
+
+    def proxy_manager_for(self, proxy: str, **proxy_kwargs: Any) -> Any:
+        is_new = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if is_new:
+            self._instrument(manager)
+        return manager
+
+
+def download_pool_size() -> int:
+    """每个 host 的连接池大小 = 下载阶段线程数 x 每个文件的分段连接数"""
+    return max(settings.DOWNLOAD_WORKERS, 1) * max(settings.DOWNLOAD_CONNECTIONS, 1)
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+# Shared download sessions (keep-alive pools) and their stats, per host
+_sessions: Dict[str, requests.Session] = {}
+_stats: Dict[str, ConnectionStats] = {}
+_lock = threading.Lock()
+
+
+def _stats_for(key: str) -> ConnectionStats:
+    stats = _stats.get(key)
+    if stats is None:
+        stats = ConnectionStats()
+        _stats[key] = stats
+    return stats
+
+
+def get_download_session(url: str) -> requests.Session:
+    """
+    Returns the process-wide download session for the URL's host.
+    Connections stay alive across files instead of paying TCP + TLS (+ proxy CONNECT) per video.
+    """
+    key = _host_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            size = download_pool_size()
+            adapter = _InstrumentedAdapter(_stats_for(key), pool_connections=4, pool_maxsize=size)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def record_download_bytes(url: str, count: int) -> None:
+    with _lock:
+        stats = _stats_for(_host_key(url))
+    stats.record_bytes(count)
+
+
+def download_stats(host: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """按 host 汇总的下载连接统计 (另含 "total")"""
+    with _lock:
+        items = list(_stats.items())
+    result = {key: stats.snapshot() for key, stats in items if host is None or key == _host_key(host)}
+    total: Dict[str, Any] = {}
+    for snapshot in result.values():
+        for name, value in snapshot.items():
+            total[name] = total.get(name, 0) + value
+    result["total"] = total
+    return result
+
+
+def close_download_sessions() -> None:
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
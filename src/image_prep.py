@@ -0,0 +1,199 @@
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .config import settings
+from .storage import HASH_CHUNK_SIZE, UploadIndex
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is only needed for start-frame preprocessing
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Frame sizes the providers accept, keyed by Segment.resolution
+TARGET_SIZES = {
+    "horizontal": (1280, 720),
+    "vertical": (720, 1280),
+}
+_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "png": ("PNG", ".png"),
+}
+
+
+def _render(source: str, dest: str, size: Tuple[int, int], image_format: str, quality: int) -> int:
+    """
+    (在工作进程中运行) 按 EXIF 方向摆正，居中裁剪并缩放到 size，重新编码写入 dest，返回写入的字节数。
+    """
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if image_format != "PNG" or img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        if img.size != size:
+            img = ImageOps.fit(img, size, method=Image.LANCZOS)
+        tmp = f"{dest}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            if image_format == "PNG":
+                img.save(tmp, "PNG", optimize=True)
+            else:
+                img.save(tmp, image_format, quality=quality, optimize=True)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return os.path.getsize(dest)
+
+
+class ImagePreprocessor:
+    """
+    起始帧预处理: 上传 / 提交给 provider 之前裁剪缩放到目标分辨率 (1280x720 / 720x1280) 并重新编码。
+    - 衍生图按 源文件 md5 + 尺寸 + 格式 + 质量 缓存在 cache_dir，源文件不变时不再处理 (md5 本身也按 size + mtime 缓存)
+    - 图像处理在进程池中运行 (CPU 密集，不占用主进程 GIL)；用 spawn 启动工作进程，
+      调用方往往是多线程的 (API 线程、asyncio.to_thread)，fork 可能继承被其他线程持有的锁而死锁
+    - 未安装 Pillow、格式未知或处理失败时返回原图，行为与未启用预处理一致
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        image_format: str = "jpeg",
+        quality: int = 90,
+        workers: Optional[int] = None,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.image_format, self.suffix = _FORMATS.get(image_format.lower(), _FORMATS["jpeg"])
+        self.quality = quality
+        self.workers = workers or None
+        self.index = UploadIndex(self.cache_dir / "index.json")
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _source_md5(self, source: Path) -> str:
+        cached = self.index.lookup_md5(source)
+        if cached:
+            return cached
+        hash_md5 = hashlib.md5()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                hash_md5.update(chunk)
+        digest = hash_md5.hexdigest()
+        self.index.remember_md5(source, digest)
+        return digest
+
+    def _derivative_path(self, file_hash: str, size: Tuple[int, int]) -> Path:
+        # Quality only changes lossy encodings; PNG derivatives are the same at any setting
+        quality = "" if self.image_format == "PNG" else f"_q{self.quality}"
+        return self.cache_dir / f"{file_hash}_{size[0]}x{size[1]}{quality}{self.suffix}"
+
+    def cached(self, source: Path, resolution: str) -> Optional[Path]:
+        """源文件未变化且衍生图已存在时返回衍生图，不读取源文件内容；否则返回 None"""
+        size = TARGET_SIZES.get(resolution)
+        file_hash = self.index.lookup_md5(source) if size and source.exists() else None
+        if not file_hash:
+            return None
+        derivative = self._derivative_path(file_hash, size)
+        return derivative if derivative.exists() else None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _submit(self, source: Path, resolution: str) -> Tuple[Optional[Path], Optional[Future]]:
+        """返回 (衍生图路径, 渲染 future)；已缓存时 future 为 None；无法处理时返回 (None, None)"""
+        size = TARGET_SIZES.get(resolution)
+        if not self.available or not size:
+            return None, None
+        try:
+            derivative = self._derivative_path(self._source_md5(source), size)
+            if derivative.exists():
+                return derivative, None
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            future = self._get_pool().submit(
+                _render, str(source), str(derivative), size, self.image_format, self.quality
+            )
+            return derivative, future
+        except (OSError, RuntimeError, BrokenProcessPool) as e:
+            logger.warning(f"Cannot preprocess {source.name}; using the original: {e}")
+            return None, None
+
+    def _collect(self, source: Path, derivative: Optional[Path], future: Optional[Future]) -> Path:
+        if derivative is None:
+            return source
+        if future is not None:
+            try:
+                written = future.result()
+                logger.info(
+                    f"Preprocessed {source.name} -> {derivative.name} "
+                    f"({source.stat().st_size / 1024:.0f} KB -> {written / 1024:.0f} KB)"
+                )
+            except Exception as e:
+                # Pillow raises a variety of errors for unreadable or unsupported images
+                logger.warning(f"Cannot preprocess {source.name}; using the original: {e}")
+                return source
+        return derivative
+
+    def prepare(self, source: Path, resolution: str) -> Path:
+        """返回 source 在 resolution 下的预处理结果 (无法处理时为 source 本身)"""
+        derivative, future = self._submit(source, resolution)
+        self.index.save()
+        return self._collect(source, derivative, future)
+
+    def prepare_many(self, items: Iterable[Tuple[Path, str]]) -> Dict[Tuple[Path, str], Path]:
+        """并行预处理多张图片，返回 (源路径, 分辨率) -> 预处理结果"""
+        submitted = {item: self._submit(*item) for item in dict.fromkeys(items)}
+        self.index.save()
+        return {item: self._collect(item[0], *pending) for item, pending in submitted.items()}
+
+    def close(self) -> None:
+        self.index.save()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# Global instance
+image_preprocessor: Optional[ImagePreprocessor] = None
+_image_preprocessor_lock = threading.Lock()
+
+
+def get_image_preprocessor() -> Optional[ImagePreprocessor]:
+    """返回全局预处理器；IMAGE_PREP_ENABLED=false 或未安装 Pillow 时返回 None"""
+    global image_preprocessor
+    if not settings.IMAGE_PREP_ENABLED or Image is None:
+        return None
+    with _image_preprocessor_lock:
+        if image_preprocessor is None:
+            image_preprocessor = ImagePreprocessor(
+                settings.IMAGE_PREP_CACHE_DIR or (settings.DEFAULT_OUTPUT_DIR / ".image_cache"),
+                image_format=settings.IMAGE_PREP_FORMAT,
+                quality=settings.IMAGE_PREP_QUALITY,
+                workers=settings.IMAGE_PREP_WORKERS,
+            )
+            atexit.register(image_preprocessor.close)
+        return image_preprocessor
+
+
+def prepare_image(source: Path, resolution: str) -> Path:
+    """预处理单张起始帧；未启用时原样返回"""
+    preprocessor = get_image_preprocessor()
+    return preprocessor.prepare(source, resolution) if preprocessor else source
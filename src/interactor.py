@@ -7,9 +7,11 @@ from rich.console import Console
 from rich.prompt import Prompt, Confirm
 from rich.table import Table
 from rich.panel import Panel
+from rich.progress import Progress, BarColumn, MofNCompleteColumn, TextColumn
 from .models import GenerationTask
 from .asset_manager import AssetManager
-from .storage import TencentCOSClient
+from .storage import get_object_storage
+from .image_prep import get_image_preprocessor
 from .config import settings
 
 console = Console()
@@ -414,19 +416,19 @@ def _remove_id_injection(tasks: List[GenerationTask], name: str):
 
 def interactive_image_injection(tasks: List[GenerationTask]):
     """
-    Scans for local start frame images in asset/segment/, uploads them to COS, 
-    and updates the JSON image_url field.
+    Scans for local start frame images in asset/segment/, uploads them to the configured
+    object storage (STORAGE_BACKEND), and updates the JSON image_url field.
     """
     console.print(Panel("🖼️  参考图注入检查 (Start Frame Injection)", style="cyan"))
     
-    # Check if COS is configured
+    # Check if object storage is configured
     try:
-        cos_client = TencentCOSClient()
-        if not cos_client.enabled:
-            console.print("[yellow]未检测到腾讯云 COS 配置，跳过图片上传步骤。[/yellow]")
+        storage = get_object_storage()
+        if not storage.enabled:
+            console.print(f"[yellow]未检测到对象存储 ({storage.name}) 配置，跳过图片上传步骤。[/yellow]")
             return
     except (OSError, ValueError) as e:
-        console.print(f"[red]COS 客户端初始化失败: {e}[/red]")
+        console.print(f"[red]对象存储初始化失败: {e}[/red]")
         return
 
     console.print("此步骤将扫描 'asset/segment/' 目录下的起始帧图片，并上传至对象存储。")
@@ -443,63 +445,98 @@ def interactive_image_injection(tasks: List[GenerationTask]):
 
     processed_count = 0
     uploaded_count = 0
-    
+    preprocessor = get_image_preprocessor()
+
+    # 2. Decide what to upload (prompts happen here, before any upload starts)
+    pending: List[Tuple[GenerationTask, Path]] = []
+    # One manager per storyboard, so its directory listing is shared by all of its segments
+    asset_managers: Dict[Path, AssetManager] = {}
     for (source_file, seg_idx), task in unique_segments.items():
-        asset_mgr = AssetManager(source_file)
+        asset_mgr = asset_managers.get(source_file)
+        if asset_mgr is None:
+            asset_mgr = asset_managers[source_file] = AssetManager(source_file)
         
         # Look for start image (e.g., 1_start.png)
         start_img_path = asset_mgr.get_segment_image(seg_idx, "start")
-        
-        if start_img_path:
-            console.print(f"\n[cyan]发现本地图片[/cyan]: {start_img_path.name} (Segment {seg_idx})")
-            
-            # Check existing URL
-            existing_url = task.segment.image_url
-            should_upload = True
-            
-            if existing_url:
-                console.print(f"  [dim]当前 image_url: {existing_url}[/dim]")
-                # If it looks like a COS URL we just uploaded, maybe skip?
-                # For now, simplistic check: prompt user
-                should_upload = Confirm.ask(f"  Segment {seg_idx} 已存在链接，是否上传本地图片并覆盖?", default=False)
-            
-            if should_upload:
-                # Upload
-                with console.status(f"[green]正在上传 {start_img_path.name}...[/green]"):
-                    url = cos_client.upload_file(start_img_path)
-                    
-                if url:
-                    # Update all tasks sharing this segment
-                    task.segment.image_url = url
-                    uploaded_count += 1
-                    
-                    # IMMEDIATE PERSISTENCE
-                    # Save this change to the JSON file right now
-                    try:
-                        _persist_segment_change(task.source_file, task.segment)
-                        console.print(f"  [green]✔ 上传并保存成功:[/green] {url}")
-                    except (OSError, json.JSONDecodeError, ValueError) as e:
-                        console.print(f"  [red]⚠ 上传成功但保存JSON失败: {e}[/red]")
-                else:
-                    console.print(f"  [red]✘ 上传失败[/red]")
-            else:
+        if not start_img_path:
+            continue
+
+        console.print(f"\n[cyan]发现本地图片[/cyan]: {start_img_path.name} (Segment {seg_idx})")
+        processed_count += 1
+
+        # Check existing URL
+        existing_url = task.segment.image_url
+        uploaded_forms = [start_img_path]
+        derivative = preprocessor.cached(start_img_path, task.segment.resolution) if preprocessor else None
+        if derivative:
+            uploaded_forms.append(derivative)
+        if existing_url and existing_url in {storage.cached_url(path) for path in uploaded_forms}:
+            # Same file (size + mtime) already uploaded to this URL (as-is or preprocessed): no hash, no upload, no prompt
+            console.print("  [dim]⏭ 图片未变化，已是当前链接[/dim]")
+            continue
+
+        if existing_url:
+            console.print(f"  [dim]当前 image_url: {existing_url}[/dim]")
+            if not Confirm.ask(f"  Segment {seg_idx} 已存在链接，是否上传本地图片并覆盖?", default=False):
                 console.print("  [dim]⏭ 跳过[/dim]")
-                
-            processed_count += 1
+                continue
+        pending.append((task, start_img_path))
+
+    # 3. Crop/resize to the provider frame size and re-encode (process pool, cached by source hash)
+    prepared: Dict[Tuple[Path, str], Path]
+    if pending and preprocessor:
+        with console.status("[cyan]预处理起始帧 (裁剪缩放并重新编码)..."):
+            prepared = preprocessor.prepare_many((path, task.segment.resolution) for task, path in pending)
+    else:
+        prepared = {(path, task.segment.resolution): path for task, path in pending}
+
+    # 4. Upload in parallel (bounded pool; large files go up as multipart)
+    if pending:
+        with Progress(
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            console=console,
+        ) as progress:
+            bar = progress.add_task("[green]上传起始帧", total=len(set(prepared.values())))
+            urls = storage.upload_files(
+                list(prepared.values()),
+                on_done=lambda path, url: progress.advance(bar),
+            )
+
+        # 5. Write all new image_urls back, one write per storyboard file
+        changed_by_file: Dict[Path, List[Any]] = {}
+        for task, start_img_path in pending:
+            url = urls.get(prepared[(start_img_path, task.segment.resolution)])
+            if not url:
+                console.print(f"  [red]✘ 上传失败[/red]: {start_img_path.name} (Segment {task.segment.segment_index})")
+                continue
+            # Tasks of the same segment share this Segment object
+            task.segment.image_url = url
+            uploaded_count += 1
+            changed_by_file.setdefault(task.source_file, []).append(task.segment)
+        for source_file, segments in changed_by_file.items():
+            try:
+                _persist_segment_changes(source_file, segments)
+                console.print(f"  [green]✔ 已保存 {len(segments)} 个 image_url[/green] -> {source_file.name}")
+            except (OSError, json.JSONDecodeError, ValueError) as e:
+                console.print(f"  [red]⚠ 上传成功但保存JSON失败 ({source_file.name}): {e}[/red]")
 
     console.print(f"\n[bold]处理完成[/bold]: 扫描 {processed_count} 个本地资产，上传更新 {uploaded_count} 个。")
-    console.print("[dim]注意: 所有更改已实时写入 JSON 文件。[/dim]\n")
+    console.print("[dim]注意: 所有更改已写入 JSON 文件。[/dim]\n")
 
-def _persist_segment_change(source_file: Path, segment: Any):
+def _persist_segment_changes(source_file: Path, segments: List[Any]):
     """
-    Helper to save a single segment's changes to its source JSON file immediately.
+    Helper to save segments' changes to their source JSON file (one read, one write per file).
     """
     with open(source_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
     changed = False
+    seg_map = {segment.segment_index: segment for segment in segments}
     for seg_dict in data.get("segments", []):
-        if seg_dict.get("segment_index") == segment.segment_index:
+        segment = seg_map.get(seg_dict.get("segment_index"))
+        if segment is not None:
             # Check and update fields
             # We focus on image_url here, but might as well sync others if we have the object
             if seg_dict.get("image_url") != segment.image_url:
@@ -518,7 +555,6 @@ def _persist_segment_change(source_file: Path, segment: Any):
             if seg_dict.get("resolution") != segment.resolution:
                 seg_dict["resolution"] = segment.resolution
                 changed = True
-            break
             
     if changed:
         with open(source_file, 'w', encoding='utf-8') as f:
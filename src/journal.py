@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Events after which the remote task needs no more work
+# ("superseded": the entry belongs to another storyboard or an older prompt and is not resumed)
+TERMINAL_EVENTS = {"downloaded", "download_failed", "failed", "remote_failed", "poll_timeout", "superseded"}
+# Folded states that a resume can pick up: still polling, or generated but not yet downloaded
+RESUMABLE_STATES = {"submitted", "completed"}
+# Generated but the download gave up: kept so a later redownload can still find the task
+REDOWNLOAD_STATES = {"download_failed"}
+
+
+def journal_key(source_file: Path, task_id: str) -> str:
+    """
+    提交日志条目的 key: 分镜文件 + 本地任务 ID。
+    CLI 任务 ID ({stem}_s{idx}_v{v}) 只在单个分镜文件内唯一，不同项目的同名分镜不能共用一个条目。
+    """
+    try:
+        source = Path(source_file).resolve()
+    except OSError:
+        source = Path(source_file)
+    return f"{source}#{task_id}"
+
+
+class SubmissionJournal:
+    """
+    追加写 (JSONL) 的提交日志
+    - 每行记录一次状态迁移: submitted -> completed -> downloaded / download_failed，
+      或 remote_failed / poll_timeout / failed
+    - submitted 行 fsync 落盘: 远端 task_id 一旦拿到 (已付费) 就不会因崩溃丢失
+    - 启动时回放日志，得到每个本地任务的最新状态；未结束的远端任务可以重新挂载轮询/下载
+    - 条目按 journal_key (分镜文件 + 本地任务 ID) 区分
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line after a crash is expected; anything else is worth a warning
+                    logger.warning(f"Skipping unreadable journal line {line_no} in {self.path}")
+                    continue
+                self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        # Lines written before entries were keyed by journal_key only carry the local task id
+        key = record.get("key") or record.get("task_id")
+        if not key:
+            return
+        event = record.get("event")
+        if event == "submitted":
+            # A new submission replaces whatever the previous attempt left behind
+            entry: Dict[str, Any] = {}
+            self._entries[key] = entry
+        else:
+            entry = self._entries.setdefault(key, {})
+        entry.update({k: v for k, v in record.items() if k not in {"event", "ts"}})
+        entry["key"] = key
+        entry["state"] = event
+        entry["updated_at"] = record.get("ts")
+
+    def record(self, key: str, event: str, **fields: Any) -> None:
+        record = {"ts": time.time(), "key": key, "event": event, **fields}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._apply(record)
+            try:
+                self._file.write(line + "\n")
+                self._file.flush()
+                if event == "submitted":
+                    os.fsync(self._file.fileno())
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to append to submission journal {self.path}: {e}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    def get_outstanding(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.get(key)
+        if entry and entry.get("state") in RESUMABLE_STATES and entry.get("remote_task_id"):
+            return entry
+        return None
+
+    def outstanding(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(entry)
+                for entry in self._entries.values()
+                if entry.get("state") in RESUMABLE_STATES and entry.get("remote_task_id")
+            ]
+
+    def compact(self) -> None:
+        """
+        重写日志，只保留未结束任务与下载失败任务的最新状态 (启动时调用，防止日志无限增长)。
+        download_failed 条目保存着任务本身，重新下载时用它更新 manifest 与内容存储。
+        """
+        with self._lock:
+            keep = {
+                key: entry
+                for key, entry in self._entries.items()
+                if entry.get("state") in RESUMABLE_STATES
+                or (entry.get("state") in REDOWNLOAD_STATES and entry.get("task"))
+            }
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            try:
+                with tmp_path.open("w", encoding="utf-8") as f:
+                    for key, entry in keep.items():
+                        fields = {k: v for k, v in entry.items() if k not in {"state", "updated_at"}}
+                        record = {"ts": entry.get("updated_at"), "event": entry["state"], **fields}
+                        record["key"] = key
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._file.close()
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f"Failed to compact submission journal {self.path}: {e}")
+            finally:
+                if self._file.closed:
+                    self._file = self.path.open("a", encoding="utf-8")
+            self._entries = keep
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+# Global instance
+journal: Optional[SubmissionJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> Optional[SubmissionJournal]:
+    """返回全局提交日志；SUBMISSION_JOURNAL_ENABLED=false 时返回 None"""
+    global journal
+    if not settings.SUBMISSION_JOURNAL_ENABLED:
+        return None
+    with _journal_lock:
+        if journal is None:
+            path = settings.SUBMISSION_JOURNAL_PATH or (settings.DEFAULT_OUTPUT_DIR / ".submission_journal.jsonl")
+            try:
+                journal = SubmissionJournal(path)
+            except OSError as e:
+                logger.error(f"Submission journal unavailable ({path}): {e}")
+                return None
+        return journal
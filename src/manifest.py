@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .models import GenerationTask
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+ManifestKey = Tuple[str, int, int, str]
+
+
+def manifest_dir(task: GenerationTask) -> Path:
+    """
+    Manifest 所在目录: 任务输出目录的上一级 (即整个分镜文件的输出目录，
+    CLI 模式下为 .../{Json_Filename}/，其下是各 Segment_N 目录)。
+    """
+    return task.output_dir.parent
+
+
+def manifest_key(task: GenerationTask) -> ManifestKey:
+    try:
+        source = str(task.source_file.resolve())
+    except OSError:
+        source = str(task.source_file)
+    return (source, task.segment.segment_index, task.version_index, task.prompt_hash)
+
+
+class OutputManifest:
+    """
+    输出目录的产物索引 (JSONL，追加写，后写覆盖先写)
+    key = (source_file, segment_index, version_index, prompt_hash) -> 已生成的视频
+    跳过判断只需一次内存查询，不再对每个输出文件 stat()。
+    """
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.path = self.directory / MANIFEST_FILENAME
+        self._lock = threading.Lock()
+        self._index: Dict[ManifestKey, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        key = (entry["source_file"], entry["segment_index"], entry["version_index"], entry["prompt_hash"])
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+                    if entry.get("removed"):
+                        self._index.pop(key, None)
+                    else:
+                        self._index[key] = entry
+        except OSError as e:
+            logger.error(f"Failed to read manifest {self.path}: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index)
+
+    def lookup(self, task: GenerationTask) -> Optional[Dict[str, Any]]:
+        """返回该任务已生成的产物记录 (video_path 为绝对路径)，没有则返回 None"""
+        with self._lock:
+            entry = self._index.get(manifest_key(task))
+        if not entry:
+            return None
+        result = dict(entry)
+        result["video_path"] = str(self.directory / entry["video_path"])
+        return result
+
+    def record(self, task: GenerationTask, video_path: Path, **fields: Any) -> None:
+        source, segment_index, version_index, prompt_hash = manifest_key(task)
+        try:
+            rel_path = os.path.relpath(video_path, self.directory)
+        except ValueError:
+            rel_path = str(video_path)
+        entry = {
+            "source_file": source,
+            "segment_index": segment_index,
+            "version_index": version_index,
+            "prompt_hash": prompt_hash,
+            "video_path": rel_path,
+            "task_id": task.id,
+            "ts": time.time(),
+            **fields,
+        }
+        self._append(entry)
+
+    def remove(self, task: GenerationTask) -> None:
+        """使记录失效 (例如文件被判定损坏)，下次运行会重新生成"""
+        source, segment_index, version_index, prompt_hash = manifest_key(task)
+        self._append({
+            "source_file": source,
+            "segment_index": segment_index,
+            "version_index": version_index,
+            "prompt_hash": prompt_hash,
+            "removed": True,
+            "ts": time.time(),
+        })
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        key = (entry["source_file"], entry["segment_index"], entry["version_index"], entry["prompt_hash"])
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            if entry.get("removed"):
+                self._index.pop(key, None)
+            else:
+                self._index[key] = entry
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.error(f"Failed to update manifest {self.path}: {e}")
+
+
+# Loaded manifests, one per output directory
+_manifests: Dict[Path, OutputManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(directory: Path) -> OutputManifest:
+    key = Path(directory).resolve()
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = OutputManifest(key)
+            _manifests[key] = manifest
+        return manifest
+
+
+def lookup_output(task: GenerationTask) -> Optional[Dict[str, Any]]:
+    return get_manifest(manifest_dir(task)).lookup(task)
+
+
+def record_output(task: GenerationTask, video_path: Path, **fields: Any) -> None:
+    get_manifest(manifest_dir(task)).record(task, video_path, **fields)
+
+
+def remove_output(task: GenerationTask) -> None:
+    get_manifest(manifest_dir(task)).remove(task)
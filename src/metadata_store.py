@@ -0,0 +1,192 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Recently read or written documents kept in memory; a stat() tells whether the file still matches
+CACHE_SIZE = 4096
+
+# (st_mtime_ns, st_size) of a file as it was read or written
+FileSignature = Tuple[int, int]
+
+
+def _signature(st: os.stat_result) -> FileSignature:
+    return st.st_mtime_ns, st.st_size
+
+
+def _atomic_dump(path: Path, payload: Dict[str, Any]) -> FileSignature:
+    """写出 payload，返回写入后文件的签名 (rename 不改变 mtime 与大小)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        signature = _signature(os.stat(tmp))
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return signature
+
+
+class MetadataWriter:
+    """
+    任务元数据 JSON 的合并写入服务
+    - write() 整体替换、update() 合并字段；都只修改内存中的文档，由后台线程每 flush_interval 秒批量落盘
+    - 同一文件在一个周期内的多次修改只写一次；写入为 tmp + os.replace，读者不会看到半个文件
+    - read() 优先返回内存中的文档: 待写的直接返回；已落盘的先比较文件的 mtime/大小，
+      文件被其他进程改写过 (例如另一个 --redownload) 时重新读取，避免把旧文档写回去
+    - 写盘串行进行: 先取出的批次一定先写完，后台批量写出与 flush_metadata() 不会用旧版本覆盖新版本
+    - flush_interval <= 0 时同步写入
+    """
+
+    def __init__(self, flush_interval: float = 0.5) -> None:
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # key -> (document, signature of the file holding it; None while not on disk yet)
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], Optional[FileSignature]]]" = OrderedDict()
+        # Held from taking a batch until it is on disk; taken before _cond, never inside it
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="metadata-writer", daemon=True)
+            self._thread.start()
+
+    def _remember(self, key: str, payload: Dict[str, Any], signature: Optional[FileSignature] = None) -> None:
+        self._cache[key] = (payload, signature)
+        self._cache.move_to_end(key)
+        while len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _put_locked(self, key: str, document: Dict[str, Any]) -> bool:
+        """登记待写文档；返回 True 表示没有后台线程，调用方需在释放锁后同步 flush"""
+        self._pending[key] = document
+        self._remember(key, document)
+        if self._thread is not None and not self._closed:
+            self._cond.notify()
+            return False
+        return True
+
+    def write(self, path: Path, payload: Dict[str, Any]) -> None:
+        """用 payload 替换 path 的全部内容"""
+        with self._cond:
+            write_through = self._put_locked(str(path), dict(payload))
+        if write_through:
+            self.flush(path)
+
+    def update(self, path: Path, updates: Dict[str, Any], drop: Iterable[str] = ()) -> Dict[str, Any]:
+        """把 updates 合并进 path 的现有内容 (并删除 drop 中的字段)，返回合并后的文档"""
+        with self._cond:
+            document = dict(self._read_locked(path))
+            document.update(updates)
+            for name in drop:
+                document.pop(name, None)
+            write_through = self._put_locked(str(path), document)
+        if write_through:
+            self.flush(path)
+        return document
+
+    def read(self, path: Path) -> Dict[str, Any]:
+        """返回 path 的内容；文件不存在或无法解析时返回空 dict"""
+        with self._cond:
+            return dict(self._read_locked(path))
+
+    def _read_locked(self, path: Path) -> Dict[str, Any]:
+        key = str(path)
+        document = self._pending.get(key)
+        if document is not None:
+            return document
+        cached = self._cache.get(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                signature = _signature(os.fstat(f.fileno()))
+                if cached is not None and cached[1] == signature:
+                    return cached[0]
+                document = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._cache.pop(key, None)
+            return {}
+        if isinstance(document, dict):
+            self._remember(key, document, signature)
+            return document
+        return {}
+
+    def flush(self, path: Optional[Path] = None) -> None:
+        """立即写出待写文档 (全部或只写 path)"""
+        with self._write_lock:
+            with self._cond:
+                if path is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    document = self._pending.pop(str(path), None)
+                    batch = {str(path): document} if document is not None else {}
+            for key, document in batch.items():
+                try:
+                    signature = _atomic_dump(Path(key), document)
+                except OSError as e:
+                    logger.error(f"Failed to write metadata {key}: {e}")
+                    continue
+                with self._cond:
+                    cached = self._cache.get(key)
+                    # Later writes to the same key keep their own (pending) entry
+                    if cached is not None and cached[0] is document:
+                        self._remember(key, document, signature)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Let updates for the same files pile up for one interval
+                self._cond.wait_for(lambda: self._closed, timeout=self.flush_interval)
+            self.flush()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+# Global instance
+metadata_writer: Optional[MetadataWriter] = None
+_metadata_lock = threading.Lock()
+
+
+def get_metadata_writer() -> MetadataWriter:
+    global metadata_writer
+    with _metadata_lock:
+        if metadata_writer is None:
+            metadata_writer = MetadataWriter(settings.METADATA_FLUSH_SECONDS)
+            atexit.register(metadata_writer.close)
+        return metadata_writer
+
+
+def write_metadata(path: Path, payload: Dict[str, Any]) -> None:
+    get_metadata_writer().write(path, payload)
+
+
+def update_metadata(path: Path, updates: Dict[str, Any], drop: Iterable[str] = ()) -> Dict[str, Any]:
+    return get_metadata_writer().update(path, updates, drop)
+
+
+def read_metadata(path: Path) -> Dict[str, Any]:
+    return get_metadata_writer().read(path)
+
+
+def flush_metadata() -> None:
+    get_metadata_writer().flush()
@@ -0,0 +1,315 @@
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# moov is buffered in memory while streaming; anything larger is not a sane video header
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+# Container boxes walked when looking for mvhd / tkhd / stco inside moov
+_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf"}
+COPY_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class Mp4ValidationError(IOError):
+    """
+    下载内容不是完整的 MP4 (截断、HTML 错误页等)。
+    继承 IOError 以便按文件错误处理，但下载不会因它重试: 重新下载得到的还是同样的内容，
+    下载函数直接返回失败并删除 .tmp。
+    """
+
+
+def _is_box_type(box_type: bytes) -> bool:
+    return all(32 <= c < 127 for c in box_type)
+
+
+def _read_header(data: bytes, offset: int = 0) -> Optional[Tuple[bytes, int, int]]:
+    """解析 box 头，返回 (type, box 总长度, 头长度)；数据不足时返回 None。总长度 0 表示延伸到文件末尾"""
+    if len(data) - offset < 8:
+        return None
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    if size == 1:
+        if len(data) - offset < 16:
+            return None
+        (size,) = struct.unpack_from(">Q", data, offset + 8)
+        return box_type, size, 16
+    return box_type, size, 8
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None):
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        header = _read_header(data, offset)
+        if header is None:
+            return
+        box_type, size, header_len = header
+        if size == 0:
+            size = end - offset
+        if size < header_len or offset + size > end:
+            raise Mp4ValidationError(f"corrupt {box_type!r} box inside moov")
+        yield box_type, offset + header_len, offset + size
+        offset += size
+
+
+def _parse_moov(moov: bytes) -> Dict[str, Any]:
+    """从 moov 内容中提取时长 (mvhd) 与视频轨分辨率 (tkhd 宽高非零的轨道)"""
+    info: Dict[str, Any] = {"duration_seconds": None, "width": None, "height": None}
+    stack: List[Tuple[int, int]] = [(0, len(moov))]
+    while stack:
+        start, end = stack.pop()
+        for box_type, body, box_end in _iter_boxes(moov, start, end):
+            if box_type in _CONTAINER_BOXES:
+                stack.append((body, box_end))
+            elif box_type == b"mvhd":
+                version = moov[body]
+                if version == 1:
+                    timescale, duration = struct.unpack_from(">IQ", moov, body + 20)
+                else:
+                    timescale, duration = struct.unpack_from(">II", moov, body + 12)
+                if timescale:
+                    info["duration_seconds"] = round(duration / timescale, 3)
+            elif box_type == b"tkhd" and info["width"] is None:
+                version = moov[body]
+                # Width / height are 16.16 fixed point at the end of tkhd
+                dims = body + (88 if version == 1 else 76)
+                if dims + 8 <= box_end:
+                    width, height = struct.unpack_from(">II", moov, dims)
+                    if width and height:
+                        info["width"] = width >> 16
+                        info["height"] = height >> 16
+    return info
+
+
+class Mp4StreamValidator:
+    """
+    ISO-BMFF 顶层 box 的流式校验器: 下载时逐块 feed()，不做二次读取。
+    - 只缓存 box 头与 moov 内容，mdat 等大块数据直接跳过
+    - finish() 检查 ftyp 在首位、moov / mdat 存在且最后一个 box 完整，返回时长与分辨率
+    """
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.boxes: List[bytes] = []
+        self._header = bytearray()
+        self._skip = 0
+        self._to_eof = False
+        self._moov: Optional[bytearray] = None
+        self._moov_remaining = 0
+        self._info: Dict[str, Any] = {}
+
+    @property
+    def skip_remaining(self) -> int:
+        """当前 box 中还可以直接跳过 (无需解析) 的字节数"""
+        return 0 if self._to_eof else self._skip
+
+    @property
+    def at_eof_box(self) -> bool:
+        """已进入 "延伸到文件末尾" 的 box，之后的数据都无需解析"""
+        return self._to_eof
+
+    @property
+    def read_hint(self) -> int:
+        """从文件读取时下一次建议读取的字节数: 缓存 moov 时读大块，否则只读一个 box 头"""
+        return 64 * 1024 if self._moov is not None else 16
+
+    def advance(self, count: int) -> None:
+        """跳过 count 个不需要解析的字节 (不能超过 skip_remaining，或位于末尾 box 中)"""
+        if not self._to_eof:
+            self._skip -= count
+        self.size += count
+
+    def feed(self, data: bytes) -> None:
+        view = memoryview(data)
+        self.size += len(view)
+        while view:
+            if self._to_eof:
+                return
+            if self._skip:
+                step = min(self._skip, len(view))
+                self._skip -= step
+                view = view[step:]
+            elif self._moov is not None:
+                step = min(self._moov_remaining, len(view))
+                self._moov += view[:step]
+                self._moov_remaining -= step
+                view = view[step:]
+                if not self._moov_remaining:
+                    self._info = _parse_moov(bytes(self._moov))
+                    self._moov = None
+            else:
+                # 8-byte header, or 16 once the size field says a 64-bit size follows
+                need = 16 if len(self._header) >= 8 else 8
+                step = min(need - len(self._header), len(view))
+                self._header += view[:step]
+                view = view[step:]
+                header = _read_header(bytes(self._header))
+                if header is not None:
+                    self._header.clear()
+                    self._open_box(*header)
+
+    def _open_box(self, box_type: bytes, size: int, header_len: int) -> None:
+        if not _is_box_type(box_type) or (not self.boxes and box_type != b"ftyp"):
+            raise Mp4ValidationError(f"not an MP4 file (starts with {box_type!r})")
+        if size and size < header_len:
+            raise Mp4ValidationError(f"invalid size {size} for {box_type!r} box")
+        self.boxes.append(box_type)
+        if size == 0:
+            # Box extends to the end of the file
+            if box_type == b"moov":
+                raise Mp4ValidationError("unbounded moov box")
+            self._to_eof = True
+        elif box_type == b"moov":
+            if size - header_len > MAX_MOOV_BYTES:
+                raise Mp4ValidationError(f"moov box too large ({size} bytes)")
+            self._moov = bytearray()
+            self._moov_remaining = size - header_len
+            if not self._moov_remaining:
+                self._moov = None
+        else:
+            self._skip = size - header_len
+
+    def finish(self) -> Dict[str, Any]:
+        """所有数据 feed 完毕后调用；文件不完整或结构不对时抛出 Mp4ValidationError"""
+        if not self.boxes:
+            raise Mp4ValidationError(f"not an MP4 file ({self.size} bytes)")
+        if self._skip or self._moov is not None or self._header:
+            raise Mp4ValidationError(f"truncated {self.boxes[-1]!r} box after {self.size} bytes")
+        for required in (b"moov", b"mdat"):
+            if required not in self.boxes:
+                raise Mp4ValidationError(f"missing {required.decode()} box")
+        faststart = self.boxes.index(b"moov") < self.boxes.index(b"mdat")
+        return {**self._info, "size_bytes": self.size, "faststart": faststart}
+
+
+def inspect_mp4(path: Path) -> Dict[str, Any]:
+    """
+    校验磁盘上的 MP4 并返回时长/分辨率。
+    只读取 box 头和 moov，mdat 通过 seek 跳过 (用于分段并行下载或绕过 download_file 的下载)。
+    """
+    validator = Mp4StreamValidator()
+    total = Path(path).stat().st_size
+    with open(path, "rb") as f:
+        while True:
+            if validator.at_eof_box:
+                validator.advance(total - validator.size)
+                break
+            skip = min(validator.skip_remaining, total - validator.size)
+            if skip:
+                f.seek(skip, 1)
+                validator.advance(skip)
+                continue
+            data = f.read(validator.read_hint)
+            if not data:
+                break
+            validator.feed(data)
+    return validator.finish()
+
+
+def _top_level_boxes(f, total: int) -> List[Tuple[bytes, int, int]]:
+    """列出顶层 box: [(type, 偏移, 总长度)]，只读取 box 头"""
+    boxes = []
+    offset = 0
+    while offset < total:
+        f.seek(offset)
+        header = _read_header(f.read(16))
+        if header is None:
+            raise Mp4ValidationError(f"truncated box header at {offset}")
+        box_type, size, header_len = header
+        if size == 0:
+            size = total - offset
+        if size < header_len or offset + size > total:
+            raise Mp4ValidationError(f"invalid {box_type!r} box at {offset}")
+        boxes.append((box_type, offset, size))
+        offset += size
+    return boxes
+
+
+def _shift_chunk_offsets(moov: bytearray, shift: int, lower: int = 0, upper: Optional[int] = None) -> None:
+    """把 moov 中落在 [lower, upper) 内的 stco / co64 块偏移加上 shift (原地修改)"""
+    stack: List[Tuple[int, int]] = [(8, len(moov))]
+    while stack:
+        start, end = stack.pop()
+        for box_type, body, box_end in _iter_boxes(moov, start, end):
+            if box_type in _CONTAINER_BOXES:
+                stack.append((body, box_end))
+            elif box_type in (b"stco", b"co64"):
+                (count,) = struct.unpack_from(">I", moov, body + 4)
+                width, fmt = (8, ">Q") if box_type == b"co64" else (4, ">I")
+                if body + 8 + count * width > box_end:
+                    raise Mp4ValidationError(f"corrupt {box_type!r} box")
+                for pos in range(body + 8, body + 8 + count * width, width):
+                    (value,) = struct.unpack_from(fmt, moov, pos)
+                    if value < lower or (upper is not None and value >= upper):
+                        continue
+                    value += shift
+                    if width == 4 and value > 0xFFFFFFFF:
+                        # Would need a stco -> co64 upgrade, which changes the moov size again
+                        raise Mp4ValidationError("chunk offset overflows stco")
+                    struct.pack_into(fmt, moov, pos, value)
+
+
+def _copy_range(src, dst, offset: int, length: int, hasher: Any = None) -> None:
+    src.seek(offset)
+    while length > 0:
+        data = src.read(min(COPY_CHUNK_SIZE, length))
+        if not data:
+            raise Mp4ValidationError("unexpected end of file while copying")
+        dst.write(data)
+        if hasher is not None:
+            hasher.update(data)
+        length -= len(data)
+
+
+def faststart_mp4(path: Path, hasher: Any = None) -> bool:
+    """
+    把 moov 移到 mdat 之前 (faststart)，浏览器拿到前几百 KB 即可开始播放。
+    只把 moov 读入内存，其余数据按 1MB 分块流式复制到临时文件后原子替换。
+    hasher (如 hashlib.sha256()) 会在改写时收到新文件的全部字节。
+    已经是 faststart 时返回 False；发生改写返回 True。
+    """
+    path = Path(path)
+    total = path.stat().st_size
+    with open(path, "rb") as src:
+        boxes = _top_level_boxes(src, total)
+        types = [box_type for box_type, _, _ in boxes]
+        if b"moov" not in types or b"mdat" not in types:
+            raise Mp4ValidationError("missing moov or mdat box")
+        moov_index = types.index(b"moov")
+        mdat_index = types.index(b"mdat")
+        if moov_index < mdat_index:
+            return False
+
+        _, moov_offset, moov_size = boxes[moov_index]
+        if moov_size > MAX_MOOV_BYTES:
+            raise Mp4ValidationError(f"moov box too large ({moov_size} bytes)")
+        src.seek(moov_offset)
+        moov = bytearray(src.read(moov_size))
+        if moov[4:8] != b"moov" or struct.unpack_from(">I", moov)[0] != moov_size:
+            # 64-bit moov headers never happen in practice; leave such files alone
+            raise Mp4ValidationError("unsupported moov header")
+        # Data between the first mdat and the old moov moves back by the size of moov; data after
+        # the old moov (a trailing mdat) keeps its offset, since moov only changes places
+        _, mdat_offset, _ = boxes[mdat_index]
+        _shift_chunk_offsets(moov, moov_size, mdat_offset, moov_offset)
+
+        tmp_path = path.with_suffix(path.suffix + ".faststart")
+        try:
+            with open(tmp_path, "wb") as dst:
+                for box_type, offset, size in boxes[:mdat_index]:
+                    _copy_range(src, dst, offset, size, hasher)
+                dst.write(moov)
+                if hasher is not None:
+                    hasher.update(moov)
+                for index, (box_type, offset, size) in enumerate(boxes[mdat_index:], start=mdat_index):
+                    if index != moov_index:
+                        _copy_range(src, dst, offset, size, hasher)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+    # Replace after the source is closed (Windows cannot replace an open file)
+    os.replace(tmp_path, path)
+    logger.debug(f"Relocated moov ({moov_size} bytes) to the front of {path.name}")
+    return True
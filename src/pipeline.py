@@ -0,0 +1,146 @@
+import logging
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+from . import concurrency
+from .concurrency import AdaptiveConcurrencyController
+from .config import settings
+from .poll_scheduler import PollScheduler, get_poll_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage:
+    """
+    流水线中的一个阶段: 队列 + 独立的工作线程池
+    - capacity > 0 时 put() 在队列满时阻塞 (背压)
+    - front=True 用于生命周期内部的续作 (重试/延迟提交)，插到队首且不受容量限制
+    """
+    def __init__(self, name: str, workers: int, capacity: int = 0):
+        self.name = name
+        self.capacity = capacity
+        self._items: deque = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+        self._active = 0
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(max(workers, 1))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def backlog(self) -> int:
+        """排队中 + 执行中的工作项数量"""
+        with self._lock:
+            return len(self._items) + self._active
+
+    def put(self, fn: Callable, *args, front: bool = False, block: bool = True) -> None:
+        with self._lock:
+            if block and not front:
+                while self.capacity and len(self._items) >= self.capacity and not self._closed:
+                    self._not_full.wait()
+            if self._closed:
+                raise RuntimeError(f"{self.name} stage is closed")
+            if front:
+                self._items.appendleft((fn, args))
+            else:
+                self._items.append((fn, args))
+            self._not_empty.notify()
+
+    def wait_for_room(self) -> None:
+        """阻塞直到该阶段的积压低于容量，用于上游阶段的准入控制"""
+        with self._lock:
+            while self.capacity and len(self._items) + self._active >= self.capacity and not self._closed:
+                self._not_full.wait()
+
+    def shutdown(self, wait: bool = True, cancel: bool = False) -> None:
+        with self._lock:
+            self._closed = True
+            if cancel:
+                self._items.clear()
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if wait:
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                while not self._items and not self._closed:
+                    self._not_empty.wait()
+                if not self._items:
+                    return
+                fn, args = self._items.popleft()
+                self._active += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.exception(f"Unhandled error in {self.name} stage: {e}")
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._not_full.notify_all()
+
+
+class GenerationPipeline:
+    """
+    视频生成流水线: 提交 -> 轮询 -> 下载，三个阶段各自拥有独立的线程与限额
+    - 提交阶段: SUBMIT_WORKERS 个线程，受 provider 并发控制器约束 (许可从提交持有到轮询结束)
+    - 轮询阶段: 由 PollScheduler 托管，不占用线程
+    - 下载阶段: DOWNLOAD_WORKERS 个线程；积压达到 DOWNLOAD_QUEUE_SIZE 时暂停准入新任务
+    下载不再占用 provider 并发额度，因此下载排水期间 provider 仍可保持满载。
+    """
+    def __init__(
+        self,
+        submit_workers: Optional[int] = None,
+        download_workers: Optional[int] = None,
+        download_queue_size: Optional[int] = None,
+        controller: Optional[AdaptiveConcurrencyController] = None,
+        scheduler: Optional[PollScheduler] = None,
+    ):
+        self._controller = controller
+        self.scheduler = scheduler or get_poll_scheduler()
+        self.submit_stage = PipelineStage(
+            "submit",
+            workers=submit_workers or settings.SUBMIT_WORKERS,
+        )
+        self.download_stage = PipelineStage(
+            "download",
+            workers=download_workers or settings.DOWNLOAD_WORKERS,
+            capacity=download_queue_size if download_queue_size is not None else settings.DOWNLOAD_QUEUE_SIZE,
+        )
+
+    @property
+    def controller(self) -> Optional[AdaptiveConcurrencyController]:
+        # Falls back to the global controller, which may be initialized after the pipeline
+        return self._controller if self._controller is not None else concurrency.concurrency_controller
+
+    def shutdown(self, wait: bool = True, cancel: bool = False) -> None:
+        self.submit_stage.shutdown(wait=wait, cancel=cancel)
+        self.download_stage.shutdown(wait=wait, cancel=cancel)
+
+    def __enter__(self) -> "GenerationPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.shutdown(wait=exc_type is None, cancel=exc_type is not None)
+
+
+# Global instance (used by the blocking process_task API)
+default_pipeline: Optional[GenerationPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_default_pipeline() -> GenerationPipeline:
+    global default_pipeline
+    with _pipeline_lock:
+        if default_pipeline is None:
+            default_pipeline = GenerationPipeline()
+        return default_pipeline
@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from .api_client import APIError, RateLimitError
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+class PollTimeoutError(Exception):
+    pass
+
+
+class _PollJob:
+    __slots__ = ("client", "remote_task_id", "label", "future", "interval", "deadline")
+
+    def __init__(self, client: Any, remote_task_id: str, label: str, interval: float, deadline: float):
+        self.client = client
+        self.remote_task_id = remote_task_id
+        self.label = label
+        self.future: Future = Future()
+        self.interval = interval
+        self.deadline = deadline
+
+
+class PollScheduler:
+    """
+    集中式轮询调度器
+    - 所有在途的远端任务按"下一次轮询时间"放入最小堆，由单个计时线程统一调度
+    - 只有真正发起 HTTP 请求 (get_task) 时才占用工作线程，等待期间不占用任何线程
+    - 同时提供 call_later，供任务生命周期中的退避/抖动等待使用
+    """
+    def __init__(self, max_workers: Optional[int] = None):
+        self._heap: List[Tuple[float, int, Callable, tuple]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.POLL_WORKERS,
+            thread_name_prefix="poll-worker",
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._watching = 0
+
+    @property
+    def watching(self) -> int:
+        """当前由调度器托管的远端任务数量"""
+        with self._cond:
+            return self._watching
+
+    def call_later(self, delay: float, fn: Callable, *args) -> None:
+        """在 delay 秒后于工作线程中执行 fn(*args)"""
+        due = time.monotonic() + max(delay, 0.0)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PollScheduler has been shut down")
+            heapq.heappush(self._heap, (due, next(self._counter), fn, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="poll-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def submit(self, fn: Callable, *args) -> None:
+        """立即在工作线程中执行 fn(*args)"""
+        self.call_later(0, fn, *args)
+
+    def watch(
+        self,
+        client: Any,
+        remote_task_id: str,
+        label: Optional[str] = None,
+        initial_delay: Optional[float] = None,
+        interval: Optional[float] = None,
+        max_poll_time: Optional[float] = None,
+    ) -> Future:
+        """
+        托管一个远端任务的轮询。
+        返回的 Future 在任务进入终态 (completed/failed) 时返回 status_data，
+        超过 max_poll_time 时抛出 PollTimeoutError。
+        """
+        initial_delay = settings.POLL_INITIAL_WAIT_SECONDS if initial_delay is None else initial_delay
+        interval = settings.POLL_INTERVAL_SECONDS if interval is None else interval
+        max_poll_time = settings.MAX_POLL_TIME if max_poll_time is None else max_poll_time
+
+        deadline = time.monotonic() + initial_delay + max_poll_time
+        job = _PollJob(client, remote_task_id, label or remote_task_id, interval, deadline)
+        with self._cond:
+            self._watching += 1
+        try:
+            self.call_later(initial_delay, self._check, job)
+        except RuntimeError as exc:
+            self._resolve(job, exc=exc)
+        return job.future
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._cond:
+            self._closed = True
+            pending = self._heap
+            self._heap = []
+            self._cond.notify_all()
+        for _, _, fn, args in pending:
+            if fn == self._check:
+                args[0].future.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    remaining = self._heap[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                _, _, fn, args = heapq.heappop(self._heap)
+            try:
+                self._executor.submit(fn, *args)
+            except RuntimeError:
+                return
+
+    def _check(self, job: _PollJob) -> None:
+        if job.future.done():
+            self._resolve(job)
+            return
+        if time.monotonic() >= job.deadline:
+            self._resolve(job, exc=PollTimeoutError(f"timeout polling {job.remote_task_id}"))
+            return
+
+        try:
+            status_data = job.client.get_task(job.remote_task_id)
+        except (APIError, RateLimitError) as e:
+            logger.warning(f"Polling warning for {job.label}: {e}")
+            self._reschedule(job)
+            return
+        except Exception as e:
+            logger.exception(f"Unexpected polling error for {job.label}: {e}")
+            self._resolve(job, exc=e)
+            return
+
+        status = status_data.get("status")
+        progress = status_data.get("progress", 0)
+        logger.debug(f"Task {job.label} status: {status} ({progress}%)")
+
+        if status in TERMINAL_STATUSES:
+            self._resolve(job, result=status_data)
+        else:
+            self._reschedule(job)
+
+    def _reschedule(self, job: _PollJob) -> None:
+        try:
+            self.call_later(job.interval, self._check, job)
+        except RuntimeError:
+            job.future.cancel()
+            self._resolve(job)
+
+    def _resolve(self, job: _PollJob, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self._watching -= 1
+        if job.future.done():
+            return
+        try:
+            if exc is not None:
+                job.future.set_exception(exc)
+            else:
+                job.future.set_result(result)
+        except InvalidStateError:
+            pass
+
+
+# Global instance
+poll_scheduler: Optional[PollScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_poll_scheduler() -> PollScheduler:
+    global poll_scheduler
+    with _scheduler_lock:
+        if poll_scheduler is None:
+            poll_scheduler = PollScheduler()
+        return poll_scheduler
+
+
+def shutdown_poll_scheduler(wait: bool = False) -> None:
+    global poll_scheduler
+    with _scheduler_lock:
+        scheduler, poll_scheduler = poll_scheduler, None
+    if scheduler:
+        scheduler.shutdown(wait=wait)
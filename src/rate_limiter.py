@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Endpoint classes that are rate limited independently
+ENDPOINT_CLASSES = ("create", "status", "download")
+
+# Used for providers that were never configured (e.g. CLI runs without the backend store).
+# rate: sustained requests per second, burst: bucket size. rate <= 0 disables the bucket.
+DEFAULT_RATE_LIMITS: Dict[str, Dict[str, float]] = {
+    "create": {"rate": 2.0, "burst": 5},
+    "status": {"rate": 10.0, "burst": 20},
+    "download": {"rate": 4.0, "burst": 8},
+}
+
+
+class TokenBucket:
+    """
+    令牌桶限流器
+    - 以 rate 个/秒的速度补充令牌，最多积累 burst 个
+    - acquire() 采用预约方式: 先扣减令牌 (可为负)，再睡眠到预约时刻，
+      等待者按到达顺序放行，无需轮询
+    """
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """预约 tokens 个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """阻塞直到获得令牌，返回实际等待的秒数"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class RateLimiterRegistry:
+    """按 (provider_id, endpoint) 管理令牌桶；配置来自 provider 记录中的 rate_limits"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], Optional[TokenBucket]] = {}
+        self._configs: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    def configure(self, provider_id: str, rate_limits: Optional[Dict[str, Any]]) -> None:
+        """(重新) 配置一个 provider 的限流参数，未列出的 endpoint 使用默认值"""
+        config = {endpoint: dict(limits) for endpoint, limits in DEFAULT_RATE_LIMITS.items()}
+        for endpoint, limits in (rate_limits or {}).items():
+            if limits is None:
+                continue
+            config.setdefault(endpoint, {}).update({k: v for k, v in dict(limits).items() if v is not None})
+        with self._lock:
+            self._configs[provider_id] = config
+            for key in [key for key in self._buckets if key[0] == provider_id]:
+                del self._buckets[key]
+
+    def get(self, provider_id: str, endpoint: str) -> Optional[TokenBucket]:
+        key = (provider_id, endpoint)
+        with self._lock:
+            if key in self._buckets:
+                return self._buckets[key]
+            limits = self._configs.get(provider_id, DEFAULT_RATE_LIMITS).get(endpoint)
+            bucket = None
+            if limits and float(limits.get("rate") or 0) > 0:
+                bucket = TokenBucket(limits["rate"], limits.get("burst") or 1)
+            self._buckets[key] = bucket
+            return bucket
+
+    def acquire(self, provider_id: str, endpoint: str) -> float:
+        bucket = self.get(provider_id, endpoint)
+        return bucket.acquire() if bucket else 0.0
+
+    async def acquire_async(self, provider_id: str, endpoint: str) -> float:
+        bucket = self.get(provider_id, endpoint)
+        return await bucket.acquire_async() if bucket else 0.0
+
+
+# Global instance
+rate_limiters = RateLimiterRegistry()
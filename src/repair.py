@@ -0,0 +1,298 @@
+import heapq
+import itertools
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from .config import settings
+from .metadata_store import flush_metadata
+from .models import GenerationTask
+from .poll_scheduler import PollScheduler, get_poll_scheduler
+from .worker import redownload_video
+
+logger = logging.getLogger(__name__)
+
+# Stop retrying this long before a signed URL expires (the last attempt would not finish anyway)
+EXPIRY_MARGIN_SECONDS = 5.0
+
+
+def _parse_timestamp(value: str, fmt: Optional[str] = None) -> Optional[float]:
+    try:
+        if fmt:
+            return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc).timestamp()
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except ValueError:
+        return None
+
+
+def url_expiry(url: Optional[str]) -> Optional[float]:
+    """
+    从签名 URL 的查询参数解析过期时间 (Unix 时间戳)，无法识别时返回 None。
+    支持 AWS SigV4 / S3 兼容存储、GCS V4、腾讯云 COS、Azure SAS，以及 Expires=<epoch> 形式。
+    """
+    if not url:
+        return None
+    params = {key.lower(): value for key, value in parse_qsl(urlsplit(url).query)}
+    for prefix in ("x-amz", "x-goog"):
+        signed_at, lifetime = params.get(f"{prefix}-date"), params.get(f"{prefix}-expires")
+        if signed_at and lifetime and lifetime.isdigit():
+            start = _parse_timestamp(signed_at, "%Y%m%dT%H%M%SZ")
+            if start is not None:
+                return start + int(lifetime)
+    sign_time = params.get("q-sign-time", "")
+    if ";" in sign_time and sign_time.split(";", 1)[1].isdigit():
+        return float(sign_time.split(";", 1)[1])
+    if "sig" in params and params.get("se"):
+        return _parse_timestamp(params["se"])
+    for key in ("expires", "x-oss-expires", "x-expires", "exp"):
+        value = params.get(key, "")
+        if value.isdigit():
+            return float(value)
+    return None
+
+
+class RepairJob:
+    """一个待修复的下载: 已生成的视频 + 保存的 video_url / 远端 task_id"""
+
+    def __init__(
+        self,
+        video_path: Path,
+        meta_path: Path,
+        video_url: Optional[str] = None,
+        remote_task_id: Optional[str] = None,
+        client: Any = None,
+        task: Optional[GenerationTask] = None,
+        on_done: Optional[Callable[["RepairJob", bool], None]] = None,
+    ):
+        self.video_path = Path(video_path)
+        self.meta_path = Path(meta_path)
+        self.video_url = video_url
+        self.remote_task_id = remote_task_id
+        self.client = client
+        self.task = task
+        self.on_done = on_done
+        self.key = str(self.video_path)
+        self.expires_at = url_expiry(video_url)
+        self.attempts = 0
+        self.error: Optional[str] = None
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        if self.expires_at is None:
+            return False
+        return (now or time.time()) >= self.expires_at - EXPIRY_MARGIN_SECONDS
+
+    def refresh_url(self) -> bool:
+        """URL 过期后向 provider 重新查询远端任务，拿到新签发的 video_url"""
+        if not self.remote_task_id or not hasattr(self.client, "get_task"):
+            return False
+        try:
+            status_data = self.client.get_task(self.remote_task_id)
+        except Exception as e:
+            logger.warning(f"Cannot refresh video URL for {self.remote_task_id}: {e}")
+            return False
+        video_url = status_data.get("video_url")
+        if not video_url or video_url == self.video_url:
+            return False
+        self.video_url = video_url
+        self.expires_at = url_expiry(video_url)
+        return not self.expired()
+
+
+class DownloadRepairQueue:
+    """
+    后台下载修复队列
+    - 按签名 URL 的过期时间排序，最先过期的最先下载；无法解析过期时间的排在最后
+    - URL 过期时若有远端 task_id，先向 provider 重新查询以获得新 URL
+    - 失败后按指数退避重新入队 (计时交给 PollScheduler，不占用线程)，退避不会越过 URL 过期时间
+    - 超过 REPAIR_MAX_ATTEMPTS 次或 URL 已过期则放弃；放弃的条目不再被定期扫描重新加入
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        scheduler: Optional[PollScheduler] = None,
+    ):
+        self.max_attempts = max_attempts or settings.REPAIR_MAX_ATTEMPTS
+        self.scheduler = scheduler or get_poll_scheduler()
+        self._heap: List[Tuple[float, int, RepairJob]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._pending: Set[str] = set()
+        self._abandoned: Set[str] = set()
+        self._closed = False
+        self._counts = {"repaired": 0, "abandoned": 0, "expired": 0}
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"repair-{i}", daemon=True)
+            for i in range(max(workers or settings.REPAIR_WORKERS, 1))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def enqueue(self, job: RepairJob, force: bool = False) -> bool:
+        """加入队列；已在队列中 (或已放弃且未指定 force) 时返回 False"""
+        with self._cond:
+            if self._closed or job.key in self._pending or (job.key in self._abandoned and not force):
+                return False
+            self._abandoned.discard(job.key)
+            self._pending.add(job.key)
+        self._push(job)
+        return True
+
+    def _push(self, job: RepairJob) -> None:
+        priority = job.expires_at if job.expires_at is not None else math.inf
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._counter), job))
+            self._cond.notify()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.exception(f"Unexpected error repairing {job.key}: {e}")
+                self._finish(job, False)
+
+    def _process(self, job: RepairJob) -> None:
+        if job.expired() and not job.refresh_url():
+            job.error = "video URL expired"
+            logger.error(f"Cannot repair {job.video_path.name}: signed URL expired")
+            self._finish(job, False, expired=True)
+            return
+        job.attempts += 1
+        ok = redownload_video(
+            job.client,
+            job.video_path,
+            job.meta_path,
+            video_url=job.video_url,
+            remote_task_id=job.remote_task_id,
+            task=job.task,
+        )
+        if ok:
+            self._finish(job, True)
+            return
+        job.error = f"download failed after {job.attempts} repair attempts"
+        if job.attempts >= self.max_attempts:
+            self._finish(job, False)
+            return
+        delay = min(settings.REPAIR_BACKOFF_SECONDS * 2 ** (job.attempts - 1), settings.REPAIR_BACKOFF_MAX_SECONDS)
+        if job.expires_at is not None and not job.remote_task_id:
+            # Nothing can re-issue the URL: last try just before it dies rather than after it
+            delay = min(delay, max(job.expires_at - EXPIRY_MARGIN_SECONDS - time.time() - 1.0, 0.0))
+        logger.info(f"Repair of {job.video_path.name} failed (attempt {job.attempts}); retrying in {delay:.0f}s")
+        try:
+            self.scheduler.call_later(delay, self._push, job)
+        except RuntimeError:
+            self._finish(job, False)
+
+    def _finish(self, job: RepairJob, ok: bool, expired: bool = False) -> None:
+        with self._cond:
+            self._pending.discard(job.key)
+            if ok:
+                self._counts["repaired"] += 1
+            else:
+                self._abandoned.add(job.key)
+                self._counts["expired" if expired else "abandoned"] += 1
+            self._cond.notify_all()
+        if job.on_done:
+            try:
+                job.on_done(job, ok)
+            except Exception as e:
+                logger.exception(f"Repair callback failed for {job.key}: {e}")
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待队列清空 (含退避中的条目)，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"pending": len(self._pending), "queued": len(self._heap), **self._counts}
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def find_download_failures(root: Path, include_missing: bool = False) -> List[Dict[str, Any]]:
+    """
+    扫描输出目录树中的元数据 JSON，返回 local_status 为 download_failed 的条目 (附 meta_path / video_path)。
+    include_missing 时还包括已完成但视频文件丢失的条目。
+    """
+    # Metadata still coalescing in memory must be on disk before the tree is scanned
+    flush_metadata()
+    failures = []
+    for meta_path in sorted(Path(root).rglob("*.json")):
+        try:
+            with meta_path.open("r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if not isinstance(metadata, dict) or (not metadata.get("video_url") and not metadata.get("task_id")):
+            continue
+        video_path = meta_path.with_suffix(".mp4")
+        status = metadata.get("local_status")
+        if status == "download_failed" or (include_missing and status == "completed" and not video_path.exists()):
+            failures.append({**metadata, "meta_path": meta_path, "video_path": video_path})
+    return failures
+
+
+def sweep_output_tree(
+    root: Path,
+    queue: DownloadRepairQueue,
+    client: Any = None,
+    tasks: Optional[Dict[str, GenerationTask]] = None,
+    on_done: Optional[Callable[[RepairJob, bool], None]] = None,
+    force: bool = False,
+    include_missing: bool = False,
+) -> int:
+    """把 root 下所有 download_failed 的视频加入修复队列，返回新加入的数量"""
+    added = 0
+    for entry in find_download_failures(root, include_missing=include_missing):
+        job = RepairJob(
+            entry["video_path"],
+            entry["meta_path"],
+            video_url=entry.get("video_url"),
+            remote_task_id=entry.get("task_id"),
+            client=client,
+            task=(tasks or {}).get(entry.get("local_task_id")),
+            on_done=on_done,
+        )
+        if queue.enqueue(job, force=force):
+            added += 1
+    return added
+
+
+# Global instance
+repair_queue: Optional[DownloadRepairQueue] = None
+_repair_lock = threading.Lock()
+
+
+def get_repair_queue() -> DownloadRepairQueue:
+    global repair_queue
+    with _repair_lock:
+        if repair_queue is None:
+            repair_queue = DownloadRepairQueue()
+        return repair_queue
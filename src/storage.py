@@ -1,48 +1,199 @@
+import atexit
+import json
 import logging
+from abc import ABC, abstractmethod
 import os
 import hashlib
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
-from qcloud_cos import CosConfig, CosS3Client, CosClientError, CosServiceError
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import quote, unquote
+
 from .config import settings
 
+try:
+    from qcloud_cos import CosConfig, CosS3Client, CosClientError, CosServiceError
+except ImportError:  # COS SDK is only needed for STORAGE_BACKEND=cos
+    CosConfig = CosS3Client = None
+    CosClientError = CosServiceError = ()
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import BotoCoreError, ClientError as BotoClientError
+except ImportError:  # boto3 is only needed for STORAGE_BACKEND=s3
+    boto3 = TransferConfig = None
+    BotoCoreError = BotoClientError = ()
+
 logger = logging.getLogger(__name__)
 
-class TencentCOSClient:
-    def __init__(self):
-        self.enabled = False
-        if settings.COS_SECRET_ID and settings.COS_SECRET_KEY and settings.COS_REGION and settings.COS_BUCKET:
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadIndex:
+    """
+    本地上传索引 (JSON)
+    - files: 绝对路径 -> {size, mtime_ns, md5}；大小与修改时间不变时直接复用 md5，不再读整个文件
+    - objects: 已确认存在于存储中的对象，记为 "location|key" (内容寻址，key 相同即内容相同)；
+      location 区分存储桶 / 端点 / 本地目录，换了存储位置后旧记录不再生效
+    - 修改只标记为 dirty，由 save() 一次写出 (每批上传结束或关闭时)，不在每次记录时重写整个文件
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        # Serializes index file writes from concurrent uploads
+        self._save_lock = threading.Lock()
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._objects: Dict[str, bool] = {}
+        self._dirty = False
+        if self.path and self.path.exists():
             try:
-                self.config = CosConfig(
-                    Region=settings.COS_REGION, 
-                    SecretId=settings.COS_SECRET_ID, 
-                    SecretKey=settings.COS_SECRET_KEY,
-                    Token=None, 
-                    Scheme='https'
-                )
-                self.client = CosS3Client(self.config)
-                self.bucket = settings.COS_BUCKET
-                self.enabled = True
-                logger.info("Tencent COS Client initialized successfully.")
-            except (CosClientError, CosServiceError, OSError, ValueError) as e:
-                logger.exception(f"Failed to initialize Tencent COS Client: {e}")
-        else:
-            logger.warning("Tencent COS credentials not fully configured. Image upload disabled.")
+                with self.path.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._files = data.get("files", {})
+                self._objects = {key: True for key in data.get("objects", [])}
+            except (OSError, json.JSONDecodeError, AttributeError) as e:
+                logger.warning(f"Ignoring unreadable upload index {self.path}: {e}")
+
+    @staticmethod
+    def _stat_key(file_path: Path):
+        stat = file_path.stat()
+        return str(file_path.resolve()), stat.st_size, stat.st_mtime_ns
+
+    def lookup_md5(self, file_path: Path) -> Optional[str]:
+        """文件自上次记录后未变化时返回记录的 md5"""
+        name, size, mtime_ns = self._stat_key(file_path)
+        with self._lock:
+            entry = self._files.get(name)
+        if entry and entry.get("size") == size and entry.get("mtime_ns") == mtime_ns:
+            return entry.get("md5")
+        return None
+
+    def remember_md5(self, file_path: Path, md5: str) -> None:
+        name, size, mtime_ns = self._stat_key(file_path)
+        with self._lock:
+            self._files[name] = {"size": size, "mtime_ns": mtime_ns, "md5": md5}
+            self._dirty = True
+
+    @staticmethod
+    def _object_id(key: str, location: str) -> str:
+        return f"{location}|{key}" if location else key
+
+    def has_object(self, key: str, location: str = "") -> bool:
+        with self._lock:
+            return self._object_id(key, location) in self._objects
+
+    def remember_object(self, key: str, location: str = "") -> None:
+        with self._lock:
+            self._objects[self._object_id(key, location)] = True
+            self._dirty = True
+
+    def save(self) -> None:
+        """有未保存的修改时原子写出整个索引"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = json.dumps({"files": self._files, "objects": sorted(self._objects)}, ensure_ascii=False)
+                self._dirty = False
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp.write_text(snapshot, encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                logger.debug(f"Cannot save upload index: {e}")
+
+
+class StorageError(Exception):
+    """对象存储操作失败 (SDK 错误统一包装为此异常)"""
+
+
+class ObjectStorage(ABC):
+    """
+    对象存储接口: put / get / exists / url / presign 由各实现提供；
+    内容寻址上传 (md5 -> key)、上传索引去重与并发批量上传在此共用。
+    """
+
+    name = "storage"
+
+    def __init__(self, index_path: Optional[Path] = None):
+        self.enabled = False
+        self.index = UploadIndex(
+            index_path or (settings.DEFAULT_OUTPUT_DIR / f".{self.name}_upload_index.json")
+        )
+
+    @abstractmethod
+    def put(self, key: str, file_path: Path) -> None:
+        """把本地文件写入 key，失败抛出 StorageError"""
+
+    @abstractmethod
+    def get(self, key: str, dest: Path) -> None:
+        """把 key 的内容下载到 dest，失败抛出 StorageError"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """key 是否已存在；无法确认时返回 False (随后照常上传)"""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """key 的公开访问 URL"""
+
+    @abstractmethod
+    def presign(self, key: str, expires: int = 3600) -> str:
+        """key 的限时签名下载 URL (expires 秒)"""
+
+    @property
+    def location(self) -> str:
+        """对象所在位置 (存储桶 / 端点 / 目录)，上传索引按它区分已上传的对象"""
+        return self.name
 
     def _calculate_md5(self, file_path: Path) -> str:
-        """Helper to calculate file MD5"""
+        """Helper to calculate file MD5 (reused from the upload index while size and mtime are unchanged)"""
+        cached = self.index.lookup_md5(file_path)
+        if cached:
+            return cached
         hash_md5 = hashlib.md5()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
                 hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        digest = hash_md5.hexdigest()
+        self.index.remember_md5(file_path, digest)
+        return digest
+
+    @staticmethod
+    def _content_key(file_hash: str, suffix: str) -> str:
+        # Sanitize extension: only allow alphanumeric and dots
+        clean_ext = "".join(c for c in suffix.lower() if c.isalnum() or c == '.')
+        return f"cineflow_assets/{file_hash}{clean_ext}"
+
+    def cached_url(self, file_path: Path) -> Optional[str]:
+        """
+        文件未变化且已上传过时返回其 URL，不读取文件内容也不访问网络；否则返回 None。
+        """
+        if not self.enabled or not file_path.exists():
+            return None
+        file_hash = self.index.lookup_md5(file_path)
+        if not file_hash:
+            return None
+        key = self._content_key(file_hash, file_path.suffix)
+        return self.url(key) if self.index.has_object(key, self.location) else None
 
     def upload_file(self, file_path: Path, key: Optional[str] = None) -> Optional[str]:
         """
-        Uploads a file to COS and returns the public URL.
+        Uploads a file and returns its public URL.
+        Content-addressed keys that are already known (or found via exists()) are not uploaded again.
         """
         if not self.enabled:
-            logger.error("Attempted to upload but COS client is not enabled.")
+            logger.error(f"Attempted to upload but {self.name} storage is not enabled.")
             return None
 
         if not file_path.exists():
@@ -50,37 +201,328 @@ class TencentCOSClient:
             return None
 
         # Determine object key
+        content_addressed = not key
         if not key:
             # Generate safe filename using MD5 hash to avoid Chinese characters and ensure uniqueness
-            file_hash = self._calculate_md5(file_path)
-            # Sanitize extension: only allow alphanumeric and dots
-            raw_ext = file_path.suffix.lower()
-            clean_ext = "".join(c for c in raw_ext if c.isalnum() or c == '.')
-            key = f"cineflow_assets/{file_hash}{clean_ext}"
-        
+            key = self._content_key(self._calculate_md5(file_path), file_path.suffix)
+
+        try:
+            if content_addressed:
+                if self.index.has_object(key, self.location):
+                    logger.info(f"{file_path.name} already uploaded as {key}; skipping upload")
+                    return self.url(key)
+                if settings.STORAGE_HEAD_CHECK and self.exists(key):
+                    logger.info(f"{key} already exists in {self.name} storage; skipping upload")
+                    self.index.remember_object(key, self.location)
+                    return self.url(key)
+
+            logger.info(f"Uploading {file_path} to {self.name} as {key}...")
+            self.put(key, file_path)
+            if content_addressed:
+                self.index.remember_object(key, self.location)
+
+            url = self.url(key)
+            logger.info(f"Upload successful. URL: {url}")
+            return url
+
+        except (StorageError, OSError, ValueError) as e:
+            logger.exception(f"Failed to upload file to {self.name}: {e}")
+            return None
+
+    def upload_files(
+        self,
+        file_paths: Iterable[Path],
+        workers: Optional[int] = None,
+        on_done: Optional[Callable[[Path, Optional[str]], None]] = None,
+    ) -> Dict[Path, Optional[str]]:
+        """
+        用有界线程池并发上传多个文件，返回 路径 -> URL (失败为 None)。
+        on_done 在每个文件完成时 (于调用线程中) 回调，可用于进度显示。
+        """
+        unique = list(dict.fromkeys(file_paths))
+        results: Dict[Path, Optional[str]] = {}
+        if not unique:
+            return results
+        pool_size = max(1, min(workers or settings.STORAGE_UPLOAD_WORKERS, len(unique)))
+        try:
+            with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f"{self.name}-upload") as pool:
+                futures = {pool.submit(self.upload_file, path): path for path in unique}
+                for future in as_completed(futures):
+                    path = futures[future]
+                    # upload_file logs and returns None on failure
+                    results[path] = future.result()
+                    if on_done:
+                        on_done(path, results[path])
+        finally:
+            # One index write for the whole batch
+            self.index.save()
+        return results
+
+    def close(self) -> None:
+        """写出单个 upload_file() 调用留下的索引修改"""
+        self.index.save()
+
+
+class TencentCOSClient(ObjectStorage):
+    name = "cos"
+
+    def __init__(self):
+        super().__init__(settings.COS_UPLOAD_INDEX_PATH)
+        if CosS3Client is None:
+            logger.warning("qcloud_cos is not installed. Tencent COS upload disabled.")
+        elif settings.COS_SECRET_ID and settings.COS_SECRET_KEY and settings.COS_REGION and settings.COS_BUCKET:
+            try:
+                self.config = CosConfig(
+                    Region=settings.COS_REGION,
+                    SecretId=settings.COS_SECRET_ID,
+                    SecretKey=settings.COS_SECRET_KEY,
+                    Token=None,
+                    Scheme='https'
+                )
+                self.client = CosS3Client(self.config)
+                self.bucket = settings.COS_BUCKET
+                self.enabled = True
+                logger.info("Tencent COS Client initialized successfully.")
+            except (CosClientError, CosServiceError, OSError, ValueError) as e:
+                logger.exception(f"Failed to initialize Tencent COS Client: {e}")
+        else:
+            logger.warning("Tencent COS credentials not fully configured. Image upload disabled.")
+
+    @property
+    def location(self) -> str:
+        return f"cos://{settings.COS_BUCKET}.{settings.COS_REGION}"
+
+    def url(self, key: str) -> str:
+        if settings.COS_CUSTOM_DOMAIN:
+            # Sanitize: remove trailing slash, whitespace, and ANY accidental parentheses
+            # Nuclear option: remove all whitespace chars and parens to handle any weird .env formatting
+            clean_domain = "".join(c for c in settings.COS_CUSTOM_DOMAIN if c not in '() \n\t\r')
+            domain = clean_domain.rstrip('/')
+            return f"{domain}/{key}"
+        # Standard URL: https://{Bucket}.cos.{Region}.myqcloud.com/{Key}
+        return f"https://{self.bucket}.cos.{settings.COS_REGION}.myqcloud.com/{key}"
+
+    def presign(self, key: str, expires: int = 3600) -> str:
+        try:
+            return self.client.get_presigned_url(Bucket=self.bucket, Key=key, Method="GET", Expired=expires)
+        except (CosClientError, CosServiceError) as e:
+            raise StorageError(f"Cannot presign {key}: {e}") from e
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except CosServiceError as e:
+            if e.get_status_code() != 404:
+                logger.warning(f"HEAD {key} failed ({e.get_status_code()}); uploading anyway")
+            return False
+        except CosClientError as e:
+            logger.warning(f"HEAD {key} failed ({e}); uploading anyway")
+            return False
+
+    def put(self, key: str, file_path: Path) -> None:
         try:
-            logger.info(f"Uploading {file_path} to COS as {key}...")
-            response = self.client.upload_file(
+            # Files larger than one part go up as a multipart upload with parallel parts
+            self.client.upload_file(
                 Bucket=self.bucket,
                 LocalFilePath=str(file_path),
                 Key=key,
+                PartSize=settings.STORAGE_PART_SIZE_MB,
+                MAXThread=settings.STORAGE_PART_THREADS,
                 EnableMD5=False
             )
-            
-            # Construct URL
-            if settings.COS_CUSTOM_DOMAIN:
-                # Sanitize: remove trailing slash, whitespace, and ANY accidental parentheses
-                # Nuclear option: remove all whitespace chars and parens to handle any weird .env formatting
-                clean_domain = "".join(c for c in settings.COS_CUSTOM_DOMAIN if c not in '() \n\t\r')
-                domain = clean_domain.rstrip('/')
-                url = f"{domain}/{key}"
-            else:
-                # Standard URL: https://{Bucket}.cos.{Region}.myqcloud.com/{Key}
-                url = f"https://{self.bucket}.cos.{settings.COS_REGION}.myqcloud.com/{key}"
-            
-            logger.info(f"Upload successful. URL: {url}")
-            return url
-            
-        except (CosClientError, CosServiceError, OSError, ValueError) as e:
-            logger.exception(f"Failed to upload file to COS: {e}")
+        except (CosClientError, CosServiceError) as e:
+            raise StorageError(f"COS upload of {key} failed: {e}") from e
+
+    def get(self, key: str, dest: Path) -> None:
+        try:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            self.client.download_file(Bucket=self.bucket, Key=key, DestFilePath=str(dest))
+        except (CosClientError, CosServiceError) as e:
+            raise StorageError(f"COS download of {key} failed: {e}") from e
+
+
+class S3Storage(ObjectStorage):
+    """S3 兼容存储 (AWS S3 / MinIO / Cloudflare R2 等)，通过 S3_ENDPOINT_URL 指定非 AWS 端点"""
+
+    name = "s3"
+
+    def __init__(self):
+        super().__init__()
+        if boto3 is None:
+            logger.warning("boto3 is not installed. S3 upload disabled.")
+        elif settings.S3_BUCKET:
+            try:
+                self.client = boto3.client(
+                    "s3",
+                    endpoint_url=settings.S3_ENDPOINT_URL,
+                    region_name=settings.S3_REGION,
+                    aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+                )
+                self.bucket = settings.S3_BUCKET
+                self.transfer_config = TransferConfig(
+                    multipart_threshold=settings.STORAGE_PART_SIZE_MB * 1024 * 1024,
+                    multipart_chunksize=settings.STORAGE_PART_SIZE_MB * 1024 * 1024,
+                    max_concurrency=settings.STORAGE_PART_THREADS,
+                )
+                self.enabled = True
+                logger.info("S3 storage client initialized successfully.")
+            except (BotoCoreError, BotoClientError, ValueError) as e:
+                logger.exception(f"Failed to initialize S3 storage client: {e}")
+        else:
+            logger.warning("S3_BUCKET not configured. Image upload disabled.")
+
+    @property
+    def location(self) -> str:
+        endpoint = (settings.S3_ENDPOINT_URL or "aws").rstrip("/")
+        return f"s3://{endpoint}/{settings.S3_BUCKET}"
+
+    def url(self, key: str) -> str:
+        if settings.S3_PUBLIC_BASE_URL:
+            return f"{settings.S3_PUBLIC_BASE_URL.strip().rstrip('/')}/{key}"
+        if settings.S3_ENDPOINT_URL:
+            # Path-style URL, which every S3-compatible server understands
+            return f"{settings.S3_ENDPOINT_URL.rstrip('/')}/{self.bucket}/{key}"
+        region = settings.S3_REGION or "us-east-1"
+        return f"https://{self.bucket}.s3.{region}.amazonaws.com/{key}"
+
+    def presign(self, key: str, expires: int = 3600) -> str:
+        try:
+            return self.client.generate_presigned_url(
+                "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires
+            )
+        except (BotoCoreError, BotoClientError) as e:
+            raise StorageError(f"Cannot presign {key}: {e}") from e
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except BotoClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code not in ("404", "NoSuchKey", "NotFound"):
+                logger.warning(f"HEAD {key} failed ({code}); uploading anyway")
+            return False
+        except BotoCoreError as e:
+            logger.warning(f"HEAD {key} failed ({e}); uploading anyway")
+            return False
+
+    def put(self, key: str, file_path: Path) -> None:
+        try:
+            self.client.upload_file(str(file_path), self.bucket, key, Config=self.transfer_config)
+        except (BotoCoreError, BotoClientError) as e:
+            raise StorageError(f"S3 upload of {key} failed: {e}") from e
+
+    def get(self, key: str, dest: Path) -> None:
+        try:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            self.client.download_file(self.bucket, key, str(dest))
+        except (BotoCoreError, BotoClientError) as e:
+            raise StorageError(f"S3 download of {key} failed: {e}") from e
+
+
+class LocalStorage(ObjectStorage):
+    """
+    本地目录存储: 对象是 root 下的文件，由 FastAPI 后端在 /storage 下提供访问 (URL = base_url/key)。
+    无需网络与凭据，可离线测试上传、去重与吞吐；写入为 tmp + os.replace，不会暴露半个文件。
+    """
+
+    name = "local"
+
+    def __init__(self, root: Optional[Path] = None, base_url: Optional[str] = None, index_path: Optional[Path] = None):
+        super().__init__(index_path)
+        self.root = Path(root or local_storage_dir())
+        self.base_url = (base_url or settings.STORAGE_LOCAL_BASE_URL).rstrip("/")
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self.enabled = True
+        except OSError as e:
+            logger.error(f"Cannot create local storage directory {self.root}: {e}")
+
+    @property
+    def location(self) -> str:
+        return f"file://{self.root.resolve()}"
+
+    def path_for(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Object key escapes the storage root: {key}")
+        return path
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{quote(key)}"
+
+    def presign(self, key: str, expires: int = 3600) -> str:
+        # The directory is served publicly; there is nothing to sign
+        return self.url(key)
+
+    def exists(self, key: str) -> bool:
+        return self.path_for(key).is_file()
+
+    def put(self, key: str, file_path: Path) -> None:
+        dest = self.path_for(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            # Copied rather than hardlinked: editing the source image in place must not change a stored object
+            shutil.copyfile(file_path, tmp)
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def get(self, key: str, dest: Path) -> None:
+        source = self.path_for(key)
+        if not source.is_file():
+            raise StorageError(f"Object not found: {key}")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, dest)
+
+    def path_for_url(self, url: str) -> Optional[Path]:
+        """把本存储返回的 URL 映射回本地文件路径 (不是本存储的 URL 时返回 None)"""
+        prefix = f"{self.base_url}/"
+        if not url.startswith(prefix):
             return None
+        try:
+            return self.path_for(unquote(url[len(prefix):]))
+        except ValueError:
+            return None
+
+
+STORAGE_BACKENDS = {
+    "cos": TencentCOSClient,
+    "s3": S3Storage,
+    "local": LocalStorage,
+}
+
+
+def local_storage_dir() -> Path:
+    return settings.STORAGE_LOCAL_DIR or (settings.DEFAULT_OUTPUT_DIR / ".object_store")
+
+
+def local_object_path(url: str) -> Optional[Path]:
+    """URL 属于本地存储 (STORAGE_BACKEND=local) 时返回对应文件，供 provider 直接读取本地图片"""
+    if settings.STORAGE_BACKEND.strip().lower() != "local":
+        return None
+    storage = get_object_storage()
+    return storage.path_for_url(url) if isinstance(storage, LocalStorage) else None
+
+
+# Global instance
+object_storage: Optional[ObjectStorage] = None
+_object_storage_lock = threading.Lock()
+
+
+def get_object_storage() -> ObjectStorage:
+    """按 STORAGE_BACKEND (cos / s3 / local) 返回全局对象存储；未知取值抛出 ValueError"""
+    global object_storage
+    with _object_storage_lock:
+        if object_storage is None:
+            backend = settings.STORAGE_BACKEND.strip().lower()
+            if backend not in STORAGE_BACKENDS:
+                raise ValueError(
+                    f"Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r} (expected one of {', '.join(STORAGE_BACKENDS)})"
+                )
+            object_storage = STORAGE_BACKENDS[backend]()
+            atexit.register(object_storage.close)
+        return object_storage
@@ -1,26 +1,33 @@
-import time
-import json
+import asyncio
+import contextlib
+import hashlib
 import logging
 import random
 import gc
 import re
+import time
+from concurrent.futures import CancelledError, Future
 from pathlib import Path
-from typing import Dict, Any, Literal, Optional
+from typing import Callable, Dict, Any, Literal, Optional
 from .models import GenerationTask
 from .api_client import SoraClient, APIError, RateLimitError
-from .downloader import download_file
-from .concurrency import concurrency_controller
+from .downloader import download_file, download_file_async, pop_media_info
+from .mp4 import faststart_mp4, inspect_mp4
+from .concurrency import AdaptiveConcurrencyController
+from .journal import SubmissionJournal, get_journal, journal_key
+from .content_store import get_content_store
+from .metadata_store import read_metadata, write_metadata
+from .disk_budget import DISK_RECHECK_SECONDS, get_disk_budget
+from .manifest import lookup_output, manifest_key, record_output, remove_output
+from .pipeline import GenerationPipeline, PipelineStage, get_default_pipeline
+from .poll_scheduler import TERMINAL_STATUSES, PollTimeoutError
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
 def _write_metadata(meta_path: Path, payload: Dict[str, Any]) -> None:
-    try:
-        meta_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2, ensure_ascii=False)
-    except OSError as e:
-        logger.error(f"Failed to write metadata {meta_path}: {e}")
+    # Coalesced in memory and written atomically in the background
+    write_metadata(meta_path, payload)
 
 def _build_metadata(
     task: GenerationTask,
@@ -58,6 +65,87 @@ def _download_video(client: Any, task_id: str, video_url: Optional[str], dest_pa
         return False
     return download_file(video_url, dest_path)
 
+async def _download_video_async(client: Any, task_id: str, video_url: Optional[str], dest_path: Path) -> bool:
+    if hasattr(client, "download_video"):
+        try:
+            return await client.download_video(task_id=task_id, video_url=video_url, dest_path=dest_path)
+        except Exception as exc:
+            logger.error(f"Download failed for {task_id}: {exc}")
+            return False
+    if not video_url:
+        return False
+    return await download_file_async(video_url, dest_path)
+
+def _validated_media_info(video_path: Path) -> Optional[Dict[str, Any]]:
+    """
+    返回下载时流式校验得到的视频信息 (时长/分辨率/大小)；未经 download_file 的下载在此补做 box 头校验。
+    文件不是完整的 MP4 时删除它并返回 None。
+    """
+    info = pop_media_info(video_path)
+    if info is not None:
+        return info
+    try:
+        return inspect_mp4(video_path)
+    except OSError as e:
+        logger.error(f"Downloaded file {video_path.name} is not a valid video: {e}")
+        video_path.unlink(missing_ok=True)
+        return None
+
+def _postprocess_video(video_path: Path, media: Dict[str, Any]) -> None:
+    """可选的下载后处理: moov 不在 mdat 之前时改写为 faststart。失败时保留原文件 (仍可播放)"""
+    if not settings.DOWNLOAD_FASTSTART or media.get("faststart"):
+        return
+    digest = hashlib.sha256()
+    try:
+        if faststart_mp4(video_path, digest):
+            # The bytes changed, so does the hash taken during the download
+            media["sha256"] = digest.hexdigest()
+        media["faststart"] = True
+    except OSError as e:
+        logger.warning(f"Faststart rewrite skipped for {video_path.name}: {e}")
+
+def _store_video(task: Optional[GenerationTask], video_path: Path, meta_path: Path, digest: Optional[str]) -> Optional[str]:
+    """把视频纳入内容寻址存储 (重复内容变为硬链接)，返回 SHA-256；存储未启用时原样返回 digest"""
+    store = get_content_store()
+    if not store:
+        return digest
+    try:
+        digest = store.ingest(video_path, digest)
+        if task is not None:
+            store.remember(task, digest, video_path.suffix, metadata_path=str(meta_path))
+    except OSError as e:
+        logger.warning(f"Content store skipped for {video_path.name}: {e}")
+    return digest
+
+def _restore_from_store(task: GenerationTask, video_path: Path, meta_path: Path) -> bool:
+    """
+    同一任务已在其他输出目录生成过 (例如换了 output_mode 重新导出) 时，
+    直接把存储中的视频硬链接过来并复制元数据，不再重新生成。
+    """
+    store = get_content_store()
+    entry = store.find(task) if store else None
+    if not entry:
+        return False
+    try:
+        store.export(entry, video_path)
+        source_meta = Path(entry["metadata_path"]) if entry.get("metadata_path") else None
+        if source_meta and source_meta.resolve() != meta_path.resolve():
+            metadata = read_metadata(source_meta)
+            if metadata:
+                _write_metadata(meta_path, metadata)
+    except OSError as e:
+        logger.warning(f"Cannot export {task.id} from the content store: {e}")
+        return False
+    record_output(task, video_path, sha256=entry.get("sha256"))
+    return True
+
+def _learn_video_size(task: GenerationTask, media: Dict[str, Any]) -> None:
+    """把实际视频大小喂给磁盘预算的大小模型"""
+    budget = get_disk_budget()
+    if budget and media.get("size_bytes"):
+        segment = task.segment
+        budget.model.observe(segment.duration_seconds, segment.resolution, segment.is_pro, media["size_bytes"])
+
 def _inject_character_ids(text: str, characters: list) -> str:
     """
     Replaces character names with their IDs in the text, avoiding quoted dialogue.
@@ -160,6 +248,23 @@ def construct_enhanced_prompt(segment) -> str:
         
     return final_prompt.strip()
 
+def submit_task(
+    task: GenerationTask,
+    client: SoraClient,
+    dry_run: bool = False,
+    force: bool = False,
+    pipeline: Optional[GenerationPipeline] = None,
+    controller: Optional[AdaptiveConcurrencyController] = None,
+) -> Future:
+    """
+    非阻塞地把单个视频生成任务放入流水线，返回结果为 "completed"/"failed"/"skipped"/"dry_run" 的 Future。
+    pipeline 为 None 时使用全局默认流水线。
+    controller: 额外的 (provider 级) 并发控制器，与流水线的控制器同时生效。
+    """
+    lifecycle = _TaskLifecycle(task, client, pipeline or get_default_pipeline(), controller)
+    lifecycle.start(dry_run, force)
+    return lifecycle.future
+
 def process_task(
     task: GenerationTask, 
     client: SoraClient, 
@@ -168,36 +273,532 @@ def process_task(
 ) -> Literal["completed", "failed", "skipped", "dry_run"]:
     """
     执行单个视频生成的完整生命周期，受自适应并发控制器管理。
+    阻塞直到任务结束 (submit_task 的同步封装)。
     """
-    
-    # 0. Concurrency Control (Before doing anything)
-    # This blocks if the system is in Safe Mode and full
-    if concurrency_controller:
-        concurrency_controller.acquire()
-    
+    return submit_task(task, client, dry_run=dry_run, force=force).result()
+
+def resume_outstanding(
+    client_factory: Callable[[Dict[str, Any]], Optional[Any]],
+    pipeline: Optional[GenerationPipeline] = None,
+    controller_factory: Optional[Callable[[Dict[str, Any]], Optional[AdaptiveConcurrencyController]]] = None,
+) -> Dict[str, Future]:
+    """
+    重新挂载提交日志中所有未结束的远端任务 (崩溃 / Ctrl-C / 重启之后)。
+    client_factory(entry) 返回该条目对应 provider 的客户端，返回 None 则跳过该条目。
+    返回 {日志 key: Future} (本地任务 ID 在不同分镜文件间会重复，见 journal_key)。
+    """
+    journal = get_journal()
+    if not journal:
+        return {}
+    futures: Dict[str, Future] = {}
+    for entry in journal.outstanding():
+        try:
+            task = GenerationTask.model_validate(entry["task"])
+        except Exception as e:
+            logger.error(f"Cannot resume journal entry {entry.get('task_id')}: {e}")
+            continue
+        client = client_factory(entry)
+        if client is None:
+            continue
+        controller = controller_factory(entry) if controller_factory else None
+        lifecycle = _TaskLifecycle(task, client, pipeline or get_default_pipeline(), controller)
+        lifecycle.resume(entry)
+        futures[entry["key"]] = lifecycle.future
+    return futures
+
+def _outstanding_entry(journal: Optional[SubmissionJournal], task: GenerationTask) -> Optional[Dict[str, Any]]:
+    """
+    提交日志中 task 尚未结束的远端任务；只有提交时的任务与 task 的 manifest key 相同
+    (同一版本、同一 prompt_hash) 才返回。
+    prompt 修改后旧的远端任务不能记在新 prompt 下，这样的条目标记为 superseded。
+    """
+    key = journal_key(task.source_file, task.id)
+    entry = journal.get_outstanding(key) if journal else None
+    if not entry:
+        return None
     try:
-        return _process_task_internal(task, client, dry_run, force)
-    finally:
-        # Always release the slot
-        if concurrency_controller:
-            concurrency_controller.release()
+        submitted = GenerationTask.model_validate(entry["task"])
+    except Exception:
+        submitted = None
+    if submitted is not None and manifest_key(submitted) == manifest_key(task):
+        return entry
+    logger.info(
+        f"Not resuming remote task {entry['remote_task_id']} for {task.id}: "
+        f"it was submitted for a different prompt"
+    )
+    journal.record(key, "superseded", remote_task_id=entry["remote_task_id"])
+    return None
 
-def _process_task_internal(
-    task: GenerationTask, 
-    client: SoraClient, 
-    dry_run: bool = False, 
-    force: bool = False
-) -> str:
-    # Define output paths
+def _task_from_journal(metadata: Dict[str, Any]) -> Optional[GenerationTask]:
+    """从提交日志中恢复 GenerationTask (用于只有元数据 JSON 的重新下载)"""
+    journal = get_journal()
+    source_file, local_task_id = metadata.get("source_file"), metadata.get("local_task_id")
+    if not journal or not source_file or not local_task_id:
+        return None
+    entry = journal.get(journal_key(Path(source_file), local_task_id))
+    if not entry or not entry.get("task"):
+        return None
+    try:
+        return GenerationTask.model_validate(entry["task"])
+    except Exception:
+        return None
+
+def redownload_video(
+    client: Any,
+    video_path: Path,
+    meta_path: Path,
+    video_url: Optional[str] = None,
+    remote_task_id: Optional[str] = None,
+    task: Optional[GenerationTask] = None,
+) -> bool:
+    """
+    只重跑下载阶段 (不重新生成): 用保存的 video_url / 远端 task_id 重新下载、校验、后处理，
+    并把元数据改写为 completed。client 为 None 时直接按 URL 下载。
+    """
+    metadata = read_metadata(meta_path)
+    video_url = video_url or metadata.get("video_url")
+    remote_task_id = remote_task_id or metadata.get("task_id")
+    task = task or _task_from_journal(metadata)
+    if not video_url and not (remote_task_id and client is not None):
+        return False
+
+    media = None
+    if _download_video(client, remote_task_id, video_url, video_path):
+        media = _validated_media_info(video_path)
+    if media is None:
+        metadata["download_attempts"] = int(metadata.get("download_attempts") or 0) + 1
+        _write_metadata(meta_path, metadata)
+        if task is not None:
+            # Whatever is left at video_path is not a usable video: don't let the manifest skip it
+            remove_output(task)
+        return False
+
+    record_downloaded_video(video_path, meta_path, media, video_url, remote_task_id, task)
+    logger.info(f"Redownloaded {video_path.name} without regenerating.")
+    return True
+
+def record_downloaded_video(
+    video_path: Path,
+    meta_path: Path,
+    media: Dict[str, Any],
+    video_url: Optional[str] = None,
+    remote_task_id: Optional[str] = None,
+    task: Optional[GenerationTask] = None,
+) -> None:
+    """
+    补齐了一个已生成但下载失败的视频 (重新下载，或后端代理缓存) 之后的收尾:
+    后处理、纳入内容存储、元数据改为 completed，并记入 manifest 与提交日志，下次运行不再重新生成或下载。
+    media 为校验得到的视频信息。
+    """
+    metadata = read_metadata(meta_path)
+    remote_task_id = remote_task_id or metadata.get("task_id")
+    task = task or _task_from_journal(metadata)
+
+    _postprocess_video(video_path, media)
+    sha256 = _store_video(task, video_path, meta_path, media.pop("sha256", None))
+    for key in ("error_msg", "error_code", "retryable"):
+        metadata.pop(key, None)
+    metadata["local_status"] = "completed"
+    metadata["download_status"] = "success"
+    if video_url:
+        metadata["video_url"] = video_url
+    metadata["media"] = media
+    if sha256:
+        metadata["sha256"] = sha256
+    _write_metadata(meta_path, metadata)
+    if task is not None:
+        _learn_video_size(task, media)
+        record_output(task, video_path, remote_task_id=remote_task_id, sha256=sha256)
+        journal = get_journal()
+        if journal:
+            journal.record(journal_key(task.source_file, task.id), "downloaded", video_path=str(video_path))
+
+class _TaskLifecycle:
+    """
+    单个任务在流水线中的生命周期:
+    [submit 阶段] 准入 + 提交 -> [PollScheduler] 轮询 -> [download 阶段] 下载 + 元数据
+    并发许可只覆盖 "提交 -> 轮询结束"，下载不占用 provider 额度。
+    等待 (抖动/退避/轮询间隔) 均交给调度器计时，不在线程里 sleep。
+    """
+    max_retries = 3
+
+    def __init__(
+        self,
+        task: GenerationTask,
+        client: SoraClient,
+        pipeline: GenerationPipeline,
+        controller: Optional[AdaptiveConcurrencyController] = None,
+    ):
+        self.task = task
+        self.client = client
+        self.pipeline = pipeline
+        # Slots are taken in this order and released in reverse
+        self.controllers = [c for c in (pipeline.controller, controller) if c is not None]
+        self.future: Future = Future()
+
+        # Define output paths
+        self.video_path = task.output_dir / f"{task.output_filename_base}_{task.id}.mp4"
+        self.meta_path = task.output_dir / f"{task.output_filename_base}_{task.id}.json"
+
+        self.full_prompt = ""
+        self.attempt = 0
+        self.last_error: Optional[str] = None
+        self.last_task_id: Optional[str] = None
+        self._slot_held = False
+        # Disk reservation key while one is held (the output path is unique across storyboards)
+        self._disk_key: Optional[str] = None
+        self.journal: Optional[SubmissionJournal] = get_journal()
+        self.journal_key = journal_key(task.source_file, task.id)
+
+    def start(self, dry_run: bool, force: bool) -> None:
+        try:
+            self.pipeline.submit_stage.put(self._guard, self._begin, dry_run, force)
+        except RuntimeError:
+            self._cancel()
+
+    def resume(self, entry: Dict[str, Any]) -> None:
+        """从提交日志恢复: 重新挂载远端任务的轮询 (submitted) 或直接下载 (completed)"""
+        self.full_prompt = entry.get("full_prompt") or construct_enhanced_prompt(self.task.segment)
+        # Entries from older journals are keyed by the bare task id
+        self.journal_key = entry.get("key") or self.journal_key
+        self.last_task_id = entry["remote_task_id"]
+        self.attempt = max(int(entry.get("attempt") or 1), 1)
+        logger.info(f"Resuming task {self.task.id} (remote {self.last_task_id}, state {entry.get('state')})")
+        try:
+            if entry.get("state") == "completed":
+                status_data = entry.get("status_data") or {"status": "completed", "video_url": entry.get("video_url")}
+                self.pipeline.download_stage.put(self._guard, self._download, status_data, block=False)
+            else:
+                self.pipeline.submit_stage.put(self._guard, self._reattach, front=True)
+        except RuntimeError:
+            self._cancel()
+
+    def _begin(self, dry_run: bool, force: bool) -> None:
+        task = self.task
+
+        # 1. Skip Logic (one manifest lookup, no per-file stat)
+        if not force and lookup_output(task):
+            logger.info(f"Skipping task {task.id} - already generated.")
+            self._finish("skipped")
+            return
+        if not force and _restore_from_store(task, self.video_path, self.meta_path):
+            logger.info(f"Skipping task {task.id} - linked from the content store.")
+            self._finish("skipped")
+            return
+
+        # 1.5 Construct Full Prompt (Merge metadata into prompt)
+        self.full_prompt = construct_enhanced_prompt(task.segment)
+
+        # 2. Dry Run
+        if dry_run:
+            logger.info(f"[DRY RUN] Final Prompt: {self.full_prompt[:100]}...")
+            self._finish("dry_run")
+            return
+
+        # 2.5 A remote task from an interrupted run is still outstanding: reattach, don't pay twice
+        entry = _outstanding_entry(self.journal, task)
+        if entry:
+            self.resume(entry)
+            return
+
+        # 3. Backpressure: don't start new generations while downloads are backed up
+        self.pipeline.download_stage.wait_for_room()
+
+        # 3.5 Disk budget: don't pay for a video the output volume cannot hold
+        self._reserve_disk(time.monotonic() + settings.DISK_BUDGET_WAIT_SECONDS, paused=False)
+
+    def _reserve_disk(self, deadline: float, paused: bool = True) -> None:
+        task = self.task
+        budget = get_disk_budget()
+        if not budget:
+            self._schedule_attempt()
+            return
+        key = str(self.video_path)
+        waiter = budget.reserve_or_wait(key, task.output_dir, budget.estimate_task(task), paused=paused)
+        if waiter is None:
+            self._disk_key = key
+            self._schedule_attempt()
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            waiter.cancel()
+            logger.error(f"Task {task.id} not submitted: not enough disk space in {task.output_dir}")
+            self.last_error = "insufficient disk space for the projected video"
+            self._finish_failed()
+            return
+        # Parked without holding a stage thread: the next release() or a periodic recheck
+        # (other processes may free disk) puts it back at the front of the submit stage
+        try:
+            self.pipeline.scheduler.call_later(min(remaining, DISK_RECHECK_SECONDS), waiter.cancel)
+        except RuntimeError:
+            self._cancel()
+            return
+        waiter.add_done_callback(lambda _: self._enqueue(self.pipeline.submit_stage, self._reserve_disk, deadline))
+
+    def _schedule_attempt(self) -> None:
+        # RETRY LOOP
+        if self.attempt >= self.max_retries:
+            self._finish_failed()
+            return
+        self.attempt += 1
+
+        # Jitter (+ Backoff on retries)
+        delay = random.uniform(0.5, 3.0)
+        if self.attempt > 1:
+            logger.info(f"Task {self.task.id} - Retry Attempt {self.attempt}/{self.max_retries}...")
+            delay += random.uniform(2.0, 5.0)
+        self._later(delay, self.pipeline.submit_stage, self._submit)
+
+    def _submit(self) -> None:
+        task = self.task
+
+        # 4. Concurrency Control
+        # This blocks if the system is in Safe Mode and full
+        self._acquire()
+
+        # 5. Submit Task
+        logger.info(f"Submitting task {task.id}")
+        submit_started = time.monotonic()
+        try:
+            task_id = self.client.create_task(
+                prompt=self.full_prompt,
+                duration=task.segment.duration_seconds,
+                resolution=task.segment.resolution,
+                is_pro=task.segment.is_pro,
+                image_url=task.segment.image_url
+            )
+        except (RateLimitError, APIError) as e:
+            logger.error(f"Task {task.id} submission failed: {e}")
+            self.last_error = f"submission failed: {e}"
+            for controller in self.controllers:
+                controller.report_error(rate_limited=isinstance(e, RateLimitError))
+            # If submission failed, retry (next attempt)
+            self._release()
+            self._schedule_attempt()
+            return
+
+        self.last_task_id = task_id
+        self._journal(
+            "submitted",
+            remote_task_id=task_id,
+            provider_id=getattr(self.client, "provider_id", None),
+            provider_model_id=getattr(self.client, "provider_model_id", None),
+            attempt=self.attempt,
+            full_prompt=self.full_prompt,
+            task=task.model_dump(mode="json"),
+        )
+        latency = time.monotonic() - submit_started
+        for controller in self.controllers:
+            controller.report_success(latency=latency)
+
+        # 6. Polling (owned by the scheduler, no thread is held while waiting)
+        self._watch()
+
+    def _reattach(self) -> None:
+        self._acquire()
+        self._watch()
+
+    def _watch(self) -> None:
+        watch = self.pipeline.scheduler.watch(self.client, self.last_task_id, label=self.task.id)
+        watch.add_done_callback(self._on_poll_done)
+
+    def _on_poll_done(self, watch: Future) -> None:
+        task = self.task
+        # Remote work is over: hand the provider slot to the next submission
+        self._release()
+        try:
+            status_data = watch.result()
+        except PollTimeoutError:
+            logger.error(f"Task {task.id} timed out after {settings.MAX_POLL_TIME}s.")
+            self.last_error = f"timeout after {settings.MAX_POLL_TIME}s"
+            self._journal("poll_timeout")
+            # Timeout -> Retry
+            self._schedule_attempt()
+            return
+        except CancelledError:
+            self._cancel()
+            return
+        except Exception as e:
+            logger.exception(f"Unexpected error in task {task.id}: {e}")
+            self._fail(e)
+            return
+
+        if status_data.get("status") == "failed":
+            error_msg = status_data.get("error_msg", "Unknown error")
+            logger.error(f"Task {task.id} failed API side: {error_msg}")
+            self.last_error = f"api failed: {error_msg}"
+            self._journal("remote_failed", error_msg=error_msg)
+            # API failed -> retry submission
+            self._schedule_attempt()
+            return
+
+        self._journal("completed", video_url=status_data.get("video_url"), status_data=status_data)
+        try:
+            self.pipeline.download_stage.put(self._guard, self._download, status_data, block=False)
+        except RuntimeError:
+            self._cancel()
+
+    def _download(self, status_data: Dict[str, Any]) -> None:
+        task = self.task
+        task_id = self.last_task_id
+        video_url = status_data.get("video_url")
+        task.output_dir.mkdir(parents=True, exist_ok=True)
+        metadata = _build_metadata(
+            task,
+            self.full_prompt,
+            task_id=task_id,
+            status_data=status_data,
+            local_status="completed",
+        )
+
+        if not video_url:
+            metadata["local_status"] = "failed"
+            metadata["error_msg"] = "missing video_url in API response"
+            _write_metadata(self.meta_path, metadata)
+            logger.error(f"Task {task.id} completed without video_url.")
+            self._journal("failed", error_msg=metadata["error_msg"])
+            self._finish("failed")
+            return
+
+        media = None
+        if _download_video(self.client, task_id, video_url, self.video_path):
+            media = _validated_media_info(self.video_path)
+        if media is not None:
+            _postprocess_video(self.video_path, media)
+            sha256 = _store_video(task, self.video_path, self.meta_path, media.pop("sha256", None))
+            metadata["download_status"] = "success"
+            metadata["media"] = media
+            if sha256:
+                metadata["sha256"] = sha256
+            _write_metadata(self.meta_path, metadata)
+            logger.info(f"Task {task.id} completed successfully.")
+            _learn_video_size(task, media)
+            record_output(task, self.video_path, remote_task_id=task_id, sha256=sha256)
+            self._journal("downloaded", video_path=str(self.video_path))
+            self._finish("completed")
+            return
+
+        # CRITICAL FIX: Do not retry generation if download fails.
+        # The video is generated and the URL is saved in the JSON metadata.
+        metadata["local_status"] = "download_failed"
+        metadata["download_status"] = "failed"
+        metadata["error_msg"] = f"download failed for {video_url}"
+        _write_metadata(self.meta_path, metadata)
+        logger.error(f"Task {task.id} download failed after retries. Video URL saved in metadata.")
+        logger.error(f"Manual download required: {video_url}")
+        self._journal("download_failed", video_url=video_url)
+        self._finish("failed")
+
+    def _finish_failed(self) -> None:
+        metadata = _build_metadata(
+            self.task,
+            self.full_prompt,
+            task_id=self.last_task_id,
+            local_status="failed",
+            error_msg=self.last_error or "unknown error",
+        )
+        _write_metadata(self.meta_path, metadata)
+        self._journal("failed", error_msg=metadata.get("error_msg"))
+        self._finish("failed")
+
+    def _journal(self, event: str, **fields: Any) -> None:
+        if self.journal:
+            self.journal.record(self.journal_key, event, **fields)
+
+    def _later(self, delay: float, stage: PipelineStage, fn, *args) -> None:
+        """delay 秒后把 fn 插入 stage 的队首 (续作优先于尚未开始的新任务)"""
+        try:
+            self.pipeline.scheduler.call_later(delay, self._enqueue, stage, fn, *args)
+        except RuntimeError:
+            # Scheduler shut down (interrupt) -> abandon the task
+            self._cancel()
+
+    def _enqueue(self, stage: PipelineStage, fn, *args) -> None:
+        try:
+            stage.put(self._guard, fn, *args, front=True)
+        except RuntimeError:
+            self._cancel()
+
+    def _guard(self, fn, *args) -> None:
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.exception(f"Unexpected error in task {self.task.id}: {e}")
+            self._fail(e)
+
+    def _acquire(self) -> None:
+        if self.controllers and not self._slot_held:
+            for controller in self.controllers:
+                controller.acquire()
+            self._slot_held = True
+
+    def _release(self) -> None:
+        if self._slot_held:
+            self._slot_held = False
+            # Always release the slot
+            for controller in reversed(self.controllers):
+                controller.release()
+
+    def _release_disk(self) -> None:
+        budget = get_disk_budget()
+        key, self._disk_key = self._disk_key, None
+        if budget and key:
+            budget.release(key)
+
+    def _finish(self, result: str) -> None:
+        self._release()
+        self._release_disk()
+        if not self.future.done():
+            self.future.set_result(result)
+
+    def _fail(self, exc: BaseException) -> None:
+        self._release()
+        self._release_disk()
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def _cancel(self) -> None:
+        self._release()
+        self._release_disk()
+        self.future.cancel()
+
+
+async def process_task_async(
+    task: GenerationTask,
+    client: Any,
+    dry_run: bool = False,
+    force: bool = False,
+    limiter: Optional[asyncio.Semaphore] = None,
+    controller: Optional[AdaptiveConcurrencyController] = None,
+) -> Literal["completed", "failed", "skipped", "dry_run"]:
+    """
+    process_task 的 asyncio 版本，client 为 async provider (create_task/get_task/download_video 均为协程)。
+    limiter / controller 只覆盖 "提交 -> 轮询结束"，下载在限额之外进行；所有等待都是 asyncio.sleep，不占用线程。
+    """
+    # Releases the disk reservation, if one was taken, however the task ends
+    async with contextlib.AsyncExitStack() as cleanup:
+        return await _process_task_async(task, client, dry_run, force, limiter, controller, cleanup)
+
+async def _process_task_async(
+    task: GenerationTask,
+    client: Any,
+    dry_run: bool,
+    force: bool,
+    limiter: Optional[asyncio.Semaphore],
+    controller: Optional[AdaptiveConcurrencyController],
+    cleanup: contextlib.AsyncExitStack,
+) -> Literal["completed", "failed", "skipped", "dry_run"]:
     video_path = task.output_dir / f"{task.output_filename_base}_{task.id}.mp4"
     meta_path = task.output_dir / f"{task.output_filename_base}_{task.id}.json"
 
-    # 1. Skip Logic
-    if not force and video_path.exists() and video_path.stat().st_size > 0:
-        logger.info(f"Skipping task {task.id} - file exists.")
+    # 1. Skip Logic (one manifest lookup, no per-file stat)
+    if not force and await asyncio.to_thread(lookup_output, task):
+        logger.info(f"Skipping task {task.id} - already generated.")
+        return "skipped"
+    if not force and await asyncio.to_thread(_restore_from_store, task, video_path, meta_path):
+        logger.info(f"Skipping task {task.id} - linked from the content store.")
         return "skipped"
 
-    # 1.5 Construct Full Prompt (Merge metadata into prompt)
     full_prompt = construct_enhanced_prompt(task.segment)
 
     # 2. Dry Run
@@ -205,113 +806,155 @@ def _process_task_internal(
         logger.info(f"[DRY RUN] Final Prompt: {full_prompt[:100]}...")
         return "dry_run"
 
-    # RETRY LOOP
     max_retries = 3
     last_error: Optional[str] = None
     last_task_id: Optional[str] = None
+    journal = get_journal()
+
+    # Disk budget: don't pay for a video the output volume cannot hold
+    budget = get_disk_budget()
+    if budget:
+        if not await budget.reserve_async(
+            str(video_path), task.output_dir, budget.estimate_task(task), timeout=settings.DISK_BUDGET_WAIT_SECONDS
+        ):
+            logger.error(f"Task {task.id} not submitted: not enough disk space in {task.output_dir}")
+            metadata = _build_metadata(
+                task, full_prompt, local_status="failed", error_msg="insufficient disk space for the projected video"
+            )
+            await asyncio.to_thread(_write_metadata, meta_path, metadata)
+            return "failed"
+        cleanup.callback(budget.release, str(video_path))
+
+    key = journal_key(task.source_file, task.id)
+
+    async def record(event: str, **fields: Any) -> None:
+        if journal:
+            await asyncio.to_thread(journal.record, key, event, **fields)
+
+    # A remote task from an interrupted run is still outstanding: reattach, don't pay twice
+    resume_entry = await asyncio.to_thread(_outstanding_entry, journal, task)
+
     for attempt in range(1, max_retries + 1):
-        try:
+        if attempt == 1 and resume_entry:
+            task_id = resume_entry["remote_task_id"]
+            last_task_id = task_id
+            full_prompt = resume_entry.get("full_prompt") or full_prompt
+            logger.info(f"Resuming task {task.id} (remote {task_id}, state {resume_entry.get('state')})")
+            if resume_entry.get("state") == "completed":
+                status_data = resume_entry.get("status_data") or {
+                    "status": "completed",
+                    "video_url": resume_entry.get("video_url"),
+                }
+            else:
+                status_data = await _poll_async(client, task_id, task.id)
+        else:
+            # Jitter (+ Backoff on retries)
+            delay = random.uniform(0.5, 3.0)
             if attempt > 1:
                 logger.info(f"Task {task.id} - Retry Attempt {attempt}/{max_retries}...")
-                time.sleep(random.uniform(2.0, 5.0)) # Backoff
+                delay += random.uniform(2.0, 5.0)
+            await asyncio.sleep(delay)
 
-            # 3. Jitter
-            time.sleep(random.uniform(0.5, 3.0))
-            
-            # 4. Submit Task
-            logger.info(f"Submitting task {task.id}")
+            if limiter:
+                await limiter.acquire()
+            if controller:
+                await controller.acquire_async()
             try:
-                task_id = client.create_task(
-                    prompt=full_prompt,
-                    duration=task.segment.duration_seconds,
-                    resolution=task.segment.resolution,
-                    is_pro=task.segment.is_pro,
-                    image_url=task.segment.image_url
-                )
-                last_task_id = task_id
-                if concurrency_controller:
-                    concurrency_controller.report_success()
-                    
-            except (RateLimitError, APIError) as e:
-                logger.error(f"Task {task.id} submission failed: {e}")
-                last_error = f"submission failed: {e}"
-                if concurrency_controller:
-                    concurrency_controller.report_error()
-                # If submission failed, retry immediately (next loop)
-                continue
-            
-            # 5. Polling
-            time.sleep(settings.POLL_INITIAL_WAIT_SECONDS)
-            start_time = time.time()
-            
-            task_success = False
-            while time.time() - start_time < settings.MAX_POLL_TIME:
+                # 3. Submit Task
+                logger.info(f"Submitting task {task.id}")
+                submit_started = time.monotonic()
                 try:
-                    status_data = client.get_task(task_id)
-                except (APIError, RateLimitError) as e:
-                    logger.warning(f"Polling warning for {task.id}: {e}")
-                    time.sleep(settings.POLL_INTERVAL_SECONDS)
+                    task_id = await client.create_task(
+                        prompt=full_prompt,
+                        duration=task.segment.duration_seconds,
+                        resolution=task.segment.resolution,
+                        is_pro=task.segment.is_pro,
+                        image_url=task.segment.image_url
+                    )
+                except (RateLimitError, APIError) as e:
+                    logger.error(f"Task {task.id} submission failed: {e}")
+                    last_error = f"submission failed: {e}"
+                    if controller:
+                        controller.report_error(rate_limited=isinstance(e, RateLimitError))
                     continue
+                last_task_id = task_id
+                await record(
+                    "submitted",
+                    remote_task_id=task_id,
+                    provider_id=getattr(client, "provider_id", None),
+                    provider_model_id=getattr(client, "provider_model_id", None),
+                    attempt=attempt,
+                    full_prompt=full_prompt,
+                    task=task.model_dump(mode="json"),
+                )
+                if controller:
+                    controller.report_success(latency=time.monotonic() - submit_started)
 
-                status = status_data.get("status")
-                progress = status_data.get("progress", 0)
-                
-                logger.debug(f"Task {task.id} status: {status} ({progress}%)")
-                
-                if status == "completed":
-                    video_url = status_data.get("video_url")
-                    task.output_dir.mkdir(parents=True, exist_ok=True)
-                    metadata = _build_metadata(
-                        task,
-                        full_prompt,
-                        task_id=task_id,
-                        status_data=status_data,
-                        local_status="completed",
-                    )
+                # 4. Polling
+                status_data = await _poll_async(client, task_id, task.id)
+            finally:
+                if controller:
+                    controller.release()
+                if limiter:
+                    limiter.release()
 
-                    if not video_url:
-                        metadata["local_status"] = "failed"
-                        metadata["error_msg"] = "missing video_url in API response"
-                        _write_metadata(meta_path, metadata)
-                        logger.error(f"Task {task.id} completed without video_url.")
-                        return "failed"
-
-                    if _download_video(client, task_id, video_url, video_path):
-                        metadata["download_status"] = "success"
-                        _write_metadata(meta_path, metadata)
-                        logger.info(f"Task {task.id} completed successfully.")
-                        return "completed"
-
-                    # CRITICAL FIX: Do not retry generation if download fails.
-                    # The video is generated and the URL is saved in the JSON metadata.
-                    metadata["local_status"] = "download_failed"
-                    metadata["download_status"] = "failed"
-                    metadata["error_msg"] = f"download failed for {video_url}"
-                    _write_metadata(meta_path, metadata)
-                    logger.error(f"Task {task.id} download failed after retries. Video URL saved in metadata.")
-                    logger.error(f"Manual download required: {video_url}")
-                    return "failed"
-                
-                elif status == "failed":
-                    error_msg = status_data.get("error_msg", "Unknown error")
-                    logger.error(f"Task {task.id} failed API side: {error_msg}")
-                    last_error = f"api failed: {error_msg}"
-                    # API failed -> Break polling loop to retry submission
-                    break
-                
-                time.sleep(settings.POLL_INTERVAL_SECONDS)
-            else:
-                logger.error(f"Task {task.id} timed out after {settings.MAX_POLL_TIME}s.")
-                last_error = f"timeout after {settings.MAX_POLL_TIME}s"
-                # Timeout -> Retry
-            
-        except (APIError, RateLimitError) as e:
-            logger.error(f"Task {task.id} API error: {e}")
-            last_error = f"api error: {e}"
-            # Known API error -> Retry
-        except Exception as e:
-            logger.exception(f"Unexpected error in task {task.id}: {e}")
-            raise
+        if status_data is None:
+            logger.error(f"Task {task.id} timed out after {settings.MAX_POLL_TIME}s.")
+            last_error = f"timeout after {settings.MAX_POLL_TIME}s"
+            await record("poll_timeout")
+            continue
+
+        if status_data.get("status") == "failed":
+            error_msg = status_data.get("error_msg", "Unknown error")
+            logger.error(f"Task {task.id} failed API side: {error_msg}")
+            last_error = f"api failed: {error_msg}"
+            await record("remote_failed", error_msg=error_msg)
+            continue
+
+        await record("completed", video_url=status_data.get("video_url"), status_data=status_data)
+        # 5. Download (outside the provider limit)
+        video_url = status_data.get("video_url")
+        task.output_dir.mkdir(parents=True, exist_ok=True)
+        metadata = _build_metadata(
+            task,
+            full_prompt,
+            task_id=task_id,
+            status_data=status_data,
+            local_status="completed",
+        )
+        if not video_url:
+            metadata["local_status"] = "failed"
+            metadata["error_msg"] = "missing video_url in API response"
+            await asyncio.to_thread(_write_metadata, meta_path, metadata)
+            logger.error(f"Task {task.id} completed without video_url.")
+            await record("failed", error_msg=metadata["error_msg"])
+            return "failed"
+
+        media = None
+        if await _download_video_async(client, task_id, video_url, video_path):
+            media = await asyncio.to_thread(_validated_media_info, video_path)
+        if media is not None:
+            await asyncio.to_thread(_postprocess_video, video_path, media)
+            sha256 = await asyncio.to_thread(_store_video, task, video_path, meta_path, media.pop("sha256", None))
+            metadata["download_status"] = "success"
+            metadata["media"] = media
+            if sha256:
+                metadata["sha256"] = sha256
+            await asyncio.to_thread(_write_metadata, meta_path, metadata)
+            logger.info(f"Task {task.id} completed successfully.")
+            _learn_video_size(task, media)
+            await asyncio.to_thread(record_output, task, video_path, remote_task_id=task_id, sha256=sha256)
+            await record("downloaded", video_path=str(video_path))
+            return "completed"
+
+        metadata["local_status"] = "download_failed"
+        metadata["download_status"] = "failed"
+        metadata["error_msg"] = f"download failed for {video_url}"
+        await asyncio.to_thread(_write_metadata, meta_path, metadata)
+        logger.error(f"Task {task.id} download failed after retries. Video URL saved in metadata.")
+        logger.error(f"Manual download required: {video_url}")
+        await record("download_failed", video_url=video_url)
+        return "failed"
 
     metadata = _build_metadata(
         task,
@@ -320,5 +963,24 @@ def _process_task_internal(
         local_status="failed",
         error_msg=last_error or "unknown error",
     )
-    _write_metadata(meta_path, metadata)
+    await asyncio.to_thread(_write_metadata, meta_path, metadata)
+    await record("failed", error_msg=metadata.get("error_msg"))
     return "failed"
+
+async def _poll_async(client: Any, remote_task_id: str, label: str) -> Optional[Dict[str, Any]]:
+    """轮询直到终态，超时返回 None"""
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(settings.POLL_INITIAL_WAIT_SECONDS)
+    deadline = loop.time() + settings.MAX_POLL_TIME
+    while loop.time() < deadline:
+        try:
+            status_data = await client.get_task(remote_task_id)
+        except (APIError, RateLimitError) as e:
+            logger.warning(f"Polling warning for {label}: {e}")
+        else:
+            status = status_data.get("status")
+            logger.debug(f"Task {label} status: {status} ({status_data.get('progress', 0)}%)")
+            if status in TERMINAL_STATUSES:
+                return status_data
+        await asyncio.sleep(settings.POLL_INTERVAL_SECONDS)
+    return None
@@ -0,0 +1,42 @@
+import os
+
+from src import asset_manager
+from src.asset_manager import AssetManager
+
+
+def test_segment_lookups_share_one_listing_per_directory(tmp_path, monkeypatch):
+    storyboard = tmp_path / "storyboard.json"
+    manager = AssetManager(storyboard)
+    manager.scaffold()
+    segment_dir = manager.subdirs["segment"]
+    (segment_dir / "1_START.JPG").write_bytes(b"a")
+    (segment_dir / "segment-2.webp").write_bytes(b"b")
+    (segment_dir / "notes.txt").write_bytes(b"c")
+
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(asset_manager.os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+
+    assert manager.get_segment_image(1, "start") == segment_dir / "1_START.JPG"
+    assert manager.get_segment_image(2, "start") == segment_dir / "segment-2.webp"
+    assert manager.resolve_any_segment_ref(3) is None
+    assert len(scans) == 1
+
+    # A new file changes the directory mtime and invalidates the listing
+    (segment_dir / "3_end.png").write_bytes(b"d")
+    os.utime(segment_dir, ns=(0, 0))
+    assert manager.resolve_any_segment_ref(3) == segment_dir / "3_end.png"
+    assert len(scans) == 2
+
+
+def test_exact_case_and_extension_order_win(tmp_path):
+    manager = AssetManager(tmp_path / "storyboard.json")
+    manager.scaffold()
+    character_dir = manager.subdirs["character"]
+    for name in ("alice.png", "Alice.jpg", "Alice.png"):
+        (character_dir / name).write_bytes(b"x")
+
+    found = manager.get_character_image("Alice @123")
+    # Case-insensitive filesystems keep only one of alice.png / Alice.png
+    assert found.name.lower() == "alice.png"
+    assert manager.get_prop_image("missing") is None
@@ -0,0 +1,94 @@
+import threading
+
+from src.concurrency import AdaptiveConcurrencyController
+
+
+def _controller(**kwargs):
+    params = dict(max_concurrency=2, min_concurrency=1, error_threshold=1, cooldown_seconds=0.2, recovery_rate_seconds=0.2)
+    params.update(kwargs)
+    return AdaptiveConcurrencyController(**params)
+
+
+def _acquire_in_thread(controller):
+    acquired = threading.Event()
+
+    def run():
+        controller.acquire()
+        acquired.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return acquired
+
+
+def test_release_wakes_waiter_immediately():
+    controller = _controller()
+    controller.acquire()
+    controller.acquire()
+    acquired = _acquire_in_thread(controller)
+    assert not acquired.wait(0.1)
+    controller.release()
+    assert acquired.wait(0.2)
+    assert controller.current_active == 2
+
+
+def test_safe_mode_recovery_wakes_waiter():
+    controller = _controller()
+    controller.report_error()
+    assert controller.is_safe_mode
+    controller.acquire()
+    acquired = _acquire_in_thread(controller)
+    assert not acquired.wait(0.1)
+    # cooldown (0.2s) + one recovery step (0.2s) lifts the limit back to 2
+    assert acquired.wait(1.0)
+    assert not controller.is_safe_mode
+
+
+def test_aimd_backs_off_on_rate_limit_and_grows_additively():
+    controller = _controller(max_concurrency=8, min_concurrency=1, mode="aimd")
+    assert controller.get_dynamic_limit() == 8
+    controller.report_error(rate_limited=True)
+    assert controller.get_dynamic_limit() == 4
+    # A second 429 from the same burst is ignored
+    controller.report_error(rate_limited=True)
+    assert controller.get_dynamic_limit() == 4
+    # +1 per window of ~limit healthy submissions
+    for _ in range(5):
+        controller.report_success(latency=1.0)
+    assert controller.get_dynamic_limit() == 5
+
+
+def test_aimd_backs_off_on_latency_spike():
+    controller = _controller(max_concurrency=8, min_concurrency=1, mode="aimd", latency_tolerance=2.0)
+    for _ in range(3):
+        controller.report_success(latency=1.0)
+    controller.report_success(latency=5.0)
+    assert controller.get_dynamic_limit() == 4
+
+
+def test_acquire_async_woken_by_release_from_thread():
+    import asyncio
+
+    controller = _controller(max_concurrency=1, min_concurrency=1)
+    controller.acquire()
+
+    async def main():
+        threading.Timer(0.05, controller.release).start()
+        await asyncio.wait_for(controller.acquire_async(), timeout=1.0)
+
+    asyncio.run(main())
+    assert controller.current_active == 1
+
+
+def test_provider_controllers_are_isolated():
+    from src.concurrency import configure_provider_concurrency, get_provider_controller
+
+    configure_provider_concurrency("p_a", 3, {"big-model": 1})
+    configure_provider_concurrency("p_b", 2)
+    a = get_provider_controller("p_a", "small-model")
+    assert a is get_provider_controller("p_a")
+    assert get_provider_controller("p_a", "big-model").max_concurrency == 1
+    for _ in range(3):
+        a.report_error()
+    assert get_provider_controller("p_b").free_slots == 2
+    configure_provider_concurrency("p_a", 5)
+    assert a.max_concurrency == 5
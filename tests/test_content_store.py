@@ -0,0 +1,49 @@
+import hashlib
+import os
+from pathlib import Path
+
+from src.content_store import ContentStore, sha256_file
+from src.models import GenerationTask, Segment
+
+
+def _task(tmp_path: Path, output_dir: Path) -> GenerationTask:
+    return GenerationTask(
+        id="sb_s1_v1",
+        source_file=tmp_path / "storyboard.json",
+        segment=Segment(segment_index=1, prompt_text="a cat"),
+        version_index=1,
+        output_dir=output_dir,
+    )
+
+
+def test_identical_downloads_share_one_blob(tmp_path):
+    store = ContentStore(tmp_path / "store")
+    first = tmp_path / "a" / "Segment_1" / "1_v1.mp4"
+    second = tmp_path / "b" / "Segment_1" / "1_v1.mp4"
+    for path in (first, second):
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"video bytes" * 1000)
+
+    digest = store.ingest(first, hashlib.sha256(first.read_bytes()).hexdigest())
+    assert store.ingest(second) == digest == sha256_file(second)
+    blob = store.blob_path(digest, ".mp4")
+    assert os.path.samefile(blob, first) and os.path.samefile(blob, second)
+    assert os.stat(blob).st_nlink == 3
+
+
+def test_task_exported_to_another_output_dir_is_linked(tmp_path):
+    store = ContentStore(tmp_path / "store")
+    video = tmp_path / "centralized" / "Segment_1" / "1_v1.mp4"
+    video.parent.mkdir(parents=True)
+    video.write_bytes(b"video bytes")
+    digest = store.ingest(video)
+    store.remember(_task(tmp_path, video.parent), digest, ".mp4", metadata_path=str(video.with_suffix(".json")))
+
+    entry = store.find(_task(tmp_path, tmp_path / "in_place" / "Segment_1"))
+    assert entry["sha256"] == digest
+    exported = tmp_path / "in_place" / "Segment_1" / "1_v1.mp4"
+    store.export(entry, exported)
+    assert os.path.samefile(exported, video)
+
+    os.unlink(store.blob_path(digest, ".mp4"))
+    assert store.find(_task(tmp_path, exported.parent)) is None
@@ -0,0 +1,77 @@
+import asyncio
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.disk_budget import DiskBudget, VideoSizeModel
+
+
+def test_size_model_learns_and_persists(tmp_path):
+    path = tmp_path / "sizes.json"
+    model = VideoSizeModel(path)
+    prior = model.estimate(10, "horizontal", False)
+    model.observe(10, "horizontal", False, 10 * 200_000)
+    model.observe(10, "horizontal", False, 10 * 400_000)
+
+    assert prior != model.estimate(10, "horizontal", False)
+    assert model.bytes_per_second("horizontal", False) == 300_000
+    # Pro videos are learned separately
+    assert model.estimate(10, "horizontal", True) > prior
+    assert VideoSizeModel(path).bytes_per_second("horizontal", False) == 300_000
+
+
+def test_reservations_count_against_free_space(tmp_path):
+    free = shutil.disk_usage(tmp_path).free
+    budget = DiskBudget(VideoSizeModel(), min_free_bytes=free // 2)
+    size = free // 3
+
+    assert budget.reserve("a", tmp_path / "not" / "created", size, timeout=0)
+    # A second reservation of the same size no longer fits in the remaining budget
+    assert not budget.reserve("b", tmp_path, size, timeout=0)
+    [volume] = budget.plan([(tmp_path, size)])
+    assert volume["tasks"] == 1 and not volume["fits"]
+
+    budget.release("a")
+    assert budget.reserve("b", tmp_path, size, timeout=0)
+    assert budget.stats()["reserved_bytes"] == size
+
+
+def test_async_reservation_waits_on_the_loop_until_release(tmp_path):
+    free = shutil.disk_usage(tmp_path).free
+    budget = DiskBudget(VideoSizeModel(), min_free_bytes=free // 2)
+    size = free // 3
+    assert budget.reserve("a", tmp_path, size, timeout=0)
+
+    async def run():
+        # A single executor thread: a waiter parked on it would block the release below
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        waiting = asyncio.ensure_future(budget.reserve_async("b", tmp_path, size, timeout=10))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        await asyncio.to_thread(budget.release, "a")
+        return await asyncio.wait_for(waiting, timeout=5)
+
+    assert asyncio.run(run())
+    assert not asyncio.run(budget.reserve_async("c", tmp_path, size, timeout=0))
+
+
+def test_duplicate_key_is_refused_instead_of_sharing_a_reservation(tmp_path):
+    budget = DiskBudget(VideoSizeModel())
+    assert budget.reserve("out/1_v1.mp4", tmp_path, 1024 * 1024, timeout=0)
+    with pytest.raises(ValueError):
+        budget.reserve("out/1_v1.mp4", tmp_path, 500 * 1024 * 1024, timeout=0)
+    assert budget.stats()["reserved_bytes"] == 1024 * 1024
+
+
+def test_parked_reservation_is_woken_by_release(tmp_path):
+    free = shutil.disk_usage(tmp_path).free
+    budget = DiskBudget(VideoSizeModel(), min_free_bytes=free // 2)
+    size = free // 3
+    assert budget.reserve_or_wait("a", tmp_path, size) is None
+
+    waiter = budget.reserve_or_wait("b", tmp_path, size)
+    assert waiter is not None and not waiter.done()
+    budget.release("a")
+    assert waiter.done()
+    assert budget.reserve_or_wait("b", tmp_path, size, paused=True) is None
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.download_governor import DownloadGovernor
+
+
+def test_slots_cap_concurrent_downloads():
+    governor = DownloadGovernor(max_concurrent=2)
+    first = governor.slot()
+    second = governor.slot()
+    first.__enter__()
+    second.__enter__()
+    started = threading.Event()
+
+    def third():
+        with governor.slot():
+            started.set()
+
+    thread = threading.Thread(target=third)
+    thread.start()
+    assert not started.wait(0.05)
+    assert governor.stats()["waiting"] == 1
+    first.__exit__(None, None, None)
+    assert started.wait(1.0)
+    second.__exit__(None, None, None)
+    thread.join()
+    assert governor.stats()["active"] == 0
+
+
+def test_inflight_bytes_budget_admits_oversized_file_alone():
+    governor = DownloadGovernor(max_inflight_bytes=100)
+    with governor.slot(80):
+        assert governor.stats()["inflight_bytes"] == 80
+        blocked = threading.Event()
+
+        def second():
+            with governor.slot(50):
+                blocked.set()
+
+        thread = threading.Thread(target=second)
+        thread.start()
+        assert not blocked.wait(0.05)
+    assert blocked.wait(1.0)
+    thread.join()
+    # A file larger than the whole budget still runs when nothing else is in flight
+    with governor.slot(500) as ticket:
+        assert ticket.reserved == 500
+    assert governor.stats()["inflight_bytes"] == 0
+
+
+def test_async_slot_reserves_size_from_headers():
+    governor = DownloadGovernor(max_inflight_bytes=100)
+
+    async def run():
+        async with governor.slot_async() as ticket:
+            await ticket.reserve_async(60)
+            assert governor.stats()["inflight_bytes"] == 60
+            await ticket.reserve_async(40)  # shrinking never releases, growing only adds the difference
+            assert ticket.reserved == 60
+
+    asyncio.run(run())
+    assert governor.stats()["inflight_bytes"] == 0
+
+
+def test_throttle_caps_bandwidth_and_reports_throughput():
+    governor = DownloadGovernor(bytes_per_second=10 * 1024 * 1024)
+    start = time.monotonic()
+    for _ in range(3):
+        governor.throttle(1024 * 1024)  # burst is 1s worth
+    assert time.monotonic() - start < 0.05
+    waited = governor.throttle(10 * 1024 * 1024)
+    assert 0.2 < waited <= 1.0
+    stats = governor.stats()
+    assert stats["bytes_total"] == 13 * 1024 * 1024
+    assert stats["throughput_bps"] > 0
+
+
+def test_async_waiters_do_not_hold_executor_threads():
+    governor = DownloadGovernor(max_concurrent=2, max_inflight_bytes=100)
+
+    async def download(index):
+        async with governor.slot_async(10) as ticket:
+            await ticket.reserve_async(60)
+            # Active downloads write through the default executor
+            await asyncio.to_thread(time.sleep, 0.001)
+            return index
+
+    async def run():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        return await asyncio.wait_for(asyncio.gather(*(download(i) for i in range(60))), timeout=10)
+
+    assert asyncio.run(run()) == list(range(60))
+    stats = governor.stats()
+    assert (stats["active"], stats["waiting"], stats["inflight_bytes"]) == (0, 0, 0)
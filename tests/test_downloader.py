@@ -0,0 +1,189 @@
+import hashlib
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import downloader
+from src.config import settings
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+# Minimal well-formed MP4 of ~3.1MB -> 4 chunks of 1MB
+PAYLOAD = _box(b"ftyp", b"isom\0\0\2\0isomavc1") + _box(b"moov", b"") + _box(b"mdat", bytes(range(256)) * (4096 * 3 + 100))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    ranges = True
+    served = []
+    payload = PAYLOAD
+    status = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        header = self.headers.get("Range")
+        if self.status:
+            body = b""
+            self.served.append((0, -1))
+            self.send_response(self.status)
+        elif self.ranges and header:
+            start, end = header.split("=", 1)[1].split("-")
+            start, end = int(start), int(end or len(self.payload) - 1)
+            body = self.payload[start:end + 1]
+            self.served.append((start, end))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.payload)}")
+        else:
+            body = self.payload
+            self.served.append((0, len(self.payload) - 1))
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_CHUNK_SIZE_MB", 1)
+    monkeypatch.setattr(settings, "DOWNLOAD_CONNECTIONS", 3)
+    _Handler.ranges = True
+    _Handler.served = []
+    _Handler.payload = PAYLOAD
+    _Handler.status = None
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/video.mp4"
+    httpd.shutdown()
+
+
+def test_ranged_download_reassembles_file(server, tmp_path):
+    dest = tmp_path / "video.mp4"
+    assert downloader.download_file(server, dest)
+    assert dest.read_bytes() == PAYLOAD
+    assert not (tmp_path / "video.mp4.tmp.parts").exists()
+    assert downloader.pop_media_info(dest)["sha256"] == hashlib.sha256(PAYLOAD).hexdigest()
+
+
+def test_ranged_download_resumes_missing_chunks_only(server, tmp_path):
+    dest = tmp_path / "video.mp4"
+    tmp = tmp_path / "video.mp4.tmp"
+    chunk = 1024 * 1024
+    # Simulate an interrupted run that finished chunks 0 and 2
+    with open(tmp, "wb") as f:
+        f.truncate(len(PAYLOAD))
+        f.seek(0)
+        f.write(PAYLOAD[:chunk])
+        f.seek(2 * chunk)
+        f.write(PAYLOAD[2 * chunk:3 * chunk])
+    downloader._save_parts_state(tmp.with_suffix(".tmp.parts"), len(PAYLOAD), chunk, {0, 2})
+
+    assert downloader.download_file(server, dest)
+    assert dest.read_bytes() == PAYLOAD
+    fetched = sorted(start for start, _ in _Handler.served[1:])  # skip the probe
+    assert fetched == [chunk, 3 * chunk]
+    # Chunks from the earlier run are read back in order so the hash still covers the whole file
+    assert downloader.pop_media_info(dest)["sha256"] == hashlib.sha256(PAYLOAD).hexdigest()
+
+
+def test_ordered_digest_hashes_out_of_order_chunks_in_file_order(tmp_path):
+    data = bytes(range(256)) * 40
+    path = tmp_path / "file.tmp"
+    path.write_bytes(data)
+    digest = downloader._OrderedDigest(path, len(data), 1000, max_buffered=1000)
+    # Chunk 9 is kept in memory, chunks 3..8 exceed the buffer and are read back from disk
+    for index in (9, 3, 4, 5, 6, 7, 8, 1, 2, 10):
+        digest.add(index, data[index * 1000:(index + 1) * 1000])
+    with pytest.raises(IOError):
+        digest.hexdigest()
+    digest.add(0, data[:1000])
+    assert digest.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_falls_back_to_single_stream_without_ranges(server, tmp_path):
+    _Handler.ranges = False
+    dest = tmp_path / "video.mp4"
+    assert downloader.download_file(server, dest)
+    assert dest.read_bytes() == PAYLOAD
+
+
+def test_download_session_reuses_connections(server, tmp_path):
+    from src.http_sessions import download_stats, get_download_session
+
+    assert get_download_session(server) is get_download_session(server + "?other=1")
+    for name in ("a.mp4", "b.mp4"):
+        assert downloader.download_file(server, tmp_path / name)
+    stats = download_stats(server)["total"]
+    assert stats["bytes_downloaded"] == 2 * len(PAYLOAD)
+    assert stats["connections_reused"] > 0
+    assert stats["connections_opened"] < stats["requests"]
+
+
+def test_invalid_video_is_rejected_and_media_info_recorded(server, tmp_path):
+    dest = tmp_path / "video.mp4"
+    assert downloader.download_file(server, dest)
+    assert downloader.pop_media_info(dest)["size_bytes"] == len(PAYLOAD)
+
+    _Handler.payload = b"<html><body>AccessDenied</body></html>"
+    bad = tmp_path / "bad.mp4"
+    assert not downloader.download_file(server, bad)
+    assert not bad.exists()
+    assert not (tmp_path / "bad.mp4.tmp").exists()
+
+
+def test_invalid_video_is_not_retried(server, tmp_path):
+    _Handler.ranges = False
+    _Handler.payload = b"<html><body>AccessDenied</body></html>"
+    bad = tmp_path / "bad.mp4"
+
+    assert downloader.download_file(server, bad) is False
+    # The range probe plus exactly one download attempt
+    assert len(_Handler.served) == 2
+    assert not (tmp_path / "bad.mp4.tmp").exists()
+
+
+def test_fatal_status_is_raised_without_retries(server, tmp_path):
+    _Handler.status = 401
+    dest = tmp_path / "video.mp4"
+
+    with pytest.raises(downloader.DownloadStatusError) as excinfo:
+        downloader.download_file(server, dest, fatal_statuses=(401, 429))
+    assert excinfo.value.status_code == 401
+    # Raised by the range probe; no download attempts, no backoff
+    assert len(_Handler.served) == 1
+    assert not (tmp_path / "video.mp4.tmp").exists()
+
+
+def test_async_download_reserves_the_probed_size_before_connecting(server, tmp_path, monkeypatch):
+    import asyncio
+
+    import httpx
+
+    from src.download_governor import DownloadGovernor
+
+    class RecordingGovernor(DownloadGovernor):
+        sizes = []
+
+        def slot_async(self, size=0):
+            self.sizes.append(size)
+            return super().slot_async(size)
+
+    governor = RecordingGovernor(max_inflight_bytes=len(PAYLOAD))
+    monkeypatch.setattr(downloader, "get_download_governor", lambda: governor)
+    dest = tmp_path / "video.mp4"
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await downloader.download_file_async(server, dest, client=client)
+
+    assert asyncio.run(run())
+    assert governor.sizes == [len(PAYLOAD)]
+    assert dest.read_bytes() == PAYLOAD
+    assert governor.stats()["inflight_bytes"] == 0
@@ -0,0 +1,55 @@
+import pytest
+
+from src.image_prep import ImagePreprocessor
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_prepare_crops_to_frame_size_and_caches_by_source_hash(tmp_path):
+    source = tmp_path / "1_start.png"
+    Image.new("RGBA", (3840, 2400), (200, 10, 10, 255)).save(source)
+    preprocessor = ImagePreprocessor(tmp_path / "cache", image_format="jpeg", quality=85, workers=2)
+    try:
+        prepared = preprocessor.prepare_many([(source, "horizontal"), (source, "vertical")])
+        horizontal = prepared[(source, "horizontal")]
+        vertical = prepared[(source, "vertical")]
+
+        with Image.open(horizontal) as img:
+            assert (img.format, img.size) == ("JPEG", (1280, 720))
+        with Image.open(vertical) as img:
+            assert img.size == (720, 1280)
+        assert horizontal.stat().st_size < source.stat().st_size
+        assert preprocessor.cached(source, "horizontal") == horizontal
+
+        mtime = horizontal.stat().st_mtime_ns
+        assert preprocessor.prepare(source, "horizontal") == horizontal
+        assert horizontal.stat().st_mtime_ns == mtime
+    finally:
+        preprocessor.close()
+
+
+def test_prepare_falls_back_to_the_original(tmp_path):
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    preprocessor = ImagePreprocessor(tmp_path / "cache")
+    try:
+        assert preprocessor.prepare(broken, "horizontal") == broken
+        assert preprocessor.prepare(broken, "square") == broken
+    finally:
+        preprocessor.close()
+
+
+def test_quality_is_part_of_the_cache_key_and_prepare_saves_the_index(tmp_path):
+    source = tmp_path / "1_start.png"
+    Image.new("RGB", (1280, 720), (10, 200, 10)).save(source)
+    low = ImagePreprocessor(tmp_path / "cache", quality=40, workers=1)
+    high = ImagePreprocessor(tmp_path / "cache", quality=95, workers=1)
+    try:
+        low_path = low.prepare(source, "horizontal")
+        # Written without waiting for close()
+        assert (tmp_path / "cache" / "index.json").exists()
+        high_path = high.prepare(source, "horizontal")
+        assert low_path != high_path and low_path.exists() and high_path.exists()
+    finally:
+        low.close()
+        high.close()
@@ -0,0 +1,75 @@
+from src.journal import SubmissionJournal, journal_key
+
+
+def test_journal_replays_outstanding_tasks(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = SubmissionJournal(path)
+    journal.record("a", "submitted", remote_task_id="r1", attempt=1)
+    journal.record("b", "submitted", remote_task_id="r2", attempt=1)
+    journal.record("b", "completed", video_url="http://x/r2")
+    journal.record("c", "submitted", remote_task_id="r3", attempt=1)
+    journal.record("c", "completed", video_url="http://x/r3")
+    journal.record("c", "downloaded", video_path="c.mp4")
+    journal.close()
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"task_id": "d", "event": "subm')  # torn write from a crash
+
+    reloaded = SubmissionJournal(path)
+    outstanding = {entry["key"]: entry for entry in reloaded.outstanding()}
+    assert set(outstanding) == {"a", "b"}
+    assert outstanding["a"]["state"] == "submitted"
+    assert outstanding["b"]["state"] == "completed"
+    assert outstanding["b"]["video_url"] == "http://x/r2"
+    assert reloaded.get_outstanding("c") is None
+
+
+def test_resubmission_replaces_previous_attempt_and_compact_keeps_outstanding(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = SubmissionJournal(path)
+    journal.record("a", "submitted", remote_task_id="r1", attempt=1)
+    journal.record("a", "remote_failed", error_msg="boom")
+    assert journal.get_outstanding("a") is None
+    journal.record("a", "submitted", remote_task_id="r2", attempt=2)
+    journal.record("b", "submitted", remote_task_id="r3", attempt=1)
+    journal.record("b", "failed", error_msg="x")
+    journal.record("c", "submitted", remote_task_id="r5", attempt=1, task={"id": "c"})
+    journal.record("c", "completed", video_url="http://x/r5")
+    journal.record("c", "download_failed", video_url="http://x/r5")
+    journal.compact()
+    journal.record("e", "submitted", remote_task_id="r4", attempt=1)
+    journal.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3
+    reloaded = SubmissionJournal(path)
+    assert reloaded.get_outstanding("a")["remote_task_id"] == "r2"
+    assert "error_msg" not in reloaded.get_outstanding("a")
+    assert reloaded.get_outstanding("e") is not None
+    # Kept for redownloads: the entry still carries the task
+    assert reloaded.get_outstanding("c") is None
+    assert reloaded.get("c")["task"] == {"id": "c"}
+    assert reloaded.get("b") is None
+
+
+def test_same_task_id_in_two_storyboards_keeps_both_submissions(tmp_path):
+    first = journal_key(tmp_path / "a" / "storyboard.json", "storyboard_s1_v1")
+    second = journal_key(tmp_path / "b" / "storyboard.json", "storyboard_s1_v1")
+    assert first != second
+
+    path = tmp_path / "journal.jsonl"
+    journal = SubmissionJournal(path)
+    journal.record(first, "submitted", remote_task_id="r1", attempt=1)
+    journal.record(second, "submitted", remote_task_id="r2", attempt=1)
+    journal.close()
+
+    reloaded = SubmissionJournal(path)
+    assert reloaded.get_outstanding(first)["remote_task_id"] == "r1"
+    assert reloaded.get_outstanding(second)["remote_task_id"] == "r2"
+
+
+def test_lines_from_older_journals_are_keyed_by_task_id(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"ts": 1, "task_id": "a", "event": "submitted", "remote_task_id": "r1"}\n', encoding="utf-8")
+    journal = SubmissionJournal(path)
+    assert journal.get_outstanding("a")["key"] == "a"
+    journal.close()
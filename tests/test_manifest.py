@@ -0,0 +1,52 @@
+from pathlib import Path
+
+from src.manifest import OutputManifest
+from src.models import GenerationTask, Segment
+
+
+def _task(tmp_path: Path, prompt: str = "a cat", version: int = 1) -> GenerationTask:
+    return GenerationTask(
+        id=f"sb_s1_v{version}",
+        source_file=tmp_path / "storyboard.json",
+        segment=Segment(segment_index=1, prompt_text=prompt),
+        version_index=version,
+        output_dir=tmp_path / "out" / "Segment_1",
+    )
+
+
+def test_output_filename_is_deterministic(tmp_path):
+    assert _task(tmp_path).output_filename_base == _task(tmp_path).output_filename_base
+    assert _task(tmp_path).output_filename_base != _task(tmp_path, prompt="a dog").output_filename_base
+
+
+def test_manifest_lookup_survives_reload_and_tracks_prompt(tmp_path):
+    manifest = OutputManifest(tmp_path / "out")
+    task = _task(tmp_path)
+    video = task.output_dir / "1_v1.mp4"
+    manifest.record(task, video, remote_task_id="r1")
+
+    reloaded = OutputManifest(tmp_path / "out")
+    hit = reloaded.lookup(_task(tmp_path))
+    assert hit["video_path"] == str(video)
+    assert hit["remote_task_id"] == "r1"
+    assert reloaded.lookup(_task(tmp_path, prompt="a dog")) is None
+    assert reloaded.lookup(_task(tmp_path, version=2)) is None
+
+    reloaded.remove(task)
+    assert OutputManifest(tmp_path / "out").lookup(task) is None
+
+
+def test_failed_redownload_drops_the_manifest_entry(tmp_path, monkeypatch):
+    from src import worker
+    from src.manifest import lookup_output, record_output
+
+    task = _task(tmp_path)
+    task.output_dir.mkdir(parents=True)
+    video = task.output_dir / "1_v1.mp4"
+    video.write_bytes(b"truncated")
+    meta = task.output_dir / "1_v1.json"
+    record_output(task, video)
+    monkeypatch.setattr(worker, "_download_video", lambda *args: False)
+
+    assert not worker.redownload_video(None, video, meta, video_url="https://cdn/x.mp4", task=task)
+    assert lookup_output(task) is None
@@ -0,0 +1,52 @@
+import json
+
+from src.metadata_store import MetadataWriter
+
+
+def test_updates_are_coalesced_into_one_atomic_write(tmp_path, monkeypatch):
+    path = tmp_path / "Segment_1" / "1_v1.json"
+    writer = MetadataWriter(flush_interval=60)
+    writes = []
+    monkeypatch.setattr("src.metadata_store._atomic_dump", lambda p, payload: writes.append((p, dict(payload))))
+    try:
+        writer.write(path, {"local_status": "completed", "error_msg": "old"})
+        writer.update(path, {"retryable": False}, drop=("error_msg",))
+        # Read-after-write is served from memory
+        assert writer.read(path) == {"local_status": "completed", "retryable": False}
+        assert not path.exists() and not writes
+        writer.flush()
+    finally:
+        monkeypatch.undo()
+        writer.close()
+    assert writes == [(path, {"local_status": "completed", "retryable": False})]
+
+
+def test_write_through_and_existing_files(tmp_path):
+    path = tmp_path / "meta.json"
+    path.write_text(json.dumps({"video_url": "https://x/v.mp4"}), encoding="utf-8")
+    writer = MetadataWriter(flush_interval=0)
+
+    writer.update(path, {"local_status": "download_failed"})
+    assert json.loads(path.read_text(encoding="utf-8")) == {
+        "video_url": "https://x/v.mp4",
+        "local_status": "download_failed",
+    }
+    assert list(tmp_path.iterdir()) == [path]
+    assert writer.read(tmp_path / "missing.json") == {}
+
+
+def test_external_rewrite_is_not_overwritten_with_the_cached_document(tmp_path):
+    path = tmp_path / "meta.json"
+    writer = MetadataWriter(flush_interval=0)
+    writer.write(path, {"local_status": "download_failed", "attempts": 1})
+    assert writer.read(path)["local_status"] == "download_failed"
+
+    # Another process (e.g. a --redownload run) finishes the video
+    path.write_text(json.dumps({"local_status": "completed", "download_status": "success"}), encoding="utf-8")
+    assert writer.read(path)["local_status"] == "completed"
+    writer.update(path, {"checked": True})
+    assert json.loads(path.read_text(encoding="utf-8")) == {
+        "local_status": "completed",
+        "download_status": "success",
+        "checked": True,
+    }
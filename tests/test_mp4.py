@@ -0,0 +1,107 @@
+import struct
+
+import pytest
+
+from src.mp4 import Mp4StreamValidator, Mp4ValidationError, faststart_mp4, inspect_mp4
+
+
+def box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def make_mp4(duration: int = 5, width: int = 1280, height: int = 720, mdat_size: int = 4096, moov_first: bool = False) -> bytes:
+    mvhd = box(b"mvhd", struct.pack(">B3xIIII", 0, 0, 0, 1000, duration * 1000) + bytes(80))
+    tkhd_body = struct.pack(">B3xIIIII", 0, 0, 0, 1, 0, duration * 1000) + bytes(8 + 8 + 36)
+    tkhd = box(b"tkhd", tkhd_body + struct.pack(">II", width << 16, height << 16))
+    ftyp = box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2avc1mp41")
+    mdat = box(b"mdat", bytes(range(256)) * (mdat_size // 256))
+
+    def build_moov(mdat_offset: int) -> bytes:
+        # Two chunks: the start of the mdat payload and 256 bytes into it
+        stco = box(b"stco", struct.pack(">4xIII", 2, mdat_offset + 8, mdat_offset + 8 + 256))
+        stbl = box(b"stbl", stco)
+        trak = box(b"trak", tkhd + box(b"mdia", box(b"minf", stbl)))
+        return box(b"moov", mvhd + trak)
+
+    if moov_first:
+        moov_size = len(build_moov(0))
+        return ftyp + build_moov(len(ftyp) + moov_size) + mdat
+    return ftyp + mdat + build_moov(len(ftyp))
+
+
+def chunk_offsets(data: bytes) -> list:
+    pos = data.index(b"stco") + 8
+    (count,) = struct.unpack_from(">I", data, pos)
+    return list(struct.unpack_from(f">{count}I", data, pos + 4))
+
+
+def feed_in_chunks(data: bytes, size: int) -> dict:
+    validator = Mp4StreamValidator()
+    for start in range(0, len(data), size):
+        validator.feed(data[start:start + size])
+    return validator.finish()
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 1024, 1 << 20])
+def test_streaming_validator_extracts_duration_and_resolution(chunk):
+    data = make_mp4()
+    info = feed_in_chunks(data, chunk)
+    assert info == {"duration_seconds": 5.0, "width": 1280, "height": 720, "size_bytes": len(data), "faststart": False}
+
+
+def test_truncated_and_html_bodies_are_rejected():
+    data = make_mp4()
+    with pytest.raises(Mp4ValidationError, match="truncated"):
+        feed_in_chunks(data[:-10], 1024)
+    with pytest.raises(Mp4ValidationError, match="not an MP4"):
+        feed_in_chunks(b"<!DOCTYPE html><html><body>AccessDenied</body></html>", 1024)
+    with pytest.raises(Mp4ValidationError, match="missing moov"):
+        feed_in_chunks(make_mp4()[:32 + 8 + 4096], 1024)
+
+
+def test_inspect_mp4_reads_headers_from_disk(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(make_mp4(duration=8, width=720, height=1280, moov_first=True))
+    assert inspect_mp4(path)["duration_seconds"] == 8.0
+    assert inspect_mp4(path)["height"] == 1280
+
+
+def test_faststart_moves_moov_and_patches_chunk_offsets(tmp_path):
+    path = tmp_path / "video.mp4"
+    original = make_mp4(moov_first=False)
+    path.write_bytes(original)
+    assert not inspect_mp4(path)["faststart"]
+
+    assert faststart_mp4(path)
+    rewritten = path.read_bytes()
+    assert len(rewritten) == len(original)
+    assert inspect_mp4(path)["faststart"]
+    assert rewritten.index(b"moov") < rewritten.index(b"mdat")
+    for before, after in zip(chunk_offsets(original), chunk_offsets(rewritten)):
+        assert rewritten[after:after + 256] == original[before:before + 256]
+    # Already faststart: nothing to do
+    assert not faststart_mp4(path)
+    assert path.read_bytes() == rewritten
+
+
+def test_faststart_keeps_offsets_into_a_trailing_mdat(tmp_path):
+    ftyp = box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2avc1mp41")
+    leading = box(b"mdat", b"A" * 512)
+    trailing = box(b"mdat", b"B" * 512)
+
+    def build_moov(offsets) -> bytes:
+        stco = box(b"stco", struct.pack(">4xI", len(offsets)) + struct.pack(f">{len(offsets)}I", *offsets))
+        return box(b"moov", box(b"trak", box(b"mdia", box(b"minf", box(b"stbl", stco)))))
+
+    moov_size = len(build_moov([0, 0]))
+    leading_data = len(ftyp) + 8
+    trailing_data = len(ftyp) + len(leading) + moov_size + 8
+    original = ftyp + leading + build_moov([leading_data, trailing_data]) + trailing
+    path = tmp_path / "video.mp4"
+    path.write_bytes(original)
+
+    assert faststart_mp4(path)
+    rewritten = path.read_bytes()
+    for before, after in zip(chunk_offsets(original), chunk_offsets(rewritten)):
+        assert rewritten[after:after + 512] == original[before:before + 512]
+    assert chunk_offsets(rewritten) == [leading_data + moov_size, trailing_data]
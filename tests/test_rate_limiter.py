@@ -0,0 +1,27 @@
+import time
+
+from src.rate_limiter import RateLimiterRegistry, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_throttles():
+    bucket = TokenBucket(rate=50.0, burst=5)
+    start = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire() == 0.0
+    assert not bucket.try_acquire()
+    waited = bucket.acquire()
+    assert 0.0 < waited <= 0.03
+    assert time.monotonic() - start >= waited
+
+
+def test_registry_uses_provider_config_and_disables_zero_rate():
+    registry = RateLimiterRegistry()
+    registry.configure("p1", {"create": {"rate": 1.0, "burst": 3}, "status": {"rate": 0}})
+    create = registry.get("p1", "create")
+    assert create.rate == 1.0 and create.burst == 3
+    assert registry.get("p1", "status") is None
+    # Unlisted endpoints fall back to the defaults
+    assert registry.get("p1", "download") is not None
+
+    registry.configure("p1", {"create": {"rate": 4.0, "burst": 2}})
+    assert registry.get("p1", "create").rate == 4.0
@@ -0,0 +1,56 @@
+import json
+import threading
+from datetime import datetime, timezone
+
+from src.repair import DownloadRepairQueue, RepairJob, find_download_failures, url_expiry
+
+
+def test_url_expiry_parses_common_signed_url_formats():
+    signed_at = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc).timestamp()
+
+    assert url_expiry("https://b.s3.amazonaws.com/v.mp4?X-Amz-Date=20250102T030405Z&X-Amz-Expires=3600") == signed_at + 3600
+    assert url_expiry("https://storage.googleapis.com/v.mp4?X-Goog-Date=20250102T030405Z&X-Goog-Expires=60") == signed_at + 60
+    assert url_expiry("https://x.cos.ap-shanghai.myqcloud.com/v.mp4?q-sign-time=1700000000;1700003600") == 1700003600
+    assert url_expiry("https://a.blob.core.windows.net/v.mp4?se=2025-01-02T03:04:05Z&sig=abc") == signed_at
+    assert url_expiry("https://cdn.example.com/v.mp4?Expires=1700000000&Signature=x") == 1700000000
+    assert url_expiry("https://cdn.example.com/v.mp4") is None
+    assert url_expiry(None) is None
+
+
+class _ImmediateScheduler:
+    def call_later(self, delay, fn, *args):
+        threading.Timer(0, fn, args).start()
+
+
+def test_expired_job_without_remote_id_is_abandoned(tmp_path):
+    queue = DownloadRepairQueue(workers=1, max_attempts=1, scheduler=_ImmediateScheduler())
+    results = []
+    job = RepairJob(
+        tmp_path / "a.mp4",
+        tmp_path / "a.json",
+        video_url="https://cdn.example.com/a.mp4?Expires=1",
+        on_done=lambda job, ok: results.append(ok),
+    )
+    try:
+        assert queue.enqueue(job)
+        assert queue.join(timeout=5)
+        assert results == [False]
+        assert queue.stats()["expired"] == 1
+        # Abandoned entries are only retried when forced
+        assert not queue.enqueue(job)
+    finally:
+        queue.shutdown()
+
+
+def test_find_download_failures_reads_metadata_tree(tmp_path):
+    segment = tmp_path / "sb" / "Segment_1"
+    segment.mkdir(parents=True)
+    (segment / "1_v1.json").write_text(json.dumps({"local_status": "download_failed", "video_url": "https://x/1.mp4"}))
+    (segment / "1_v2.json").write_text(json.dumps({"local_status": "completed", "task_id": "remote-2"}))
+    (segment / "1_v3.json").write_text(json.dumps({"local_status": "completed", "task_id": "remote-3"}))
+    (segment / "1_v3.mp4").write_bytes(b"video")
+    (segment / "1_v4.json").write_text(json.dumps({"local_status": "download_failed"}))
+
+    assert [entry["video_path"].name for entry in find_download_failures(tmp_path)] == ["1_v1.mp4"]
+    missing = find_download_failures(tmp_path, include_missing=True)
+    assert [entry["video_path"].name for entry in missing] == ["1_v1.mp4", "1_v2.mp4"]
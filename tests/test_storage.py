@@ -0,0 +1,129 @@
+import os
+import threading
+
+import pytest
+
+from src.storage import LocalStorage, ObjectStorage, TencentCOSClient, UploadIndex
+
+
+def test_upload_index_reuses_md5_until_file_changes(tmp_path):
+    image = tmp_path / "1_start.png"
+    image.write_bytes(b"frame")
+    index_path = tmp_path / "index.json"
+
+    index = UploadIndex(index_path)
+    assert index.lookup_md5(image) is None
+    index.remember_md5(image, "abc")
+    index.remember_object("cineflow_assets/abc.png")
+    assert not index_path.exists()
+    index.save()
+
+    reloaded = UploadIndex(index_path)
+    assert reloaded.lookup_md5(image) == "abc"
+    assert reloaded.has_object("cineflow_assets/abc.png")
+
+    image.write_bytes(b"another frame")
+    os.utime(image, ns=(0, 0))
+    assert reloaded.lookup_md5(image) is None
+
+
+def test_upload_files_runs_in_parallel_and_reports_each_file(tmp_path, monkeypatch):
+    client = TencentCOSClient.__new__(TencentCOSClient)
+    client.index = UploadIndex(None)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fake_upload(path, key=None):
+        # All three uploads must be in flight at once to pass the barrier
+        barrier.wait()
+        return None if path.name == "bad.png" else f"https://cdn/{path.name}"
+
+    monkeypatch.setattr(client, "upload_file", fake_upload)
+    paths = [tmp_path / "1.png", tmp_path / "2.png", tmp_path / "bad.png", tmp_path / "1.png"]
+    done = []
+
+    results = client.upload_files(paths, workers=4, on_done=lambda path, url: done.append(path))
+
+    assert results == {
+        tmp_path / "1.png": "https://cdn/1.png",
+        tmp_path / "2.png": "https://cdn/2.png",
+        tmp_path / "bad.png": None,
+    }
+    assert sorted(done) == sorted(results)
+
+
+def test_upload_files_writes_the_index_once_per_batch(tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path / "store", "http://localhost:8000/storage/", tmp_path / "index.json")
+    images = []
+    for i in range(5):
+        image = tmp_path / f"{i}_start.png"
+        image.write_bytes(f"frame {i}".encode())
+        images.append(image)
+    writes = []
+    real_replace = os.replace
+    monkeypatch.setattr(
+        "src.storage.os.replace", lambda src, dst: writes.append(dst) or real_replace(src, dst)
+    )
+
+    results = storage.upload_files(images, workers=3)
+
+    assert all(results.values())
+    assert writes.count(tmp_path / "index.json") == 1
+    reloaded = UploadIndex(tmp_path / "index.json")
+    assert all(reloaded.lookup_md5(image) for image in images)
+
+
+def test_local_storage_uploads_once_and_maps_urls_back(tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path / "store", "http://localhost:8000/storage/", tmp_path / "index.json")
+    image = tmp_path / "1_start.png"
+    image.write_bytes(b"frame")
+    puts = []
+    real_put = storage.put
+    monkeypatch.setattr(storage, "put", lambda key, path: puts.append(key) or real_put(key, path))
+
+    url = storage.upload_file(image)
+    assert storage.upload_file(image) == url
+    assert len(puts) == 1
+    assert url.startswith("http://localhost:8000/storage/cineflow_assets/")
+    assert storage.cached_url(image) == url
+
+    stored = storage.path_for_url(url)
+    assert stored.read_bytes() == b"frame"
+    assert storage.exists(puts[0])
+    copy = tmp_path / "copy.png"
+    storage.get(puts[0], copy)
+    assert copy.read_bytes() == b"frame"
+    assert storage.path_for_url("https://elsewhere/x.png") is None
+    assert storage.path_for_url("http://localhost:8000/storage/../index.json") is None
+
+
+def test_upload_records_do_not_carry_over_to_another_store(tmp_path):
+    image = tmp_path / "1_start.png"
+    image.write_bytes(b"frame")
+    index_path = tmp_path / "index.json"
+    first = LocalStorage(tmp_path / "store_a", "http://localhost:8000/storage/", index_path)
+    first.upload_file(image)
+    first.close()
+
+    # Same index file, different root (e.g. STORAGE_LOCAL_DIR changed)
+    second = LocalStorage(tmp_path / "store_b", "http://localhost:8000/storage/", index_path)
+    assert second.cached_url(image) is None
+    url = second.upload_file(image)
+    assert second.path_for_url(url).read_bytes() == b"frame"
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoPresign(ObjectStorage):
+        def put(self, key, file_path):
+            pass
+
+        def get(self, key, dest):
+            pass
+
+        def exists(self, key):
+            return False
+
+        def url(self, key):
+            return key
+
+    with pytest.raises(TypeError):
+        NoPresign()
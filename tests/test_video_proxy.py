@@ -0,0 +1,106 @@
+import asyncio
+import struct
+
+import pytest
+
+from backend.app.services import video_proxy
+from backend.app.services.video_proxy import local_video_response, parse_range
+
+
+def test_parse_range_forms():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-", 100) == (0, 99)
+    assert parse_range("bytes=10-19", 100) == (10, 19)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=90-500", 100) == (90, 99)
+    # Multi-range is not supported: the whole file is returned
+    assert parse_range("bytes=1-2,5-6", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+
+def test_local_video_response_serves_ranges(tmp_path):
+    video = tmp_path / "v.mp4"
+    video.write_bytes(bytes(range(100)))
+
+    partial = local_video_response(video, "bytes=10-19")
+    assert partial.status_code == 206
+    assert partial.headers["content-range"] == "bytes 10-19/100"
+    assert partial.headers["content-length"] == "10"
+
+    assert local_video_response(video, "bytes=200-").status_code == 416
+    assert local_video_response(video).headers["accept-ranges"] == "bytes"
+
+
+class _FakeUpstream:
+    def __init__(self, body: bytes) -> None:
+        self.status_code = 200
+        self.headers = {"Content-Length": str(len(body)), "Content-Type": "video/mp4"}
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+def test_browser_open_range_is_fetched_whole_and_cached(tmp_path, monkeypatch):
+    def box(box_type: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+    body = box(b"ftyp", b"isom\0\0\2\0isomavc1") + box(b"moov", b"") + box(b"mdat", bytes(1000))
+    requests_seen = []
+
+    class _Session:
+        def get(self, url, headers=None, **kwargs):
+            requests_seen.append(headers)
+            return _FakeUpstream(body)
+
+    monkeypatch.setattr(video_proxy, "get_download_session", lambda url: _Session())
+    dest = tmp_path / "video.mp4"
+    cached = []
+
+    response = video_proxy.VideoProxy().stream("http://upstream/v", {}, dest, "bytes=0-", on_cached=cached.append)
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-{len(body) - 1}/{len(body)}"
+    assert "Range" not in requests_seen[0]
+
+    async def drain():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    assert asyncio.run(drain()) == body
+    assert dest.read_bytes() == body
+    assert len(cached) == 1
+
+
+def test_proxied_fetch_holds_a_download_slot_until_the_body_is_done(monkeypatch):
+    import gc
+
+    from src.download_governor import DownloadGovernor
+
+    governor = DownloadGovernor(max_concurrent=2)
+    monkeypatch.setattr(video_proxy, "get_download_governor", lambda: governor)
+
+    class _Session:
+        def get(self, url, headers=None, **kwargs):
+            return _FakeUpstream(bytes(1000))
+
+    monkeypatch.setattr(video_proxy, "get_download_session", lambda url: _Session())
+    proxy = video_proxy.VideoProxy()
+
+    response = proxy.stream("http://upstream/v", {}, None)
+    assert governor.stats()["active"] == 1
+    assert governor.stats()["inflight_bytes"] == 1000
+
+    async def drain():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    assert asyncio.run(drain()) == bytes(1000)
+    assert governor.stats()["active"] == 0
+
+    # A response dropped without being sent gives its slot back too
+    proxy.stream("http://upstream/v", {}, None)
+    gc.collect()
+    assert governor.stats()["active"] == 0